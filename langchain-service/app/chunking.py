@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+
+from .config import WINDOW_MAX_TOKENS, WINDOW_OVERLAP_TOKENS
+
+
+# Characters per token for OpenAI tokenizers on English chat text; used to split oversize messages
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token estimate for budgeting: ~4 characters per token, and never fewer than the word
+    count (short tokens like "10", "N", "RTB" are a token each). No tokenizer dependency.
+    """
+    if not text:
+        return 0
+    return max(len(text.split()), -(-len(text) // CHARS_PER_TOKEN))
+
+
+@dataclass
+class ConversationWindow:
+    """Consecutive messages of one chat packed into one text, embedded as one vector."""
+
+    message_ids: List[str]
+    text: str
+    tokens: int
+    last_at: Any = None
+
+    @property
+    def id(self) -> str:
+        # Same messages and text, same window: re-warming rewrites the doc instead of adding
+        # one. The text is part of it because pieces of one oversize message share its id.
+        key = "\x1f".join(self.message_ids) + "\x1e" + self.text
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    def row(self, embed: Any = None) -> Dict[str, Any]:
+        """Chunk-row shape (`text`, `embed`, `len`) plus provenance, as stored and ranked."""
+        return {
+            "windowId": self.id,
+            "messageIds": list(self.message_ids),
+            "messageId": self.message_ids[-1],
+            "seq": 0,
+            "text": self.text,
+            "len": len(self.text),
+            "tokens": self.tokens,
+            "lastAt": self.last_at,
+            "embed": embed,
+        }
+
+
+# (message id, text, tokens, order value); an oversize message becomes several pieces
+_Piece = Tuple[str, str, int, Any]
+
+
+def _pieces(messages: Iterable[Dict[str, Any]], max_tokens: int, order_field: str) -> List[_Piece]:
+    out: List[_Piece] = []
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    for m in messages:
+        mid = m.get("id")
+        text = str(m.get("text") or "").strip()
+        if not mid or not text:
+            continue
+        at = m.get(order_field)
+        for i in range(0, len(text), max_chars):
+            part = text[i : i + max_chars]
+            out.append((str(mid), part, min(count_tokens(part), max_tokens), at))
+    return out
+
+
+def _tail(window: List[_Piece], budget: int) -> List[_Piece]:
+    """Trailing pieces of `window` whose tokens fit in `budget` (the overlap carried forward)."""
+    out: List[_Piece] = []
+    used = 0
+    for piece in reversed(window):
+        if used + piece[2] > budget:
+            break
+        out.append(piece)
+        used += piece[2]
+    out.reverse()
+    return out
+
+
+def _window(pieces: List[_Piece]) -> ConversationWindow:
+    ids = list(dict.fromkeys(p[0] for p in pieces))
+    return ConversationWindow(
+        message_ids=ids,
+        text="\n".join(p[1] for p in pieces),
+        tokens=sum(p[2] for p in pieces),
+        last_at=pieces[-1][3],
+    )
+
+
+def window_messages(
+    messages: List[Dict[str, Any]],
+    max_tokens: int = WINDOW_MAX_TOKENS,
+    overlap_tokens: int = WINDOW_OVERLAP_TOKENS,
+    covered: Optional[set] = None,
+    order_field: str = "createdAt",
+) -> List[ConversationWindow]:
+    """
+    Packs `messages` (oldest first) greedily into windows of at most `max_tokens`; each new
+    window starts with the trailing `overlap_tokens` of the previous one. Messages in
+    `covered` (already in a stored window) are not windowed again, but the ones just before
+    the first uncovered message still seed its overlap, so incremental warms stay contiguous.
+    """
+    covered = covered or set()
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    pieces = _pieces(messages, max_tokens, order_field)
+    windows: List[ConversationWindow] = []
+    i = 0
+    while i < len(pieces):
+        if pieces[i][0] in covered:
+            i += 1
+            continue
+        # A run of uncovered pieces, seeded with the overlap from what precedes it
+        current = _tail(pieces[:i], overlap_tokens)
+        tokens = sum(p[2] for p in current)
+        fresh = False
+        while i < len(pieces) and pieces[i][0] not in covered:
+            piece = pieces[i]
+            if fresh and tokens + piece[2] > max_tokens:
+                windows.append(_window(current))
+                current = _tail(current, overlap_tokens)
+                tokens = sum(p[2] for p in current)
+            while current and tokens + piece[2] > max_tokens:
+                tokens -= current.pop(0)[2]
+            current.append(piece)
+            tokens += piece[2]
+            fresh = True
+            i += 1
+        windows.append(_window(current))
+    return windows
@@ -11,3 +11,111 @@ SIGNATURE_MAX_AGE_SECONDS = int(os.getenv("SIGNATURE_MAX_AGE_SECONDS", "300"))
 FIRESTORE_FORCE_PROD = os.getenv("FIRESTORE_FORCE_PROD", "0") in {"1", "true", "TRUE", "yes", "on"}
 
 
+
+# RAG cache budget: whole per-chat indexes are evicted least-recently-used first
+RAG_CACHE_MAX_CHATS = int(os.getenv("RAG_CACHE_MAX_CHATS", "64"))
+RAG_CACHE_MAX_ENTRIES = int(os.getenv("RAG_CACHE_MAX_ENTRIES", "20000"))
+RAG_CACHE_MAX_BYTES = int(os.getenv("RAG_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Embedding batches: the embeddings API accepts arrays; keep requests under both limits
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_BATCH_MAX_CHARS = int(os.getenv("EMBED_BATCH_MAX_CHARS", "200000"))
+# Cross-request embed dispatcher: flush after the window or at max batch; 0 ms disables it
+EMBED_DISPATCH_WINDOW_MS = float(os.getenv("EMBED_DISPATCH_WINDOW_MS", "5"))
+EMBED_DISPATCH_MAX_BATCH = int(os.getenv("EMBED_DISPATCH_MAX_BATCH", str(EMBED_BATCH_SIZE)))
+EMBED_DISPATCH_MAX_QUEUE = int(os.getenv("EMBED_DISPATCH_MAX_QUEUE", "4096"))
+
+# Content-addressed embedding cache, keyed by (model, sha256 of normalized text): "sqlite"
+# (on disk, shared by workers and the load_chat.py backfill), "memory" or "off"
+EMBED_CACHE_BACKEND = os.getenv("EMBED_CACHE_BACKEND", "sqlite").lower()
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "/tmp/messageai-embed-cache.sqlite3")
+# Vector bytes the SQLite file may hold (/tmp is memory on Cloud Run) and how they are stored:
+# "f16" (default, ~3 KB per 1536-dim vector) or "f32"
+EMBED_CACHE_MAX_BYTES = max(1, int(os.getenv("EMBED_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+EMBED_CACHE_ENCODING = os.getenv("EMBED_CACHE_ENCODING", "f16").lower()
+EMBED_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBED_CACHE_MEMORY_ENTRIES", "4096"))
+
+# Query-vector cache for RAG queries (mostly fixed strings per endpoint)
+EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "512"))
+RAG_QUERY_CACHE_TTL_SECONDS = int(os.getenv("RAG_QUERY_CACHE_TTL_SECONDS", "21600"))
+
+# Chunk reads: "bulk" batch-gets the known chunk refs in one round-trip, "serial" queries per message
+FIRESTORE_CHUNK_READ_MODE = os.getenv("FIRESTORE_CHUNK_READ_MODE", "bulk").lower()
+# Chunk vector encoding on write: "array" (float list), "f16" or "i8" (packed blob); reads accept all
+CHUNK_EMBED_ENCODING = os.getenv("CHUNK_EMBED_ENCODING", "array").lower()
+
+# /assistant/gate voting: votes run concurrently and stop once either side reaches quorum
+GATE_VOTES = max(1, int(os.getenv("GATE_VOTES", "3")))
+GATE_QUORUM = max(1, int(os.getenv("GATE_QUORUM", "2")))
+
+# Local pre-gate in front of the /assistant/gate LLM votes (escalate score in [0, 1])
+PREGATE_ENABLED = os.getenv("PREGATE_ENABLED", "1") in {"1", "true", "TRUE", "yes", "on"}
+PREGATE_ESCALATE_THRESHOLD = float(os.getenv("PREGATE_ESCALATE_THRESHOLD", "0.85"))
+PREGATE_SKIP_THRESHOLD = float(os.getenv("PREGATE_SKIP_THRESHOLD", "0.15"))
+
+# Firestore client registry: one process-wide pool of clients (one gRPC channel each)
+FIRESTORE_CHANNEL_POOL = max(1, int(os.getenv("FIRESTORE_CHANNEL_POOL", "1")))
+FIRESTORE_KEEPALIVE_MS = int(os.getenv("FIRESTORE_KEEPALIVE_MS", "30000"))
+FIRESTORE_KEEPALIVE_TIMEOUT_MS = int(os.getenv("FIRESTORE_KEEPALIVE_TIMEOUT_MS", "10000"))
+FIRESTORE_WARMUP = os.getenv("FIRESTORE_WARMUP", "1") in {"1", "true", "TRUE", "yes", "on"}
+
+# Local on-disk chunk vector store (mmapped float32 segments); empty disables it
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "")
+VECTOR_STORE_MAX_SEGMENTS = max(1, int(os.getenv("VECTOR_STORE_MAX_SEGMENTS", "16")))
+# Seconds a message seen without chunks is skipped by catch-up reads (then re-checked once)
+VECTOR_STORE_EMPTY_TTL_SECONDS = float(os.getenv("VECTOR_STORE_EMPTY_TTL_SECONDS", "300"))
+# Bounds (the directory is usually tmpfs, i.e. instance memory): newest messages kept per chat
+# (the recent-window read size) and total bytes before least recently used chats are dropped
+VECTOR_STORE_MAX_MESSAGES = max(1, int(os.getenv("VECTOR_STORE_MAX_MESSAGES", "200")))
+VECTOR_STORE_MAX_BYTES = max(1, int(os.getenv("VECTOR_STORE_MAX_BYTES", str(128 * 1024 * 1024))))
+
+# LLM response cache: "memory" (per process), "sqlite" (shared by workers on an instance) or "off"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "/tmp/messageai-llm-cache.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "900"))
+# Comma-separated endpoints that never use the cache (added to the built-in side-effecting ones)
+LLM_CACHE_DISABLED_ENDPOINTS = {e.strip() for e in os.getenv("LLM_CACHE_DISABLED_ENDPOINTS", "").split(",") if e.strip()}
+
+# /rag/warm background jobs: worker pool, queued-job bound, and retries (exponential backoff) per batch
+WARM_WORKERS = max(1, int(os.getenv("WARM_WORKERS", "2")))
+WARM_MAX_QUEUE = max(1, int(os.getenv("WARM_MAX_QUEUE", "64")))
+WARM_BATCH_CHUNKS = max(1, int(os.getenv("WARM_BATCH_CHUNKS", "64")))
+WARM_RETRIES = max(0, int(os.getenv("WARM_RETRIES", "3")))
+WARM_RETRY_BASE_MS = float(os.getenv("WARM_RETRY_BASE_MS", "500"))
+WARM_KEEP_JOBS = max(1, int(os.getenv("WARM_KEEP_JOBS", "256")))
+
+# Conversation-window chunking: consecutive messages packed into token-bounded windows (one
+# vector each) with trailing messages repeated as overlap; "message" keeps per-message chunks only
+RAG_CHUNKING = os.getenv("RAG_CHUNKING", "window").lower()
+WINDOW_MAX_TOKENS = max(16, int(os.getenv("WINDOW_MAX_TOKENS", "256")))
+WINDOW_OVERLAP_TOKENS = max(0, int(os.getenv("WINDOW_OVERLAP_TOKENS", "32")))
+WINDOW_READ_LIMIT = max(1, int(os.getenv("WINDOW_READ_LIMIT", "64")))
+
+# RAG retrieval: "hybrid" fuses vector and BM25 rankings (reciprocal rank fusion), "vector" or
+# "lexical" use one. Lexical endpoints never wait on an embed call; an indexing or query embed
+# slower than the timeout (or failing) falls back to lexical for that request.
+RAG_RETRIEVAL = os.getenv("RAG_RETRIEVAL", "hybrid").lower()
+RAG_LEXICAL_ENDPOINTS = {e.strip() for e in os.getenv("RAG_LEXICAL_ENDPOINTS", "").split(",") if e.strip()}
+RAG_EMBED_TIMEOUT_MS = float(os.getenv("RAG_EMBED_TIMEOUT_MS", "1500"))
+# After an embed timeout or failure, request paths skip embedding (lexical only) this long
+RAG_EMBED_BACKOFF_MS = float(os.getenv("RAG_EMBED_BACKOFF_MS", "30000"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# RAG context packing: prompt-token budget for retrieved context, with per-endpoint
+# overrides as "/path=tokens,..." (the router only needs a short decision context).
+# Ranked items within RAG_CONTEXT_DUP_BITS SimHash bits of a better one are skipped.
+RAG_CONTEXT_TOKENS = max(1, int(os.getenv("RAG_CONTEXT_TOKENS", "1000")))
+RAG_CONTEXT_TOKENS_BY_ENDPOINT = {
+    path.strip(): max(1, int(tokens))
+    for path, tokens in (
+        item.split("=", 1) for item in os.getenv("RAG_CONTEXT_TOKENS_BY_ENDPOINT", "/assistant/route=600").split(",") if "=" in item
+    )
+}
+RAG_CONTEXT_DUP_BITS = max(0, int(os.getenv("RAG_CONTEXT_DUP_BITS", "3")))
+
+# /sitrep/summarize reads only messages inside its timeWindow (createdAt >= now - window),
+# in pages of SITREP_PAGE_SIZE, up to SITREP_MAX_MESSAGES for very long windows
+SITREP_PAGE_SIZE = max(1, int(os.getenv("SITREP_PAGE_SIZE", "200")))
+SITREP_MAX_MESSAGES = max(1, int(os.getenv("SITREP_MAX_MESSAGES", "1000")))
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from .config import EMBED_CACHE_BACKEND, EMBED_CACHE_ENCODING, EMBED_CACHE_MAX_BYTES, EMBED_CACHE_MEMORY_ENTRIES, EMBED_CACHE_PATH
+from .embed_codec import decode_embed, encode_embed
+
+
+# SQLite caps host parameters per statement (999 on older builds)
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFKC with whitespace runs collapsed. Case is kept: it can change the embedding."""
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding vectors keyed by (model, sha256 of the normalized text), so
+    "copy", "roger" or a message forwarded between chats is embedded once. A small in-process
+    LRU sits in front of an optional SQLite file (WAL, shared by every worker on the instance
+    and by scripts/load_chat.py); the file is pruned least-recently-used past `max_bytes` of
+    vector blobs. Blobs are stored as float16 by default (see app/embed_codec.py), half the
+    size of float32 for a rounding error far below what ranking notices; lookups return
+    float32, like everything downstream.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = EMBED_CACHE_PATH,
+        max_bytes: int = EMBED_CACHE_MAX_BYTES,
+        memory_entries: int = EMBED_CACHE_MEMORY_ENTRIES,
+        encoding: str = EMBED_CACHE_ENCODING,
+    ) -> None:
+        if encoding not in ("f16", "f32"):
+            raise ValueError(f"unknown embed cache encoding: {encoding}")
+        self.path = path
+        self.max_bytes = max(1, max_bytes)
+        self.memory_entries = max(1, memory_entries)
+        self.encoding = encoding
+        self._memory: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._written = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # The first layout (raw float32, entry-count bound) is dropped to free its space
+            self._conn.execute("DROP TABLE IF EXISTS embeddings")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embed_vectors ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, enc TEXT NOT NULL, vec BLOB NOT NULL, used_at REAL NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embed_vectors_used ON embed_vectors(used_at)")
+
+    # Lookups -----------------------------------------------------------------------
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            wanted = list(dict.fromkeys(hashes))
+            remaining = []
+            for h in wanted:
+                vec = self._memory.get((model, h))
+                if vec is None:
+                    remaining.append(h)
+                    continue
+                self._memory.move_to_end((model, h))
+                found[h] = vec
+            self.memory_hits += len(found)
+            if remaining and self._conn is not None:
+                now = time.time()
+                for i in range(0, len(remaining), _SQL_BATCH):
+                    part = remaining[i : i + _SQL_BATCH]
+                    marks = ",".join("?" * len(part))
+                    rows = self._conn.execute(
+                        f"SELECT hash, enc, vec FROM embed_vectors WHERE model = ? AND hash IN ({marks})", [model, *part]
+                    ).fetchall()
+                    if rows:
+                        hit_marks = ",".join("?" * len(rows))
+                        self._conn.execute(
+                            f"UPDATE embed_vectors SET used_at = ? WHERE model = ? AND hash IN ({hit_marks})",
+                            [now, model, *(h for h, _, _ in rows)],
+                        )
+                    for h, enc, blob in rows:
+                        vec = _decode(enc, blob)
+                        if vec is None:
+                            continue
+                        found[h] = vec
+                        self._remember(model, h, vec)
+                        self.disk_hits += 1
+            self.misses += len(wanted) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Sequence[Tuple[str, Any]]) -> None:
+        rows = []
+        with self._lock:
+            now = time.time()
+            for h, vec in items:
+                arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+                self._remember(model, h, arr)
+                blob = arr.tobytes() if self.encoding == "f32" else encode_embed(arr, "f16").get("embedBlob")
+                if blob:
+                    rows.append((model, h, self.encoding, blob, now))
+            if self._conn is None or not rows:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embed_vectors (model, hash, enc, vec, used_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._written += sum(len(r[3]) for r in rows)
+            # Pruning scans the table; amortize it over a slice of the byte bound
+            if self._written >= self.max_bytes // 10:
+                self._written = 0
+                self._prune()
+
+    def _prune(self) -> None:
+        # Keeps as many most recently used rows as the byte bound holds at the current average size
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vec)), 0) FROM embed_vectors").fetchone()
+        if total <= self.max_bytes or not count:
+            return
+        keep = int(self.max_bytes // (total / count))
+        self._conn.execute(
+            "DELETE FROM embed_vectors WHERE rowid IN ("
+            "SELECT rowid FROM embed_vectors ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (keep,),
+        )
+
+    def _remember(self, model: str, h: str, vec: np.ndarray) -> None:
+        self._memory[(model, h)] = vec
+        self._memory.move_to_end((model, h))
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # Provider helpers --------------------------------------------------------------
+    def lookup(self, model: str, texts: Sequence[str]) -> Tuple[List[Optional[List[float]]], List[str], List[List[int]]]:
+        """
+        Cached vectors aligned with `texts` (None where missing), the texts still to embed
+        (one per distinct key), and for each of those the positions in `texts` it fills.
+        """
+        hashes = [text_hash(t) if t else "" for t in texts]
+        found = self.get_many(model, [h for h in hashes if h])
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        todo: List[str] = []
+        for i, (text, h) in enumerate(zip(texts, hashes)):
+            if not h:
+                continue
+            vec = found.get(h)
+            if vec is not None:
+                out[i] = vec.tolist()
+            elif h in pending:
+                pending[h].append(i)
+            else:
+                pending[h] = [i]
+                todo.append(text)
+        return out, todo, list(pending.values())
+
+    def fill(self, model: str, out: List[Optional[List[float]]], todo: Sequence[str], positions: Sequence[List[int]], vectors: Sequence[Optional[Any]]) -> None:
+        """Stores freshly embedded `vectors` (aligned with `todo`) and copies them into `out`."""
+        fresh = []
+        for text, slots, vec in zip(todo, positions, vectors):
+            if vec is None:
+                continue
+            fresh.append((text_hash(text), vec))
+            for i in slots:
+                out[i] = vec
+        if fresh:
+            self.put_many(model, fresh)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._conn is not None:
+                size, nbytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vec)), 0) FROM embed_vectors").fetchone()
+            else:
+                size, nbytes = len(self._memory), sum(v.nbytes for v in self._memory.values())
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "backend": "sqlite" if self._conn is not None else "memory",
+                "size": size,
+                "bytes": nbytes,
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _decode(enc: str, blob: bytes) -> Optional[np.ndarray]:
+    if enc == "f32":
+        return np.frombuffer(blob, dtype=np.float32)
+    return decode_embed({"encoding": enc, "embedBlob": blob})
+
+
+def build_embedding_cache(backend: str = EMBED_CACHE_BACKEND) -> Optional[EmbeddingCache]:
+    """Cache for the configured backend ("sqlite", "memory", or "off"); falls back to memory if SQLite fails."""
+    if backend in {"off", "none", "0", ""}:
+        return None
+    if backend == "sqlite":
+        try:
+            return EmbeddingCache()
+        except Exception as e:
+            logging.getLogger("messageai.providers").warning(
+                json.dumps({"event": "embed_cache_sqlite_error", "path": EMBED_CACHE_PATH, "error": str(e)})
+            )
+    return EmbeddingCache(path=None)
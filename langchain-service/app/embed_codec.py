@@ -0,0 +1,71 @@
+"""
+Chunk vector encodings stored on `chats/{chatId}/messages/{mid}/chunks/{seq}`.
+
+  array (default, also what the CF trigger and load_chat.py write)
+      embed: List[float]
+  f16
+      encoding: "f16", embedBlob: bytes (little-endian float16), dim: int
+  i8 (symmetric scalar quantization)
+      encoding: "i8", embedBlob: bytes (int8), scale: float (value = q * scale), dim: int
+
+Scoring normalizes every decoded vector, so no stored norm is needed. Docs written by
+earlier versions may still carry a `norm` field; it is ignored (and cleared on rewrite).
+A doc that cannot be decoded yields no vector rather than failing the read.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Set
+import json
+import logging
+
+import numpy as np
+
+
+ENCODINGS = ("array", "f16", "i8")
+
+_logger = logging.getLogger("messageai")
+_warned: Set[str] = set()
+
+
+def encode_embed(vec: Any, encoding: str = "array") -> Dict[str, Any]:
+    """Chunk-doc fields holding `vec` in the given encoding (empty/None vectors stay arrays)."""
+    if encoding == "array" or vec is None or len(vec) == 0:
+        return {"embed": [float(x) for x in vec] if vec is not None else None}
+    arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+    fields: Dict[str, Any] = {"encoding": encoding, "dim": int(arr.shape[0])}
+    if encoding == "f16":
+        fields["embedBlob"] = arr.astype("<f2").tobytes()
+    elif encoding == "i8":
+        peak = float(np.max(np.abs(arr)))
+        scale = peak / 127.0 if peak > 0 else 1.0
+        fields["embedBlob"] = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8).tobytes()
+        fields["scale"] = scale
+    else:
+        raise ValueError(f"unknown embed encoding: {encoding}")
+    return fields
+
+
+def decode_embed(data: Dict[str, Any]) -> Optional[Any]:
+    """
+    The vector from a chunk doc or row in any encoding: a float32 array for blobs, else
+    `embed` as stored. None (logged once per problem) for an unknown encoding or a corrupt
+    blob, so one bad doc only leaves its row unscored.
+    """
+    encoding = data.get("encoding")
+    blob = data.get("embedBlob")
+    if not encoding or encoding == "array" or blob is None:
+        return data.get("embed")
+    try:
+        if encoding == "f16":
+            return np.frombuffer(blob, dtype="<f2").astype(np.float32)
+        if encoding == "i8":
+            return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * np.float32(data.get("scale") or 1.0)
+        error = "unknown encoding"
+    except (TypeError, ValueError) as e:
+        error = str(e)
+    key = f"{encoding}: {error}"
+    if key not in _warned:
+        _warned.add(key)
+        _logger.warning(json.dumps({"event": "embed_decode_error", "encoding": str(encoding), "error": error}))
+    return None
@@ -1,8 +1,55 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
 
-from .firestore_client import FirestoreReader
+from .firestore_client import AsyncFirestoreReader, FirestoreReader
+from .metrics import timed
+from .vector_store import LocalVectorStore
+
+
+_logger = logging.getLogger("messageai")
+
+
+def _missing_heads(heads: List[Tuple[str, str]], local_rows: Dict[str, List[Dict[str, Any]]]) -> List[Tuple[str, str]]:
+    # Messages with no local rows need a Firestore catch-up (new, or never embedded yet)
+    return [(mid, text) for mid, text in heads if mid not in local_rows]
+
+
+def _merge(heads: List[Tuple[str, str]], local_rows: Dict[str, List[Dict[str, Any]]], fetched: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows in recent-message order (as Firestore returns them), local rows first, then catch-up."""
+    caught_up: Dict[str, List[Dict[str, Any]]] = {}
+    for row in fetched:
+        caught_up.setdefault(str(row.get("messageId")), []).append(row)
+    out: List[Dict[str, Any]] = []
+    for mid, _ in heads:
+        out.extend(local_rows.get(mid) or caught_up.get(mid) or [])
+    return out
+
+
+def _oldest_first(heads: List[Tuple[str, str]], fetched: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Heads are newest first; the local store keeps the most recently appended messages
+    rank = {mid: i for i, (mid, _) in enumerate(heads)}
+    return sorted(fetched, key=lambda row: -rank.get(str(row.get("messageId")), -1))
+
+
+def _empty_ids(missing: List[Tuple[str, str]], fetched: List[Dict[str, Any]]) -> List[str]:
+    # Caught-up messages that still have no chunks; marked so the next read skips them
+    got = {str(row.get("messageId")) for row in fetched}
+    return [mid for mid, _ in missing if mid not in got]
+
+
+def _log_local(chat_id: str, heads: int, fetched_messages: int, rows: int) -> None:
+    _logger.info(json.dumps({
+        "event": "embedding_store_read",
+        "chat_id": chat_id,
+        "messages": heads,
+        "local_messages": heads - fetched_messages,
+        "catchup_messages": fetched_messages,
+        "rows": rows,
+    }))
 
 
 class FirestoreEmbeddingStore:
@@ -15,17 +62,105 @@ class FirestoreEmbeddingStore:
         - embed: List[float]
         - seq: int
         - len: int
+
+    and per conversation window (consecutive messages, one vector; see app/chunking.py):
+      chats/{chatId}/windows/{windowId}
+        - text, embed, len, tokens
+        - messageIds: List[str] (provenance, oldest first)
+        - lastAt: ordering value of the window's last message
+
+    With a `LocalVectorStore`, chunk vectors already on local disk are served from their
+    mmapped segments; Firestore is read only for the recent message ids and for chunks of
+    messages the local store has not seen yet (which are then appended locally; messages
+    that still have no chunks get an empty marker, see `LocalVectorStore.mark_empty`).
     """
 
-    def __init__(self, fs: Optional[FirestoreReader] = None) -> None:
+    def __init__(self, fs: Optional[FirestoreReader] = None, local: Optional[LocalVectorStore] = None) -> None:
         self.fs = fs or FirestoreReader()
+        self.local = local
 
     # Reads recent chunk docs for a chat (already stored by CF trigger or backfill)
     def read_recent_chunks(self, chat_id: str, message_limit: int = 200) -> List[Dict[str, Any]]:
-        return self.fs.fetch_recent_chunks(chat_id, limit_messages=message_limit)
+        if self.local is None:
+            return self.fs.fetch_recent_chunks(chat_id, limit_messages=message_limit)
+        try:
+            heads = self.fs.fetch_recent_message_heads(chat_id, message_limit)
+            local_rows = self.local.read_chat(chat_id)
+            missing = _missing_heads(heads, local_rows)
+            fetched = self.fs.fetch_chunks_for_messages(chat_id, missing) if missing else []
+        except Exception as e:
+            _logger.warning(json.dumps({"event": "embedding_store_local_error", "chat_id": chat_id, "error": str(e)}))
+            return self.fs.fetch_recent_chunks(chat_id, limit_messages=message_limit)
+        self._append_local(chat_id, _oldest_first(heads, fetched), _empty_ids(missing, fetched))
+        rows = _merge(heads, local_rows, fetched)
+        _log_local(chat_id, len(heads), len(missing), len(rows))
+        return rows
+
+    # Conversation windows (one vector per window of messages) are read straight from Firestore
+    def read_recent_windows(self, chat_id: str, limit: int = 64) -> List[Dict[str, Any]]:
+        return self.fs.fetch_recent_windows(chat_id, limit=limit)
+
+    def write_windows(self, chat_id: str, windows: List[Dict[str, Any]]) -> None:
+        self.fs.write_windows(chat_id, windows)
 
     # Write helpers used by backfill/warm endpoint
     def write_chunks(self, chat_id: str, message_id: str, chunks: List[Dict[str, Any]]) -> None:
         self.fs.write_message_chunks(chat_id, message_id, chunks)
+        if self.local is not None:
+            self._append_local(chat_id, [dict(ch, messageId=message_id) for ch in chunks])
+
+    def _append_local(self, chat_id: str, rows: List[Dict[str, Any]], empty: Optional[List[str]] = None) -> None:
+        # The local store is a cache: a failed append only costs a later catch-up read
+        try:
+            self.local.write_rows(chat_id, rows)
+            if empty:
+                self.local.mark_empty(chat_id, empty)
+        except Exception as e:
+            _logger.warning(json.dumps({"event": "embedding_store_local_write_error", "chat_id": chat_id, "error": str(e)}))
+
+
+class AsyncFirestoreEmbeddingStore:
+    """Async counterpart of `FirestoreEmbeddingStore` (same layout) used on the request path."""
+
+    def __init__(self, fs: Optional[AsyncFirestoreReader] = None, local: Optional[LocalVectorStore] = None) -> None:
+        self.fs = fs or AsyncFirestoreReader()
+        self.local = local
+
+    @timed("chunk_read")
+    async def read_recent_chunks(self, chat_id: str, message_limit: int = 200) -> List[Dict[str, Any]]:
+        if self.local is None:
+            return await self.fs.fetch_recent_chunks(chat_id, limit_messages=message_limit)
+        try:
+            # Message ids from Firestore and the local index load are independent
+            heads, local_rows = await asyncio.gather(
+                self.fs.fetch_recent_message_heads(chat_id, message_limit),
+                asyncio.to_thread(self.local.read_chat, chat_id),
+            )
+            missing = _missing_heads(heads, local_rows)
+            fetched = await self.fs.fetch_chunks_for_messages(chat_id, missing) if missing else []
+        except Exception as e:
+            _logger.warning(json.dumps({"event": "embedding_store_local_error", "chat_id": chat_id, "error": str(e)}))
+            return await self.fs.fetch_recent_chunks(chat_id, limit_messages=message_limit)
+        await self._append_local(chat_id, _oldest_first(heads, fetched), _empty_ids(missing, fetched))
+        rows = _merge(heads, local_rows, fetched)
+        _log_local(chat_id, len(heads), len(missing), len(rows))
+        return rows
+
+    async def read_recent_windows(self, chat_id: str, limit: int = 64) -> List[Dict[str, Any]]:
+        return await self.fs.fetch_recent_windows(chat_id, limit=limit)
+
+    async def write_windows(self, chat_id: str, windows: List[Dict[str, Any]]) -> None:
+        await self.fs.write_windows(chat_id, windows)
 
+    async def write_chunks(self, chat_id: str, message_id: str, chunks: List[Dict[str, Any]]) -> None:
+        await self.fs.write_message_chunks(chat_id, message_id, chunks)
+        if self.local is not None:
+            await self._append_local(chat_id, [dict(ch, messageId=message_id) for ch in chunks])
 
+    async def _append_local(self, chat_id: str, rows: List[Dict[str, Any]], empty: Optional[List[str]] = None) -> None:
+        try:
+            await asyncio.to_thread(self.local.write_rows, chat_id, rows)
+            if empty:
+                await asyncio.to_thread(self.local.mark_empty, chat_id, empty)
+        except Exception as e:
+            _logger.warning(json.dumps({"event": "embedding_store_local_write_error", "chat_id": chat_id, "error": str(e)}))
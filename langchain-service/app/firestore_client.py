@@ -1,34 +1,243 @@
-from typing import Any, Dict, List, Optional
-import os
+from __future__ import annotations
 
-from google.cloud import firestore
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+import functools
+import itertools
+import os
+import threading
+import time
 
-from .config import FIRESTORE_PROJECT_ID, FIRESTORE_FORCE_PROD, LOG_LEVEL
+from .config import (
+    FIRESTORE_PROJECT_ID,
+    FIRESTORE_FORCE_PROD,
+    FIRESTORE_CHUNK_READ_MODE,
+    FIRESTORE_CHANNEL_POOL,
+    FIRESTORE_KEEPALIVE_MS,
+    FIRESTORE_KEEPALIVE_TIMEOUT_MS,
+    CHUNK_EMBED_ENCODING,
+    LOG_LEVEL,
+    SITREP_MAX_MESSAGES,
+    SITREP_PAGE_SIZE,
+)
+from .embed_codec import decode_embed, encode_embed
+from .metrics import timed
+from .time_window import window_bounds
 import logging
 
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+
+CHUNK_CHARS = 700
+BULK_GET_LIMIT = 300
+
+
+def _firestore() -> Any:
+    # The SDK (gRPC, protobuf, api_core) is imported on first use rather than with this
+    # module, so importing the service does not pay for it before a client is needed
+    from google.cloud import firestore
+
+    return firestore
+
+
+def _field_filter(field: str, op: str, value: Any) -> Any:
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    return FieldFilter(field, op, value)
+
+
+def _expected_chunk_count(text: str) -> int:
+    # Writers slice by JS string length (UTF-16 units), which exceeds len() for non-BMP chars
+    units = max(len(text), len(text.encode("utf-16-le")) // 2)
+    return -(-units // CHUNK_CHARS)
+
+
+def _chunk_row(message_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "messageId": message_id,
+        "seq": data.get("seq"),
+        "text": data.get("text"),
+        "embed": decode_embed(data),
+        "len": data.get("len"),
+    }
+
+
+def _current_chunk_rows(message_id: str, text: str, docs: List[Any]) -> List[Dict[str, Any]]:
+    # An edit that shortens a message leaves its higher-seq chunk docs behind; keep only the
+    # seqs the current text implies, which are exactly the refs the bulk read requests
+    count = _expected_chunk_count(text)
+    rows = [_chunk_row(message_id, d.to_dict() or {}) for d in docs]
+    return [r for r in rows if isinstance(r["seq"], (int, float)) and 0 <= r["seq"] < count]
+
+
+# "norm" is no longer written; listed so rewrites clear it from older docs
+_EMBED_FIELDS = ("embed", "embedBlob", "encoding", "scale", "dim", "norm")
+
+
+def _chunk_doc(ch: Dict[str, Any]) -> Dict[str, Any]:
+    doc = {"seq": ch.get("seq"), "text": ch.get("text"), "len": ch.get("len")}
+    doc.update(encode_embed(ch.get("embed"), CHUNK_EMBED_ENCODING))
+    # Writes merge into existing docs; clear fields left over from another encoding
+    for name in _EMBED_FIELDS:
+        doc.setdefault(name, _firestore().DELETE_FIELD)
+    return doc
+
+
+def _window_doc(row: Dict[str, Any]) -> Dict[str, Any]:
+    doc = {
+        "text": row.get("text"),
+        "len": row.get("len"),
+        "tokens": row.get("tokens"),
+        "messageIds": list(row.get("messageIds") or []),
+    }
+    if row.get("lastAt") is not None:
+        doc["lastAt"] = row["lastAt"]
+    doc.update(encode_embed(row.get("embed"), CHUNK_EMBED_ENCODING))
+    for name in _EMBED_FIELDS:
+        doc.setdefault(name, _firestore().DELETE_FIELD)
+    return doc
+
+
+def _window_row(window_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    ids = [str(m) for m in data.get("messageIds") or []]
+    return {
+        "windowId": window_id,
+        "messageIds": ids,
+        "messageId": ids[-1] if ids else None,
+        "seq": 0,
+        "text": data.get("text"),
+        "embed": decode_embed(data),
+        "len": data.get("len"),
+        "tokens": data.get("tokens"),
+        "lastAt": data.get("lastAt"),
+    }
+
+
+def _resolve_project() -> Optional[str]:
+    # If FIRESTORE_FORCE_PROD is set, remove emulator host env var so SDK targets real Firestore
+    if FIRESTORE_FORCE_PROD:
+        # Common emulator env var used by Google SDKs
+        if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            os.environ.pop("FIRESTORE_EMULATOR_HOST", None)
+    return FIRESTORE_PROJECT_ID or None
+
+
+def _log_client_init(project: Optional[str], kind: str, pool: int = 1) -> None:
+    try:
+        emulator = os.environ.get("FIRESTORE_EMULATOR_HOST")
+        logging.getLogger("messageai").info(
+            {
+                "event": "firestore_client_init",
+                "kind": kind,
+                "pool": pool,
+                "project": project or "auto",
+                "using_emulator": bool(emulator),
+                "emulator_host": emulator or "",
+                "force_prod": FIRESTORE_FORCE_PROD,
+            }
+        )
+    except Exception:
+        pass
+
+
+# Client registry -----------------------------------------------------------------
+
+_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", FIRESTORE_KEEPALIVE_MS),
+    ("grpc.keepalive_timeout_ms", FIRESTORE_KEEPALIVE_TIMEOUT_MS),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+
+class _ChannelOptionsMixin:
+    """
+    Builds the GAPIC channel with our keepalive options. Mirrors the SDK's own
+    `_firestore_api_helper`, which hardcodes a 30s keepalive; emulator channels are left
+    to the SDK.
+    """
+
+    def _firestore_api_helper(self, transport, client_class, client_module) -> Any:
+        if self._firestore_api_internal is None and self._emulator_host is None:
+            channel = transport.create_channel(self._target, credentials=self._credentials, options=_CHANNEL_OPTIONS)
+            self._transport = transport(host=self._target, channel=channel)
+            self._firestore_api_internal = client_class(transport=self._transport, client_options=self._client_options)
+            client_module._client_info = self._client_info
+        return super()._firestore_api_helper(transport, client_class, client_module)
+
+
+@functools.lru_cache(maxsize=None)
+def _pooled_classes() -> Tuple[type, type]:
+    """(sync, async) client classes with our channel options, built once the SDK is imported."""
+    firestore = _firestore()
+
+    class _PooledClient(_ChannelOptionsMixin, firestore.Client):
+        pass
+
+    class _PooledAsyncClient(_ChannelOptionsMixin, firestore.AsyncClient):
+        pass
+
+    return _PooledClient, _PooledAsyncClient
+
+
+class _ClientRegistry:
+    """Process-wide, lazily built pool of Firestore clients handed out round-robin."""
+
+    def __init__(self, factory: Callable[[Optional[str]], Any], kind: str, size: int = FIRESTORE_CHANNEL_POOL) -> None:
+        self._factory = factory
+        self._kind = kind
+        self._size = size
+        self._clients: List[Any] = []
+        self._cycle: Any = None
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> None:
+        with self._lock:
+            if self._clients:
+                return
+            project = _resolve_project()
+            self._clients = [self._factory(project) for _ in range(self._size)]
+            self._cycle = itertools.cycle(self._clients)
+            _log_client_init(project, self._kind, self._size)
+
+    def get(self) -> Any:
+        if not self._clients:
+            self._ensure()
+        with self._lock:
+            return next(self._cycle)
+
+    def all(self) -> List[Any]:
+        self._ensure()
+        return list(self._clients)
+
+
+_SYNC_CLIENTS = _ClientRegistry(lambda project: _pooled_classes()[0](project=project), "sync")
+_ASYNC_CLIENTS = _ClientRegistry(lambda project: _pooled_classes()[1](project=project), "async")
+
 
 class FirestoreReader:
-    def __init__(self) -> None:
-        project = FIRESTORE_PROJECT_ID or None
-        # If FIRESTORE_FORCE_PROD is set, remove emulator host env var so SDK targets real Firestore
-        if FIRESTORE_FORCE_PROD:
-            # Common emulator env var used by Google SDKs
-            if os.environ.get("FIRESTORE_EMULATOR_HOST"):
-                os.environ.pop("FIRESTORE_EMULATOR_HOST", None)
-        self.client = firestore.Client(project=project)
-        try:
-            emulator = os.environ.get("FIRESTORE_EMULATOR_HOST")
-            logging.getLogger("messageai").info(
-                {
-                    "event": "firestore_client_init",
-                    "project": project or "auto",
-                    "using_emulator": bool(emulator),
-                    "emulator_host": emulator or "",
-                    "force_prod": FIRESTORE_FORCE_PROD,
-                }
-            )
-        except Exception:
-            pass
+    """Sync Firestore access. All instances share the process-wide client pool."""
+
+    @staticmethod
+    def shared_client() -> firestore.Client:
+        return _SYNC_CLIENTS.get()
+
+    @property
+    def client(self) -> firestore.Client:
+        return _SYNC_CLIENTS.get()
+
+    def warm(self) -> float:
+        """Opens every pooled channel (connect + auth) with a tiny read; returns elapsed ms."""
+        started = time.perf_counter()
+        for client in _SYNC_CLIENTS.all():
+            list(client.collection("missions").limit(1).stream())
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def create_mission(self, data: Dict[str, Any]) -> str:
+        doc = self.client.collection("missions").document()
+        doc.set(data)
+        return doc.id
 
     def fetch_recent_messages(self, chat_id: Optional[str], limit: int = 50) -> List[Dict[str, Any]]:
         # If chat_id is provided, read from that chat; else query recent across all chats (dev-friendly approximation)
@@ -38,53 +247,291 @@ class FirestoreReader:
             # Prefer createdAt ordering when present; gracefully fall back to timestamp
             try:
                 docs = list(
-                    coll.order_by("createdAt", direction=firestore.Query.DESCENDING).limit(limit).stream()
+                    coll.order_by("createdAt", direction=_firestore().Query.DESCENDING).limit(limit).stream()
                 )
                 if not docs:
                     raise ValueError("no_docs_createdAt")
             except Exception:
                 docs = list(
-                    coll.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit).stream()
+                    coll.order_by("timestamp", direction=_firestore().Query.DESCENDING).limit(limit).stream()
                 )
             return [d.to_dict() | {"id": d.id} for d in docs]
         else:
             # Sample across a few chats: read last N from a synthetic index if available; fallback empty
             return []
 
-    # Chunk I/O -----------------------------------------------------------------
-    def fetch_recent_chunks(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+    def fetch_messages_since(self, chat_id: str, field: str, since: Any, limit: int = 50) -> List[Dict[str, Any]]:
+        """Messages with `field >= since`, newest first (>= so equal server timestamps are not lost)."""
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        query = coll.where(filter=_field_filter(field, ">=", since)).order_by(field, direction=_firestore().Query.DESCENDING).limit(limit)
+        return [d.to_dict() | {"id": d.id} for d in query.stream()]
+
+    def fetch_messages_in_window(
+        self, chat_id: str, since: datetime, page_size: int = SITREP_PAGE_SIZE, max_messages: int = SITREP_MAX_MESSAGES
+    ) -> List[Dict[str, Any]]:
+        """
+        Messages created at or after `since`, newest first, read in pages of `page_size`
+        (cursor after each page's last doc) up to `max_messages`. Filters on `createdAt`,
+        falling back to `timestamp` when no message has a createdAt in range.
+        """
         coll = self.client.collection("chats").document(chat_id).collection("messages")
+        for field, value in window_bounds(since):
+            query = coll.where(filter=_field_filter(field, ">=", value)).order_by(field, direction=_firestore().Query.DESCENDING)
+            docs: List[Any] = []
+            try:
+                while len(docs) < max_messages:
+                    limit = min(page_size, max_messages - len(docs))
+                    page = list((query.start_after(docs[-1]) if docs else query).limit(limit).stream())
+                    docs.extend(page)
+                    if len(page) < limit:
+                        break
+            except Exception:
+                docs = []
+            if docs:
+                return [d.to_dict() | {"id": d.id} for d in docs]
+        return []
+
+    # Chunk I/O -----------------------------------------------------------------
+    def _recent_message_docs(self, coll: Any, limit_messages: int) -> List[Any]:
         try:
-            msgs = list(coll.order_by("createdAt", direction=firestore.Query.DESCENDING).limit(limit_messages).stream())
+            return list(coll.order_by("createdAt", direction=_firestore().Query.DESCENDING).limit(limit_messages).stream())
         except Exception:
-            msgs = list(coll.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit_messages).stream())
+            return list(coll.order_by("timestamp", direction=_firestore().Query.DESCENDING).limit(limit_messages).stream())
+
+    def fetch_recent_chunks(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+        if FIRESTORE_CHUNK_READ_MODE == "bulk":
+            try:
+                return self.fetch_recent_chunks_bulk(chat_id, limit_messages=limit_messages)
+            except Exception as e:
+                logging.getLogger("messageai").warning(
+                    {"event": "chunk_bulk_read_fallback", "chat_id": chat_id, "error": str(e)}
+                )
+        return self.fetch_recent_chunks_serial(chat_id, limit_messages=limit_messages)
+
+    def fetch_recent_message_heads(self, chat_id: str, limit_messages: int = 200) -> List[Tuple[str, str]]:
+        """(messageId, text) for the recent messages whose chunks `fetch_recent_chunks` reads."""
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        return [(m.id, str((m.to_dict() or {}).get("text") or "")) for m in self._recent_message_docs(coll, limit_messages)]
+
+    def fetch_recent_chunks_bulk(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+        """
+        Same rows as `fetch_recent_chunks_serial`, but the chunk docs are read with batched
+        `get_all` calls. Chunk ids are `str(seq)` and the count follows from the message text
+        (700-char chunks, see CF `embedOnMessageWrite`), so the refs are known up front.
+        Chunks beyond that count (left behind when an edit shortened the message) are stale
+        and skipped by both paths.
+        """
+        return self.fetch_chunks_for_messages(chat_id, self.fetch_recent_message_heads(chat_id, limit_messages))
+
+    def fetch_chunks_for_messages(self, chat_id: str, heads: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Chunk rows for the given (messageId, text) pairs, in the given order, via `get_all`."""
+        client = self.client
+        coll = client.collection("chats").document(chat_id).collection("messages")
+        keys: List[tuple] = []
+        for mid, text in heads:
+            # Untrimmed length can only over-count; refs to missing docs are skipped below
+            for seq in range(_expected_chunk_count(text)):
+                keys.append((mid, coll.document(mid).collection("chunks").document(str(seq))))
+        found: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(keys), BULK_GET_LIMIT):
+            for snap in client.get_all([ref for _, ref in keys[i : i + BULK_GET_LIMIT]]):
+                if snap.exists:
+                    found[snap.reference.path] = snap.to_dict() or {}
+        chunks: List[Dict[str, Any]] = []
+        for mid, ref in keys:
+            data = found.get(ref.path)
+            if data is not None:
+                chunks.append(_chunk_row(mid, data))
+        return chunks
+
+    def fetch_recent_chunks_serial(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+        """Reference path: one `chunks` subcollection query per message (N+1 round-trips)."""
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        msgs = self._recent_message_docs(coll, limit_messages)
         chunks: List[Dict[str, Any]] = []
         for m in msgs:
             mid = m.id
             ccoll = coll.document(mid).collection("chunks")
             cd = list(ccoll.order_by("seq").stream())
-            for d in cd:
-                data = d.to_dict() or {}
-                chunks.append({
-                    "messageId": mid,
-                    "seq": data.get("seq"),
-                    "text": data.get("text"),
-                    "embed": data.get("embed"),
-                    "len": data.get("len"),
-                })
+            chunks.extend(_current_chunk_rows(mid, str((m.to_dict() or {}).get("text") or ""), cd))
         return chunks
 
     def write_message_chunks(self, chat_id: str, message_id: str, chunks: List[Dict[str, Any]]) -> None:
-        base = self.client.collection("chats").document(chat_id).collection("messages").document(message_id)
-        batch = self.client.batch()
+        client = self.client
+        base = client.collection("chats").document(chat_id).collection("messages").document(message_id)
+        batch = client.batch()
         for ch in chunks:
             ref = base.collection("chunks").document(str(ch.get("seq")))
-            batch.set(ref, {
-                "seq": ch.get("seq"),
-                "text": ch.get("text"),
-                "embed": ch.get("embed"),
-                "len": ch.get("len"),
-            }, merge=True)
+            batch.set(ref, _chunk_doc(ch), merge=True)
         batch.commit()
 
+    # Conversation windows: chats/{chatId}/windows/{windowId} (see app/chunking.py) ---------
+    def fetch_recent_windows(self, chat_id: str, limit: int = 64) -> List[Dict[str, Any]]:
+        """Window rows, newest last message first."""
+        coll = self.client.collection("chats").document(chat_id).collection("windows")
+        try:
+            docs = list(coll.order_by("lastAt", direction=_firestore().Query.DESCENDING).limit(limit).stream())
+        except Exception:
+            docs = list(coll.limit(limit).stream())
+        return [_window_row(d.id, d.to_dict() or {}) for d in docs]
+
+    def write_windows(self, chat_id: str, windows: List[Dict[str, Any]]) -> None:
+        client = self.client
+        coll = client.collection("chats").document(chat_id).collection("windows")
+        for i in range(0, len(windows), BULK_GET_LIMIT):
+            batch = client.batch()
+            for row in windows[i : i + BULK_GET_LIMIT]:
+                batch.set(coll.document(row["windowId"]), _window_doc(row), merge=True)
+            batch.commit()
+
+
+
+
+class AsyncFirestoreReader:
+    """
+    Async counterpart of `FirestoreReader` on `firestore.AsyncClient`, so request handlers
+    await Firestore instead of parking a threadpool worker. Same queries, same rows.
+    """
+
+    @staticmethod
+    def shared_client() -> firestore.AsyncClient:
+        return _ASYNC_CLIENTS.get()
+
+    @property
+    def client(self) -> firestore.AsyncClient:
+        return _ASYNC_CLIENTS.get()
+
+    def prepare_clients(self) -> None:
+        """Builds the pooled clients (SDK import, credential discovery); blocking, so run it in a thread."""
+        _ASYNC_CLIENTS.all()
+
+    async def warm(self) -> float:
+        started = time.perf_counter()
+        for client in _ASYNC_CLIENTS.all():
+            await self._stream(client.collection("missions").limit(1))
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    @timed("firestore_write")
+    async def create_mission(self, data: Dict[str, Any]) -> str:
+        doc = self.client.collection("missions").document()
+        await doc.set(data)
+        return doc.id
+
+    @staticmethod
+    async def _stream(query: Any) -> List[Any]:
+        return [d async for d in query.stream()]
+
+    @timed("firestore_read")
+    async def fetch_recent_messages(self, chat_id: Optional[str], limit: int = 50) -> List[Dict[str, Any]]:
+        if not chat_id:
+            return []
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        # Prefer createdAt ordering when present; gracefully fall back to timestamp
+        try:
+            docs = await self._stream(coll.order_by("createdAt", direction=_firestore().Query.DESCENDING).limit(limit))
+            if not docs:
+                raise ValueError("no_docs_createdAt")
+        except Exception:
+            docs = await self._stream(coll.order_by("timestamp", direction=_firestore().Query.DESCENDING).limit(limit))
+        return [d.to_dict() | {"id": d.id} for d in docs]
+
+    @timed("firestore_read")
+    async def fetch_messages_since(self, chat_id: str, field: str, since: Any, limit: int = 50) -> List[Dict[str, Any]]:
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        query = coll.where(filter=_field_filter(field, ">=", since)).order_by(field, direction=_firestore().Query.DESCENDING).limit(limit)
+        return [d.to_dict() | {"id": d.id} for d in await self._stream(query)]
+
+    @timed("firestore_read")
+    async def fetch_messages_in_window(
+        self, chat_id: str, since: datetime, page_size: int = SITREP_PAGE_SIZE, max_messages: int = SITREP_MAX_MESSAGES
+    ) -> List[Dict[str, Any]]:
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        for field, value in window_bounds(since):
+            query = coll.where(filter=_field_filter(field, ">=", value)).order_by(field, direction=_firestore().Query.DESCENDING)
+            docs: List[Any] = []
+            try:
+                while len(docs) < max_messages:
+                    limit = min(page_size, max_messages - len(docs))
+                    page = await self._stream((query.start_after(docs[-1]) if docs else query).limit(limit))
+                    docs.extend(page)
+                    if len(page) < limit:
+                        break
+            except Exception:
+                docs = []
+            if docs:
+                return [d.to_dict() | {"id": d.id} for d in docs]
+        return []
+
+    async def _recent_message_docs(self, coll: Any, limit_messages: int) -> List[Any]:
+        try:
+            return await self._stream(coll.order_by("createdAt", direction=_firestore().Query.DESCENDING).limit(limit_messages))
+        except Exception:
+            return await self._stream(coll.order_by("timestamp", direction=_firestore().Query.DESCENDING).limit(limit_messages))
+
+    async def fetch_recent_chunks(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+        if FIRESTORE_CHUNK_READ_MODE == "bulk":
+            try:
+                return await self.fetch_recent_chunks_bulk(chat_id, limit_messages=limit_messages)
+            except Exception as e:
+                logging.getLogger("messageai").warning(
+                    {"event": "chunk_bulk_read_fallback", "chat_id": chat_id, "error": str(e)}
+                )
+        return await self.fetch_recent_chunks_serial(chat_id, limit_messages=limit_messages)
+
+    async def fetch_recent_message_heads(self, chat_id: str, limit_messages: int = 200) -> List[Tuple[str, str]]:
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        return [(m.id, str((m.to_dict() or {}).get("text") or "")) for m in await self._recent_message_docs(coll, limit_messages)]
+
+    async def fetch_recent_chunks_bulk(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+        return await self.fetch_chunks_for_messages(chat_id, await self.fetch_recent_message_heads(chat_id, limit_messages))
+
+    async def fetch_chunks_for_messages(self, chat_id: str, heads: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        client = self.client
+        coll = client.collection("chats").document(chat_id).collection("messages")
+        keys: List[tuple] = []
+        for mid, text in heads:
+            for seq in range(_expected_chunk_count(text)):
+                keys.append((mid, coll.document(mid).collection("chunks").document(str(seq))))
+        found: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(keys), BULK_GET_LIMIT):
+            async for snap in client.get_all([ref for _, ref in keys[i : i + BULK_GET_LIMIT]]):
+                if snap.exists:
+                    found[snap.reference.path] = snap.to_dict() or {}
+        return [_chunk_row(mid, found[ref.path]) for mid, ref in keys if ref.path in found]
+
+    async def fetch_recent_chunks_serial(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+        coll = self.client.collection("chats").document(chat_id).collection("messages")
+        msgs = await self._recent_message_docs(coll, limit_messages)
+        chunks: List[Dict[str, Any]] = []
+        for m in msgs:
+            docs = await self._stream(coll.document(m.id).collection("chunks").order_by("seq"))
+            chunks.extend(_current_chunk_rows(m.id, str((m.to_dict() or {}).get("text") or ""), docs))
+        return chunks
+
+    async def write_message_chunks(self, chat_id: str, message_id: str, chunks: List[Dict[str, Any]]) -> None:
+        client = self.client
+        base = client.collection("chats").document(chat_id).collection("messages").document(message_id)
+        batch = client.batch()
+        for ch in chunks:
+            ref = base.collection("chunks").document(str(ch.get("seq")))
+            batch.set(ref, _chunk_doc(ch), merge=True)
+        await batch.commit()
+
+    @timed("chunk_read")
+    async def fetch_recent_windows(self, chat_id: str, limit: int = 64) -> List[Dict[str, Any]]:
+        coll = self.client.collection("chats").document(chat_id).collection("windows")
+        try:
+            docs = await self._stream(coll.order_by("lastAt", direction=_firestore().Query.DESCENDING).limit(limit))
+        except Exception:
+            docs = await self._stream(coll.limit(limit))
+        return [_window_row(d.id, d.to_dict() or {}) for d in docs]
 
+    @timed("firestore_write")
+    async def write_windows(self, chat_id: str, windows: List[Dict[str, Any]]) -> None:
+        client = self.client
+        coll = client.collection("chats").document(chat_id).collection("windows")
+        for i in range(0, len(windows), BULK_GET_LIMIT):
+            batch = client.batch()
+            for row in windows[i : i + BULK_GET_LIMIT]:
+                batch.set(coll.document(row["windowId"]), _window_doc(row), merge=True)
+            await batch.commit()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import re
+
+from .config import PREGATE_ESCALATE_THRESHOLD, PREGATE_SKIP_THRESHOLD
+
+
+# LLM gate prompts --------------------------------------------------------------
+
+GATE_TOOLS = [
+    "threats/extract for when the user mentions threats or potential threats",
+    "tasks/extract for when the user mentions tasks or potential tasks",
+    "sitrep/summarize for when the user requests a sitrep",
+    "template/warnord for when the user requests a warnord populated from the recent messages",
+    "template/opord for when the user requests an opord populated from the recent messages",
+    "template/frago for when the user requests a frago populated from the recent messages",
+    "workflow/casevac/run for when the user sends a message indicating a major medical emergency",
+    "geo/extract",
+]
+
+GATE_SYSTEM_PROMPT = (
+    "You are a gate model. Decide whether to escalate. "
+    "If the message mentions threats, potential threats, tasks to take, medical emergencies, or geospatial info, return {\\\"escalate\\\": true}. "
+    "If uncertain, return {\\\"escalate\\\": true}. Return only JSON."
+)
+
+
+def gate_user_prompt(text: str) -> str:
+    # Minimal tools awareness; no chat history to keep it cheap
+    return (
+        "You are a gate model. Decide if the following single message should be escalated "
+        "to a full assistant with these tools available: " + ", ".join(GATE_TOOLS) + ".\n"
+        "Return STRICT JSON: {\"escalate\": boolean}. If uncertain, set escalate=true.\n\n"
+        f"MESSAGE:\n{text}"
+    )
+
+
+# Local pre-gate ----------------------------------------------------------------
+# Keyword families mirror the triggers the gate prompt lists. Each family carries the
+# probability-like weight it contributes to the escalate score (combined noisy-or).
+
+_FAMILIES: Dict[str, Tuple[float, List[str]]] = {
+    "threats": (0.9, [
+        r"contact", r"enemy", r"hostiles?", r"opfor", r"shots?\s+fired", r"gunfire", r"small\s+arms",
+        r"ied", r"improvised\s+explosive", r"vbied", r"mortars?", r"rpg", r"sniper", r"ambush",
+        r"armou?r", r"tanks?", r"apcs?", r"ifvs?", r"bmp-?\d*", r"btr-?\d*", r"uas", r"uavs?", r"drones?",
+        r"incoming", r"indirect\s+fire", r"troops\s+in\s+contact", r"tic", r"threat\w*", r"attack\w*",
+        r"counterattack\w*", r"recon\s+elements?", r"spotted", r"eyes\s+on",
+    ]),
+    "medical": (0.95, [
+        r"casualt\w*", r"wounded", r"injur\w*", r"kia", r"wia", r"medevac", r"casevac", r"9-?line",
+        r"bleeding", r"tourniquet", r"unconscious", r"not\s+breathing", r"urgent\s+surgical", r"medic",
+        r"litter", r"ambulatory", r"hlz", r"pzs?",
+    ]),
+    "requests": (0.95, [
+        r"sitrep", r"opord", r"warno", r"warnord", r"frago\w*", r"fragord", r"spot\s*rep",
+        r"salute\s+report", r"mission\s+plan",
+    ]),
+    "tasks": (0.7, [
+        r"need\s+to", r"needs\s+to", r"must", r"tasking", r"task\w*", r"assign\w*", r"nlt", r"no\s+later\s+than",
+        r"be\s+prepared", r"beprep", r"prep(?:are)?", r"secure", r"clear", r"establish", r"move\s+to",
+        r"report\s+(?:back|when|at)", r"send\s+me", r"push\s+me", r"confirm", r"request\w*", r"ld",
+    ]),
+    "geo": (0.8, [
+        r"\d{1,2}[c-hj-np-x]\s*[a-hj-np-z]{2}\s*\d{2,5}\s*\d{2,5}",  # MGRS, e.g. 38T MN 2385 5650
+        r"grid", r"-?\d{1,2}\.\d+\s*,\s*-?\d{1,3}\.\d+",            # decimal lat, lon
+        r"\d+(?:\.\d+)?\s*(?:km|klicks?|meters|m)\s+(?:north|south|east|west|n|s|e|w)\w*",
+        r"obj\s+\w+", r"checkpoint", r"cp\s*\d+\w?", r"trp", r"phase\s+line", r"pl\s+\w+", r"msr",
+    ]),
+}
+
+# Whole-message acknowledgements / chatter that never warrant the LLM gate
+_ACK_WORDS = {
+    "ok", "okay", "k", "kk", "copy", "copied", "roger", "rgr", "wilco", "ack", "acknowledged", "lol", "lmao",
+    "haha", "ha", "thanks", "thx", "ty", "yes", "no", "yep", "nope", "yup", "sure", "cool", "nice", "good",
+    "great", "understood", "out", "over", "that", "all", "got", "it", "will", "do", "sounds", "sir", "solid",
+}
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _compile(patterns: List[str]) -> re.Pattern:
+    return re.compile(r"(?<![a-z0-9])(?:" + "|".join(patterns) + r")(?![a-z0-9])", re.IGNORECASE)
+
+
+_FAMILY_PATTERNS = {name: (weight, _compile(patterns)) for name, (weight, patterns) in _FAMILIES.items()}
+
+
+@dataclass
+class PreGateResult:
+    """`escalate` is None when the message is uncertain and must go to the LLM voters."""
+
+    escalate: Optional[bool]
+    score: float
+    families: List[str] = field(default_factory=list)
+    reason: str = ""
+
+
+def score_message(text: str) -> Tuple[float, List[str], str]:
+    """Escalate score in [0, 1], the trigger families that matched, and a short reason."""
+    lowered = (text or "").strip().lower()
+    tokens = _TOKEN.findall(lowered)
+    if not tokens:
+        return 0.0, [], "empty"
+    hits = [name for name, (_, pattern) in _FAMILY_PATTERNS.items() if pattern.search(lowered)]
+    if hits:
+        miss = 1.0
+        for name in hits:
+            miss *= 1.0 - _FAMILY_PATTERNS[name][0]
+        return 1.0 - miss, hits, "keywords"
+    if all(t in _ACK_WORDS for t in tokens):
+        return 0.02, [], "ack"
+    # No trigger words: short chatter is rarely actionable, longer text may be. Sits just above
+    # the default skip threshold so only acks skip unless operators opt in
+    if len(tokens) <= 6:
+        return 0.2, [], "short_no_trigger"
+    return 0.4, [], "no_trigger"
+
+
+def classify_locally(
+    text: str,
+    escalate_threshold: float = PREGATE_ESCALATE_THRESHOLD,
+    skip_threshold: float = PREGATE_SKIP_THRESHOLD,
+) -> PreGateResult:
+    score, families, reason = score_message(text)
+    if score >= escalate_threshold:
+        return PreGateResult(True, score, families, reason)
+    if score <= skip_threshold:
+        return PreGateResult(False, score, families, reason)
+    return PreGateResult(None, score, families, reason)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+import asyncio
+import threading
+import time
+
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Builds a service object on first use (or when the startup task resolves it) and
+    proxies attribute access to it, so call sites keep writing `llm.chat(...)`.
+    Construction runs once even when threads or tasks race for it; async code waits with
+    `await aresolve(obj)`, which never blocks the event loop on a build in progress.
+
+    The proxy's own state is underscore-prefixed (and private names are never proxied),
+    so every public attribute, including `name` or `get`, reaches the wrapped object.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]) -> None:
+        self._name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._built = False
+        self._lock = threading.Lock()
+        # Set while a build runs (or after it finished); waiters share its result
+        self._future: Optional[Future] = None
+        self._build_ms: Optional[float] = None
+
+    def _get(self) -> T:
+        if self._built:
+            return self._value  # type: ignore[return-value]
+        with self._lock:
+            fut = self._future
+            owner = fut is None
+            if owner:
+                fut = self._future = Future()
+        if owner:
+            started = time.perf_counter()
+            try:
+                value = self._factory()
+            except BaseException as e:
+                # Not cached: the next caller retries the build
+                with self._lock:
+                    self._future = None
+                fut.set_exception(e)
+                raise
+            self._value = value
+            self._build_ms = round((time.perf_counter() - started) * 1000, 1)
+            self._built = True
+            fut.set_result(value)
+        return fut.result()
+
+    async def _aget(self) -> T:
+        if self._built:
+            return self._value  # type: ignore[return-value]
+        with self._lock:
+            fut = self._future
+        if fut is None:
+            # Nobody is building yet: build in a worker thread
+            return await asyncio.to_thread(self._get)
+        return await asyncio.wrap_future(fut)
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only reached for names not defined on Lazy itself; private names are never proxied
+        # (copy/pickle probe them before __init__ has run)
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._get(), attr)
+
+    def __repr__(self) -> str:
+        return f"Lazy({self._name!r}, built={self._built})"
+
+
+def resolve(obj: Any) -> Any:
+    """The built object behind a `Lazy` (building it if needed, blocking); anything else as is."""
+    return obj._get() if isinstance(obj, Lazy) else obj
+
+
+async def aresolve(obj: Any) -> Any:
+    """`resolve` for async code: a build runs (or is waited for) off the event loop."""
+    return await obj._aget() if isinstance(obj, Lazy) else obj
+
+
+def build_state(obj: Any) -> Dict[str, Any]:
+    """Whether `obj` is built and how long its build took (plain objects count as built)."""
+    if isinstance(obj, Lazy):
+        return {"ready": obj._built, "build_ms": obj._build_ms}
+    return {"ready": True, "build_ms": None}
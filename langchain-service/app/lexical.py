@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Container, Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import re
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Function words only: radio brevity words ("copy", "roger", "north") carry meaning here
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index (term -> {doc id: term frequency}). Documents can be
+    added and removed one at a time, so a chat's index follows its message window.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.terms: Dict[str, Tuple[str, ...]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.lengths:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(terms.values())
+        self.terms[doc_id] = tuple(terms)
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str) -> None:
+        length = self.lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.terms.pop(doc_id, ()):
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+
+    def retain(self, keep: Iterable[str]) -> None:
+        keep = set(keep)
+        for doc_id in [d for d in self.lengths if d not in keep]:
+            self.remove(doc_id)
+
+    def footprint(self) -> int:
+        # Rough bytes: a dict slot + small int per posting, plus per-doc bookkeeping
+        return 64 * sum(len(docs) for docs in self.postings.values()) + 96 * len(self.lengths)
+
+    def search(self, query: str, k: int, allowed: Optional[Container[str]] = None) -> List[Tuple[str, float]]:
+        """Best `k` (doc id, score) with score > 0, best first; only ids in `allowed` when given."""
+        n = len(self.lengths)
+        if n == 0 or k <= 0:
+            return []
+        avgdl = self.total_length / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = tf + self.k1 * (1.0 - self.b + self.b * self.lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuses ranked id lists: score(id) = sum over lists of 1 / (k + rank), rank from 1."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Protocol, Tuple
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .config import LLM_CACHE_BACKEND, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS
+
+
+def llm_cache_key(model: str, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int) -> str:
+    """Content address of a chat completion request (everything that shapes the response)."""
+    payload = json.dumps([model, system_prompt, user_prompt, float(temperature), int(max_tokens)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(Protocol):
+    def get(self, key: str) -> Optional[str]: ...
+
+    def put(self, key: str, value: str) -> None: ...
+
+    def stats(self) -> Dict[str, Any]: ...
+
+
+class MemoryResponseCache:
+    """Per-process LRU of completion texts with a TTL."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: float = LLM_CACHE_TTL_SECONDS) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SqliteResponseCache:
+    """
+    Completion texts in a SQLite file, so all workers on an instance share hits. Expiry uses
+    wall-clock time; least-recently-used rows are pruned once the table outgrows the bound.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: float = LLM_CACHE_TTL_SECONDS) -> None:
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_used ON llm_responses(used_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, value, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            # Pruning scans the table; amortize it over a slice of the size bound
+            if self._writes % max(1, self.max_entries // 10) == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM llm_responses WHERE key IN ("
+            "SELECT key FROM llm_responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        return {"backend": "sqlite", "size": size, "hits": self.hits, "misses": self.misses}
+
+
+def build_response_cache(backend: str = LLM_CACHE_BACKEND) -> Optional[ResponseCache]:
+    """Cache for the configured backend ("memory", "sqlite", or "off"); falls back to memory if SQLite fails."""
+    if backend in {"off", "none", "0", ""}:
+        return None
+    if backend == "sqlite":
+        try:
+            return SqliteResponseCache()
+        except Exception as e:
+            logging.getLogger("messageai.providers").warning(
+                json.dumps({"event": "llm_cache_sqlite_error", "path": LLM_CACHE_PATH, "error": str(e)})
+            )
+    return MemoryResponseCache()
@@ -1,12 +1,14 @@
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from contextlib import asynccontextmanager
 from pathlib import Path
+import asyncio
 import time
 import hmac
 import hashlib
 import json
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 from .schemas import (
     AiRequestEnvelope,
@@ -22,28 +24,169 @@ from .schemas import (
     TemplateDocData,
     MissionPlanData,
 )
-from .providers import OpenAIProvider
-from .firestore_client import FirestoreReader
+from .providers import AsyncOpenAIProvider
+from .llm_cache import build_response_cache
+from .embed_cache import build_embedding_cache
+from .firestore_client import AsyncFirestoreReader
 from .rag import RAGCache
-from .embedding_store import FirestoreEmbeddingStore
-from .config import LANGCHAIN_SHARED_SECRET, SIGNATURE_MAX_AGE_SECONDS, LOG_LEVEL
+from .embedding_store import AsyncFirestoreEmbeddingStore
+from .vector_store import LocalVectorStore
+from .singleflight import SingleFlight, flight_key
+from .lazy import Lazy, aresolve, build_state, resolve
+from .warm_jobs import WarmJobQueue, WarmQueueFull, warm_chat
+from .metrics import observe_request, observe_stage, registry, request_notes, request_scope, span
+from .gate import GATE_SYSTEM_PROMPT, classify_locally, gate_user_prompt
+from .time_window import parse_time_window, window_start
+from .config import LANGCHAIN_SHARED_SECRET, SIGNATURE_MAX_AGE_SECONDS, LOG_LEVEL, GATE_VOTES, GATE_QUORUM, PREGATE_ENABLED, FIRESTORE_WARMUP, VECTOR_STORE_DIR, VECTOR_STORE_MAX_SEGMENTS, VECTOR_STORE_EMPTY_TTL_SECONDS, VECTOR_STORE_MAX_MESSAGES, VECTOR_STORE_MAX_BYTES, LLM_CACHE_DISABLED_ENDPOINTS, RAG_CHUNKING, WINDOW_READ_LIMIT, RAG_RETRIEVAL, RAG_LEXICAL_ENDPOINTS, RAG_CONTEXT_TOKENS, RAG_CONTEXT_TOKENS_BY_ENDPOINT
 import logging
 
 
 logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO))
 logger = logging.getLogger("messageai")
 
-app = FastAPI(title="MessageAI LangChain Service", version="0.1.0")
-llm = OpenAIProvider()
-fs = FirestoreReader()
-store = FirestoreEmbeddingStore(fs)
-rag = RAGCache(llm, store)
+# RAG query strings used by the endpoints below. They are constant (or drawn from a small
+# set), so their vectors are pre-seeded into the query cache at startup.
+SITREP_QUERY = "Summarize the last {} of unit activity into a SITREP."
+ROUTER_QUERY = "Assistant decision context"
+TEMPLATE_QUERY = "Fill {} template from chat context"
+TASKS_QUERY = "Extract actionable tasks (title, description, priority 1-5)"
+MISSION_QUERY = "Extract mission plan summary and tasks from chat context"
+RAG_SEED_QUERIES = (
+    [SITREP_QUERY.format(w) for w in ("6h", "12h", "24h")]
+    + [TEMPLATE_QUERY.format(t) for t in ("WARNORD", "OPORD", "FRAGO", "MEDEVAC")]
+    + [ROUTER_QUERY, TASKS_QUERY, MISSION_QUERY]
+)
+
+# Async clients: handlers await OpenAI/Firestore on the event loop instead of holding a
+# threadpool worker for the whole call, so one worker can carry many in-flight requests.
+# Each is built lazily, by the startup task in a worker thread or on first use, whichever
+# comes first, so the process answers /livez while the OpenAI/Firestore SDKs load.
+llm = Lazy("llm", lambda: AsyncOpenAIProvider(build_response_cache(), embed_cache=build_embedding_cache()))
+fs = Lazy("firestore", AsyncFirestoreReader)
+store = Lazy("store", lambda: AsyncFirestoreEmbeddingStore(
+    resolve(fs), LocalVectorStore(VECTOR_STORE_DIR, VECTOR_STORE_MAX_SEGMENTS, VECTOR_STORE_EMPTY_TTL_SECONDS, VECTOR_STORE_MAX_MESSAGES, VECTOR_STORE_MAX_BYTES) if VECTOR_STORE_DIR else None
+))
+rag = Lazy("rag", lambda: RAGCache(resolve(llm), resolve(store)))
+# Concurrent identical chat-wide requests (several users opening the same chat) share one run
+flights = SingleFlight()
+
+
+async def _run_warm(job: Any) -> None:
+    # Reads the globals per job so they can be swapped; waits for a build without blocking the loop
+    await warm_chat(job, await aresolve(fs), await aresolve(llm), await aresolve(store))
+
+
+# /rag/warm runs here, off the request path
+warm_jobs = WarmJobQueue(_run_warm)
+_background_tasks: set[asyncio.Task] = set()
+
+# LLM calls from these endpoints always reach the model: gate votes are sampled for a quorum
+# and CASEVAC drives a side-effecting workflow
+_LLM_CACHE_NEVER = {"/assistant/gate", "/intent/casevac/detect", "/workflow/casevac/run"}
+
+
+def _llm_cache(endpoint: str) -> bool:
+    return endpoint not in _LLM_CACHE_NEVER and endpoint not in LLM_CACHE_DISABLED_ENDPOINTS
+
+
+def _retrieval(endpoint: str) -> str:
+    # Latency-sensitive endpoints can skip the query embed entirely (BM25 only)
+    return "lexical" if endpoint in RAG_LEXICAL_ENDPOINTS else RAG_RETRIEVAL
+
+
+def _context_tokens(endpoint: str) -> int:
+    return RAG_CONTEXT_TOKENS_BY_ENDPOINT.get(endpoint, RAG_CONTEXT_TOKENS)
+
+
+def _spawn(coro) -> asyncio.Task:
+    # Keep a reference so fire-and-forget tasks are not garbage collected mid-flight
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _warm_firestore() -> None:
+    # Open the pooled gRPC channels now rather than on the first (CASEVAC) request
+    try:
+        elapsed_ms = await fs.warm()
+        logger.info(json.dumps({"event": "firestore_warm", "elapsed_ms": elapsed_ms}))
+    except Exception as e:
+        logger.warning(json.dumps({"event": "firestore_warm_error", "error": str(e)}))
+
+
+# Startup progress reported by /readyz
+_startup: Dict[str, Any] = {"started_at": time.time(), "services": False, "firestore_clients": False, "query_seed": False, "error": None}
+
+
+def _services() -> Tuple[Tuple[str, Any], ...]:
+    # Looked up per call: tests and scripts swap the module globals
+    return (("llm", llm), ("firestore", fs), ("store", store), ("rag", rag))
+
+
+async def _build_services() -> None:
+    started = time.perf_counter()
+    try:
+        for _, service in _services():
+            await aresolve(service)
+        _startup["services"] = True
+        # SDK import and credential discovery block, so do them here rather than on the loop
+        await asyncio.to_thread(resolve(fs).prepare_clients)
+        _startup["firestore_clients"] = True
+    except Exception as e:
+        _startup["error"] = str(e)
+        logger.warning(json.dumps({"event": "startup_error", "error": str(e)}))
+    logger.info(json.dumps({
+        "event": "services_built",
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "build_ms": {key: build_state(s)["build_ms"] for key, s in _services() if isinstance(s, Lazy)},
+        "ready": _ready(),
+    }))
+
+
+async def _startup_tasks() -> None:
+    await _build_services()
+    if FIRESTORE_WARMUP and _startup["firestore_clients"]:
+        _spawn(_warm_firestore())
+    # Seeded after the build so a slow embeddings API never delays readiness
+    if _startup["services"]:
+        await rag.apreseed_queries(RAG_SEED_QUERIES)
+        _startup["query_seed"] = True
+
+
+def _ready() -> bool:
+    return bool(_startup["services"] and _startup["firestore_clients"])
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    _spawn(_startup_tasks())
+    yield
+    await warm_jobs.close()
+
+
+app = FastAPI(title="MessageAI LangChain Service", version="0.1.0", lifespan=lifespan)
+
+_PROBE_PATHS = {"/healthz", "/livez", "/readyz", "/metrics", "/docs", "/openapi.json"}
+
+
+@app.middleware("http")
+async def await_services(request: Request, call_next):
+    # Handlers reach the services through sync attribute access on the Lazy proxies; a request
+    # that arrives mid-build waits here, off the loop, instead of blocking it on the build lock
+    if request.url.path not in _PROBE_PATHS and not all(build_state(s)["ready"] for _, s in _services()):
+        for _, service in _services():
+            try:
+                await aresolve(service)
+            except Exception:
+                pass  # surfaces in the handler that needs the service; others still work
+    return await call_next(request)
 
 
 @app.middleware("http")
 async def hmac_verification(request: Request, call_next):
-    # Skip for health and docs
-    if request.url.path in {"/healthz", "/docs", "/openapi.json"}:
+    # Skip for health, metrics and docs
+    if request.url.path in _PROBE_PATHS:
         return await call_next(request)
 
     if not LANGCHAIN_SHARED_SECRET:
@@ -86,11 +229,13 @@ async def hmac_verification(request: Request, call_next):
         }))
         return JSONResponse(status_code=401, content={"error": "Signature expired"})
 
-    body = await request.body()
-    payload_hash = hashlib.sha256(body).hexdigest()
-    base = f"{request_id}.{ts}.{payload_hash}"
-    expected = hmac.new(LANGCHAIN_SHARED_SECRET.encode(), base.encode(), hashlib.sha256).hexdigest()
-    if not hmac.compare_digest(sig, expected):
+    with span("hmac"):
+        body = await request.body()
+        payload_hash = hashlib.sha256(body).hexdigest()
+        base = f"{request_id}.{ts}.{payload_hash}"
+        expected = hmac.new(LANGCHAIN_SHARED_SECRET.encode(), base.encode(), hashlib.sha256).hexdigest()
+        valid = hmac.compare_digest(sig, expected)
+    if not valid:
         logger.warning(json.dumps({
             "event": "auth_mismatch",
             "expected_prefix": expected[:16],
@@ -113,11 +258,45 @@ async def hmac_verification(request: Request, call_next):
     return await call_next(request)
 
 
+_ROUTE_PATHS: set[str] = set()
+
+
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    # Added after the HMAC middleware, so it wraps it and the hmac span lands in this request
+    if not _ROUTE_PATHS:
+        _ROUTE_PATHS.update(getattr(r, "path", "") for r in app.routes)
+    path = request.url.path
+    endpoint = path if path in _ROUTE_PATHS else "other"  # bounded label set
+    started = time.perf_counter()
+    status = 500
+    with request_scope(endpoint) as stages:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Streaming responses are timed to their first byte; their frames record spans too
+            elapsed = time.perf_counter() - started
+            observe_request(endpoint, request.method, status, elapsed)
+            if endpoint not in {"/healthz", "/livez", "/readyz", "/metrics"}:
+                logger.info(json.dumps({
+                    "event": "request_timing",
+                    "request_id": request.headers.get("x-request-id") or "",
+                    "endpoint": endpoint,
+                    "status": status,
+                    "latency_ms": round(elapsed * 1000, 1),
+                    "stages_ms": dict(stages),
+                    **request_notes(),
+                }))
+
+
 def _ok(request_id: str, data: Dict[str, Any]) -> JSONResponse:
-    return JSONResponse(
-        status_code=200,
-        content=AiResponseEnvelope(requestId=request_id, status="ok", data=data).model_dump(by_alias=True),
-    )
+    with span("serialize"):
+        return JSONResponse(
+            status_code=200,
+            content=AiResponseEnvelope(requestId=request_id, status="ok", data=data).model_dump(by_alias=True),
+        )
 
 
 def _err(request_id: str, message: str, status: int = 500) -> JSONResponse:
@@ -128,60 +307,168 @@ def _err(request_id: str, message: str, status: int = 500) -> JSONResponse:
     )
 
 
+def _stream_mode(payload: Dict[str, Any]) -> str | None:
+    """Opt-in streaming: payload `stream` = "sse", or "ndjson"/true for newline-delimited JSON."""
+    mode = payload.get("stream")
+    if mode == "sse":
+        return "sse"
+    if mode is True or mode == "ndjson":
+        return "ndjson"
+    return None
+
+
+def _frame(mode: str, envelope: AiResponseEnvelope) -> str:
+    with span("serialize"):
+        body = json.dumps(envelope.model_dump(by_alias=True), ensure_ascii=False)
+    if mode == "sse":
+        event = "final" if envelope.status in {"ok", "error"} else "partial"
+        return f"event: {event}\ndata: {body}\n\n"
+    return body + "\n"
+
+
+def _stream_llm(
+    request_id: str,
+    mode: str,
+    endpoint: str,
+    system_prompt: str,
+    model: str,
+    build_prompt: Callable[[], Awaitable[str | None]],
+    finish: Callable[[str | None], Dict[str, Any]],
+) -> StreamingResponse:
+    """
+    Streams one LLM-backed response. Every frame has the `AiResponseEnvelope` shape:
+    `partial` frames carry `data.stage` ("context", then "generating") or `data.delta` (new
+    completion text); the last frame is the usual `ok` (or `error`) envelope. A None prompt
+    from `build_prompt` skips the LLM and finishes with `finish(None)`.
+    """
+
+    async def frames():
+        started = time.perf_counter()
+        # Sent before any I/O so clients can show progress right away
+        yield _frame(mode, AiResponseEnvelope(requestId=request_id, status="partial", data={"stage": "context"}))
+        try:
+            prompt = await build_prompt()
+            parts: list[str] = []
+            if prompt is not None:
+                yield _frame(mode, AiResponseEnvelope(requestId=request_id, status="partial", data={"stage": "generating"}))
+                llm_started = time.perf_counter()
+                async for delta in llm.chat_stream(system_prompt, prompt, model=model, cache=_llm_cache(endpoint)):
+                    parts.append(delta)
+                    yield _frame(mode, AiResponseEnvelope(requestId=request_id, status="partial", data={"delta": delta}))
+                observe_stage("llm", time.perf_counter() - llm_started)
+            data = finish("".join(parts) if prompt is not None else None)
+            yield _frame(mode, AiResponseEnvelope(requestId=request_id, status="ok", data=data))
+            logger.info(json.dumps({
+                "event": "stream_done",
+                "request_id": request_id,
+                "endpoint": endpoint,
+                "deltas": len(parts),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }))
+        except Exception as e:
+            logger.error(json.dumps({"event": "stream_error", "request_id": request_id, "endpoint": endpoint, "error": str(e)}))
+            yield _frame(mode, AiResponseEnvelope(requestId=request_id, status="error", error=str(e)))
+
+    media_type = "text/event-stream" if mode == "sse" else "application/x-ndjson"
+    # no-transform / X-Accel-Buffering keep proxies from buffering the stream
+    headers = {"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    return StreamingResponse(frames(), media_type=media_type, headers=headers)
+
+
 @app.get("/healthz")
-def healthz():
+async def healthz():
     return {"status": "ok"}
+
+
+@app.get("/livez")
+async def livez():
+    # Process is up and the loop is serving; says nothing about OpenAI/Firestore
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """200 once the clients are built and Firestore credentials resolved, 503 until then."""
+    ready = _ready()
+    body = {
+        "status": "ready" if ready else ("error" if _startup["error"] else "starting"),
+        "uptime_s": round(time.time() - _startup["started_at"], 1),
+        "services": {key: build_state(s) for key, s in _services()},
+        "firestore_clients": _startup["firestore_clients"],
+        "query_seed": _startup["query_seed"],
+        "error": _startup["error"],
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/assistant/gate")
-def assistant_gate(body: AiRequestEnvelope):
+async def assistant_gate(body: AiRequestEnvelope):
     request_id = body.requestId
     payload = body.payload or {}
     text = str(payload.get("prompt", ""))
-    # Minimal tools awareness; no chat history to keep it cheap
-    tools = [
-        "threats/extract for when the user mentions threats or potential threats",
-        "tasks/extract for when the user mentions tasks or potential tasks",
-        "sitrep/summarize for when the user requests a sitrep",
-        "template/warnord for when the user requests a warnord populated from the recent messages",
-        "template/opord for when the user requests an opord populated from the recent messages",
-        "template/frago for when the user requests a frago populated from the recent messages",
-        "workflow/casevac/run for when the user sends a message indicating a major medical emergency",
-        "geo/extract",
-    ]
-    gate_prompt = (
-        "You are a gate model. Decide if the following single message should be escalated "
-        "to a full assistant with these tools available: " + ", ".join(tools) + ".\n"
-        "Return STRICT JSON: {\"escalate\": boolean}. If uncertain, set escalate=true.\n\n"
-        f"MESSAGE:\n{text}"
-    )
+    # Obvious cases (acks, explicit trigger words) are decided locally without the LLM
+    if PREGATE_ENABLED:
+        local = classify_locally(text)
+        if local.escalate is not None:
+            logger.info(json.dumps({
+                "event": "assistant_gate_pregate",
+                "request_id": request_id,
+                "escalate": local.escalate,
+                "score": round(local.score, 3),
+                "families": local.families,
+                "reason": local.reason,
+            }))
+            return _ok(request_id, {"escalate": local.escalate})
+    gate_prompt = gate_user_prompt(text)
 
-    def _one_vote() -> bool:
+    async def _one_vote() -> tuple[bool, float]:
+        started = time.perf_counter()
         try:
-            raw = llm.chat(
-                system_prompt=(
-                    "You are a gate model. Decide whether to escalate. "
-                    "If the message mentions threats, potential threats, tasks to take, medical emergencies, or geospatial info, return {\\\"escalate\\\": true}. "
-                    "If uncertain, return {\\\"escalate\\\": true}. Return only JSON."
-                ),
+            raw = await llm.chat(
+                system_prompt=GATE_SYSTEM_PROMPT,
                 user_prompt=gate_prompt,
                 model="gpt-4.1-nano",
+                cache=_llm_cache("/assistant/gate"),
             )
             obj = json.loads(raw or "{}")
-            return bool(obj.get("escalate", True))
+            vote = bool(obj.get("escalate", True))
         except Exception as e:
             logger.error(json.dumps({
                 "event": "assistant_gate_vote_error",
                 "request_id": request_id,
                 "error": str(e)
             }))
-            return False  # no-op on error
-
-    votes = [_one_vote(), _one_vote(), _one_vote()]
-    escalate = votes.count(True) >= 2
+            vote = False  # no-op on error
+        return vote, round((time.perf_counter() - started) * 1000, 1)
+
+    # Votes run concurrently; as soon as either side reaches quorum the rest are cancelled
+    quorum = min(GATE_QUORUM, GATE_VOTES)
+    pending = [asyncio.create_task(_one_vote()) for _ in range(GATE_VOTES)]
+    votes: list[bool] = []
+    latencies_ms: list[float] = []
+    try:
+        for next_vote in asyncio.as_completed(pending):
+            vote, latency_ms = await next_vote
+            votes.append(vote)
+            latencies_ms.append(latency_ms)
+            if votes.count(True) >= quorum or votes.count(False) >= quorum:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+    escalate = votes.count(True) >= quorum
     try:
         logger.info(json.dumps({
             "event": "assistant_gate_votes",
             "request_id": request_id,
             "votes": votes,
+            "latencies_ms": latencies_ms,
+            "cancelled": GATE_VOTES - len(votes),
+            "quorum": quorum,
             "escalate": escalate
         }))
     except Exception:
@@ -190,13 +477,12 @@ def assistant_gate(body: AiRequestEnvelope):
 
 
 @app.post("/template/generate")
-def generate_template(body: AiRequestEnvelope):
+async def generate_template(body: AiRequestEnvelope):
     request_id = body.requestId
     payload = body.payload or {}
     template_type = str(payload.get("type", "MEDEVAC")).upper()
     chat_id = (body.context or {}).get("chatId")
-    messages = fs.fetch_recent_messages(chat_id, limit=int(payload.get("maxMessages", 50)))
-    rag.index_messages(messages)
+    await rag.arecent_messages(fs, chat_id, limit=int(payload.get("maxMessages", 50)), mode=_retrieval("/template/generate"))
 
     # Build minimal MEDEVAC fields from template file definitions
     required_fields = [
@@ -217,7 +503,7 @@ def generate_template(body: AiRequestEnvelope):
 
 
 @app.post("/threats/extract")
-def threats_extract(body: AiRequestEnvelope):
+async def threats_extract(body: AiRequestEnvelope):
     request_id = body.requestId
     ctx = body.context or {}
     payload = body.payload or {}
@@ -310,13 +596,14 @@ def threats_extract(body: AiRequestEnvelope):
     except Exception:
         pass
 
-    raw = llm.chat(
+    raw = await llm.chat(
         system_prompt=(
             "You are a precise information extractor. Always return STRICT JSON per the contract. "
             "You may receive conversational snippets rather than direct instructions; decide if they imply threats and extract accordingly."
         ),
         user_prompt=user_prompt,
         model="gpt-4o-mini",
+        cache=_llm_cache("/threats/extract"),
     )
 
     try:
@@ -395,35 +682,69 @@ def threats_extract(body: AiRequestEnvelope):
     return _ok(request_id, ThreatsData(threats=threats).model_dump())
 
 
+SITREP_SYSTEM_PROMPT = (
+    "You summarize tactical chat into concise SITREPs in markdown. "
+    "You may receive conversational snippets rather than direct instructions; "
+    "think carefully about what is actionable and make your best guess about what the user wants. "
+    "Messages are pre-filtered based on your capabilities; bias toward assuming they are actionable."
+)
+
+
 @app.post("/sitrep/summarize")
-def sitrep_summarize(body: AiRequestEnvelope):
-    request_id = body.requestId
+async def sitrep_summarize(body: AiRequestEnvelope):
     payload = body.payload or {}
-    time_window = payload.get("timeWindow", "6h")
     chat_id = (body.context or {}).get("chatId")
-    msgs = fs.fetch_recent_messages(chat_id, limit=200)
-    rag.index_messages(msgs)
-    query = f"Summarize the last {time_window} of unit activity into a SITREP."
-    context = rag.build_context(query)
-    prompt = f"Context messages:\n{context}\n\nTask: {query}"
-    # Markdown-only output; no PDFs
-    summary = llm.chat(
-        system_prompt=(
-            "You summarize tactical chat into concise SITREPs in markdown. "
-            "You may receive conversational snippets rather than direct instructions; "
-            "think carefully about what is actionable and make your best guess about what the user wants. "
-            "Messages are pre-filtered based on your capabilities; bias toward assuming they are actionable."
-        ),
-        user_prompt=prompt,
+    time_window = payload.get("timeWindow", "6h")
+    mode = _stream_mode(payload)
+    if mode:
+        return _stream_llm(
+            body.requestId, mode, "/sitrep/summarize", SITREP_SYSTEM_PROMPT, "gpt-4o-mini",
+            lambda: _sitrep_prompt(chat_id, time_window),
+            lambda summary: _sitrep_result(summary, time_window),
+        )
+    data = await flights.do(
+        flight_key("/sitrep/summarize", chat_id, payload),
+        lambda: _sitrep_data(chat_id, time_window),
+    )
+    return _ok(body.requestId, data)
+
+
+async def _sitrep_prompt(chat_id: str | None, time_window: str) -> str:
+    mode = _retrieval("/sitrep/summarize")
+    window = parse_time_window(time_window)
+    message_ids = None
+    if window is None:
+        # Unparseable window: rank the latest messages, as before windows were parsed
+        await rag.arecent_messages(fs, chat_id, limit=200, mode=mode)
+    else:
+        # Only messages inside the window are read, embedded and ranked
+        msgs = await rag.awindow_messages(fs, chat_id, window_start(window), mode=mode)
+        message_ids = {m.get("id") for m in msgs}
+    query = SITREP_QUERY.format(time_window)
+    context = await rag.abuild_context(
+        query, max_tokens=_context_tokens("/sitrep/summarize"), chat_id=chat_id, mode=mode, message_ids=message_ids
     )
+    return f"Context messages:\n{context}\n\nTask: {query}"
+
+
+def _sitrep_result(summary: str | None, time_window: str) -> Dict[str, Any]:
+    # Markdown-only output; no PDFs
     md = summary or "# SITREP\n\n- Time Window: {}\n".format(time_window)
-    data = SitrepTemplateData(format="markdown", content=md, sections=[]).model_dump()
-    return _ok(request_id, data)
+    return SitrepTemplateData(format="markdown", content=md, sections=[]).model_dump()
+
+
+async def _sitrep_data(chat_id: str | None, time_window: str) -> Dict[str, Any]:
+    summary = await llm.chat(
+        system_prompt=SITREP_SYSTEM_PROMPT,
+        user_prompt=await _sitrep_prompt(chat_id, time_window),
+        cache=_llm_cache("/sitrep/summarize"),
+    )
+    return _sitrep_result(summary, time_window)
 
 
 # --- Assistant router --------------------------------------------------------
 @app.post("/assistant/route")
-def assistant_route(body: AiRequestEnvelope):
+async def assistant_route(body: AiRequestEnvelope):
     """
     Assistant Router
     -----------------
@@ -464,9 +785,9 @@ def assistant_route(body: AiRequestEnvelope):
     ]
 
     # Build a lightweight router context from the resolved target chat (if any)
-    msgs = fs.fetch_recent_messages(chat_id, limit=120) if chat_id else []
-    rag.index_messages(msgs)
-    context = rag.build_context("Assistant decision context")
+    mode = _retrieval("/assistant/route")
+    msgs = await rag.arecent_messages(fs, chat_id, limit=120, mode=mode)
+    context = await rag.abuild_context(ROUTER_QUERY, max_tokens=_context_tokens("/assistant/route"), chat_id=chat_id, mode=mode)
 
     # Produce a short, readable preview of recent messages for the model (role|ts|text)
     def _preview_messages(rows):
@@ -519,7 +840,7 @@ def assistant_route(body: AiRequestEnvelope):
         "Assistant JSON: {\"tool\":\"missions/plan\",\"args\":{},\"reply\":\"Drafting mission plan and tasks…\"}"
     )
 
-    decision = llm.chat(
+    decision = await llm.chat(
         system_prompt=(
             "You are the Assistant Router for a tactical chat application. "
             "Your job is to choose ONE tool from the provided tools list based on the user's prompt and the provided context. "
@@ -546,6 +867,7 @@ def assistant_route(body: AiRequestEnvelope):
             "ROUTING EXAMPLES:\n" + examples
         ),
         model="gpt-4o-mini",
+        cache=_llm_cache("/assistant/route"),
     )
     # We return the opaque decision; the app will execute the chosen tool.
     data = {"decision": decision or "{\"tool\":\"none\",\"args\":{},\"reply\":\"I didn't understand.\"}"}
@@ -568,7 +890,7 @@ def assistant_route(body: AiRequestEnvelope):
 
 # --- Geo extraction -----------------------------------------------------------
 @app.post("/geo/extract")
-def geo_extract(body: AiRequestEnvelope):
+async def geo_extract(body: AiRequestEnvelope):
     request_id = body.requestId
     payload = body.payload or {}
     text = str(payload.get("text", ""))
@@ -581,13 +903,14 @@ def geo_extract(body: AiRequestEnvelope):
         lat = float(m.group(1))
         lon = float(m.group(2))
     else:
-        _ = llm.chat(
+        _ = await llm.chat(
             system_prompt=(
                 "Extract latitude/longitude if present and return only JSON. "
                 "Conversations may reference places informally; if absolute coordinates are not explicit, return nulls."
             ),
             user_prompt=f"Text: {text}",
             model="gpt-4o-mini",
+            cache=_llm_cache("/geo/extract"),
         )
     data = {"lat": lat, "lon": lon, "format": "latlng"}
     return _ok(request_id, data)
@@ -609,11 +932,11 @@ def _apply_placeholders(md: str, values: Dict[str, str]) -> str:
     return re.sub(r"{{\s*([A-Za-z0-9_]+)\s*}}", repl, md)
 
 
-def _select_chat_via_llm(prompt: str, candidate_chats: list[dict[str, Any]]) -> str | None:
+async def _select_chat_via_llm(prompt: str, candidate_chats: list[dict[str, Any]], endpoint: str) -> str | None:
     try:
         # Filter out obvious control/buddy/system chats before presenting to the model
         filtered = [c for c in (candidate_chats or []) if str(c.get("name", "")).strip().lower() not in {"ai buddy", "buddy", "assistant"}]
-        decision = llm.chat(
+        decision = await llm.chat(
             system_prompt=(
                 "You select ONE chatId from the candidate list that best matches the user's prompt. "
                 "Return STRICT JSON only with a single key chatId (string or null). If unclear, return null."
@@ -622,6 +945,7 @@ def _select_chat_via_llm(prompt: str, candidate_chats: list[dict[str, Any]]) ->
                 "PROMPT:\n" + str(prompt or "") + "\n\nCANDIDATE_CHATS (JSON):\n" + json.dumps(filtered)
             ),
             model="gpt-4o-mini",
+            cache=_llm_cache(endpoint),
         )
         obj = json.loads(decision or "{}")
         cid = obj.get("chatId")
@@ -633,34 +957,79 @@ def _select_chat_via_llm(prompt: str, candidate_chats: list[dict[str, Any]]) ->
     return None
 
 
-def _generate_filled_template(body: AiRequestEnvelope, template_type: str, template_path: str):
-    request_id = body.requestId
-    ctx = body.context or {}
+TEMPLATE_FILL_SYSTEM_PROMPT = (
+    "Return only valid JSON mapping of placeholder keys to string values. "
+    "You may receive conversational snippets rather than direct instructions; "
+    "infer reasonable values from context and make your best good-faith guess where appropriate. "
+    "Messages are pre-filtered based on your capabilities; bias toward assuming they are actionable."
+)
+
+
+async def _generate_filled_template(body: AiRequestEnvelope, template_type: str, template_path: str):
+    endpoint = f"/template/{template_type.lower()}"
+    chat_id = (body.context or {}).get("chatId")
     payload = body.payload or {}
-    chat_id = ctx.get("chatId")
+    md = _load_markdown_template(template_path)
+    mode = _stream_mode(payload)
+    if mode:
+        return _stream_llm(
+            body.requestId, mode, endpoint, TEMPLATE_FILL_SYSTEM_PROMPT, "gpt-4o-mini",
+            lambda: _template_fill_prompt(chat_id, payload, template_type, md, endpoint),
+            lambda json_map: _template_fill_result(template_type, md, json_map),
+        )
+    data = await flights.do(
+        flight_key(endpoint, chat_id, payload),
+        lambda: _filled_template_data(chat_id, payload, template_type, md, endpoint),
+    )
+    return _ok(body.requestId, data)
+
+
+async def _vector_rows(chat_id: str, message_limit: int) -> list[dict[str, Any]]:
+    """
+    Rows for `abuild_context_from_chunks`: conversation windows, plus per-message chunks of
+    recent messages no window covers yet (newer than the last warm, written by the CF trigger).
+    """
+    if RAG_CHUNKING != "window":
+        return await store.read_recent_chunks(chat_id, message_limit=message_limit)
+    chunks, windows = await asyncio.gather(
+        store.read_recent_chunks(chat_id, message_limit=message_limit),
+        store.read_recent_windows(chat_id, limit=WINDOW_READ_LIMIT),
+    )
+    windows = [w for w in windows if w.get("embed") is not None]
+    covered = {mid for w in windows for mid in w.get("messageIds") or []}
+    return windows + [ch for ch in chunks if ch.get("messageId") not in covered]
+
+
+async def _template_fill_prompt(
+    chat_id: str | None, payload: Dict[str, Any], template_type: str, md: str, endpoint: str
+) -> str | None:
+    """The fill prompt for the template, or None when no chat could be resolved (nothing to fill)."""
     prompt = payload.get("prompt") or ""
     candidate_chats = payload.get("candidateChats") or []
 
-    md = _load_markdown_template(template_path)
-
     # If no explicit chat, ask LLM to choose from candidates. No deterministic selection here.
     if not chat_id and candidate_chats:
-        chat_id = _select_chat_via_llm(prompt, candidate_chats)
+        chat_id = await _select_chat_via_llm(prompt, candidate_chats, endpoint)
 
     if not chat_id:
         logger.info(json.dumps({"event": "template_fill_no_chat", "template": template_type}))
-        return _ok(request_id, TemplateDocData(templateType=template_type, content=md).model_dump())
+        return None
 
-    msgs = fs.fetch_recent_messages(chat_id, limit=200)
-    # Prefer precomputed chunk vectors when available
-    chunks = store.read_recent_chunks(chat_id, message_limit=200)
+    # Prefer precomputed vectors (windows, then chunks) when available; reads go out concurrently
+    msgs, chunks = await asyncio.gather(
+        rag.arecent_messages(fs, chat_id, limit=200, index=False),
+        _vector_rows(chat_id, message_limit=200),
+    )
+    mode = _retrieval(endpoint)
     if chunks:
-        context = rag.build_context_from_chunks(query=f"Fill {template_type} template from chat context", chunk_rows=chunks)
+        context = await rag.abuild_context_from_chunks(
+            query=TEMPLATE_QUERY.format(template_type), chunk_rows=chunks, max_tokens=_context_tokens(endpoint), mode=mode
+        )
     else:
-        rag.index_messages(msgs, chat_id=chat_id)
-        context = rag.build_context(f"Fill {template_type} template from chat context")
+        await rag.aindex_messages(msgs, chat_id=chat_id, mode=mode)
+        context = await rag.abuild_context(TEMPLATE_QUERY.format(template_type), max_tokens=_context_tokens(endpoint), chat_id=chat_id, mode=mode)
     placeholders = _extract_placeholders(md)
-    fill_prompt = (
+    return (
         "You are filling a "
         + template_type
         + " markdown template using the provided chat context.\n"
@@ -672,16 +1041,11 @@ def _generate_filled_template(body: AiRequestEnvelope, template_type: str, templ
         + "CHAT CONTEXT:\n"
         + (context or "")
     )
-    json_map = llm.chat(
-        system_prompt=(
-            "Return only valid JSON mapping of placeholder keys to string values. "
-            "You may receive conversational snippets rather than direct instructions; "
-            "infer reasonable values from context and make your best good-faith guess where appropriate. "
-            "Messages are pre-filtered based on your capabilities; bias toward assuming they are actionable."
-        ),
-        user_prompt=fill_prompt,
-        model="gpt-4o-mini",
-    )
+
+
+def _template_fill_result(template_type: str, md: str, json_map: str | None) -> Dict[str, Any]:
+    if json_map is None:
+        return TemplateDocData(templateType=template_type, content=md).model_dump()
     try:
         values = json.loads(json_map or "{}")
         if not isinstance(values, dict):
@@ -690,27 +1054,42 @@ def _generate_filled_template(body: AiRequestEnvelope, template_type: str, templ
         logger.warning(json.dumps({"event": "template_fill_parse_error", "template": template_type}))
         values = {}
     filled = _apply_placeholders(md, values)
-    return _ok(request_id, TemplateDocData(templateType=template_type, content=filled).model_dump())
+    return TemplateDocData(templateType=template_type, content=filled).model_dump()
+
+
+async def _filled_template_data(
+    chat_id: str | None, payload: Dict[str, Any], template_type: str, md: str, endpoint: str
+) -> Dict[str, Any]:
+    fill_prompt = await _template_fill_prompt(chat_id, payload, template_type, md, endpoint)
+    if fill_prompt is None:
+        return _template_fill_result(template_type, md, None)
+    json_map = await llm.chat(
+        system_prompt=TEMPLATE_FILL_SYSTEM_PROMPT,
+        user_prompt=fill_prompt,
+        model="gpt-4o-mini",
+        cache=_llm_cache(endpoint),
+    )
+    return _template_fill_result(template_type, md, json_map)
 
 
 @app.post("/template/warnord")
-def warnord_generate(body: AiRequestEnvelope):
-    return _generate_filled_template(body, "WARNORD", "Input file templates/WARNO.md")
+async def warnord_generate(body: AiRequestEnvelope):
+    return await _generate_filled_template(body, "WARNORD", "Input file templates/WARNO.md")
 
 
 @app.post("/template/opord")
-def opord_generate(body: AiRequestEnvelope):
-    return _generate_filled_template(body, "OPORD", "Input file templates/OPORD_Template.md")
+async def opord_generate(body: AiRequestEnvelope):
+    return await _generate_filled_template(body, "OPORD", "Input file templates/OPORD_Template.md")
 
 
 @app.post("/template/frago")
-def frago_generate(body: AiRequestEnvelope):
-    return _generate_filled_template(body, "FRAGO", "Input file templates/FRAGO.md")
+async def frago_generate(body: AiRequestEnvelope):
+    return await _generate_filled_template(body, "FRAGO", "Input file templates/FRAGO.md")
 
 
 @app.post("/template/medevac")
-def medevac_generate(body: AiRequestEnvelope):
-    return _generate_filled_template(body, "MEDEVAC", "Input file templates/MEDEVAC.md")
+async def medevac_generate(body: AiRequestEnvelope):
+    return await _generate_filled_template(body, "MEDEVAC", "Input file templates/MEDEVAC.md")
 
 
 def _load_markdown_template(path: str) -> str:
@@ -748,7 +1127,7 @@ def _load_markdown_template(path: str) -> str:
 
 
 @app.post("/intent/casevac/detect")
-def casevac_detect(body: AiRequestEnvelope):
+async def casevac_detect(body: AiRequestEnvelope):
     request_id = body.requestId
     payload = body.payload or {}
     messages = payload.get("messages", [])
@@ -758,7 +1137,7 @@ def casevac_detect(body: AiRequestEnvelope):
         "Return JSON with fields: intent ('casevac' or 'none'), confidence (0-1), and triggers (list of key phrases).\n\n"
         f"Logs:\n{text}"
     )
-    _ = llm.chat(
+    _ = await llm.chat(
         system_prompt=(
             "You are a precise intent classifier for CASEVAC requests. "
             "You may receive conversational snippets rather than direct instructions; "
@@ -767,6 +1146,7 @@ def casevac_detect(body: AiRequestEnvelope):
         ),
         user_prompt=prompt,
         model="gpt-4o-mini",
+        cache=_llm_cache("/intent/casevac/detect"),
     )
     intent = "casevac" if any(k in text.lower() for k in ["injury", "medevac", "casevac", "casualty"]) else "none"
     confidence = 0.8 if intent == "casevac" else 0.2
@@ -776,17 +1156,15 @@ def casevac_detect(body: AiRequestEnvelope):
 
 
 @app.post("/workflow/casevac/run")
-def casevac_run(body: AiRequestEnvelope):
+async def casevac_run(body: AiRequestEnvelope):
     request_id = body.requestId
     ctx = body.context or {}
     chat_id = ctx.get("chatId")
     tpl = _load_markdown_template("Input file templates/MEDEVAC-Template.md")
     facility_name = "Nearest Role II facility"
     try:
-        from google.cloud import firestore
-        db = firestore.Client()
-        doc = db.collection("missions").document()
-        doc.set({
+        # Shared pooled client (warmed at startup); no per-request channel/auth setup
+        mission_id = await fs.create_mission({
             "chatId": chat_id,
             "title": "CASEVAC",
             "description": facility_name,
@@ -795,7 +1173,6 @@ def casevac_run(body: AiRequestEnvelope):
             "assignees": [],
             "createdAt": int(time.time() * 1000),
         })
-        mission_id = doc.id
     except Exception:
         mission_id = "local"
     plan = [
@@ -808,14 +1185,16 @@ def casevac_run(body: AiRequestEnvelope):
 
 
 @app.post("/tasks/extract")
-def tasks_extract(body: AiRequestEnvelope):
-    request_id = body.requestId
-    ctx = body.context or {}
-    chat_id = ctx.get("chatId")
+async def tasks_extract(body: AiRequestEnvelope):
+    chat_id = (body.context or {}).get("chatId")
+    data = await flights.do(flight_key("/tasks/extract", chat_id, body.payload), lambda: _tasks_data(chat_id))
+    return _ok(body.requestId, data)
 
-    msgs = fs.fetch_recent_messages(chat_id, limit=200) if chat_id else []
-    rag.index_messages(msgs)
-    context = rag.build_context("Extract actionable tasks (title, description, priority 1-5)")
+
+async def _tasks_data(chat_id: str | None) -> Dict[str, Any]:
+    mode = _retrieval("/tasks/extract")
+    await rag.arecent_messages(fs, chat_id, limit=200, mode=mode)
+    context = await rag.abuild_context(TASKS_QUERY, max_tokens=_context_tokens("/tasks/extract"), chat_id=chat_id, mode=mode)
 
     user_prompt = (
         "From the following operational chat context, extract ACTIONABLE tasks.\n"
@@ -825,10 +1204,11 @@ def tasks_extract(body: AiRequestEnvelope):
         f"CONTEXT:\n{context}"
     )
 
-    raw = llm.chat(
+    raw = await llm.chat(
         system_prompt="You extract concise, actionable tasks. Output strict JSON per the contract.",
         user_prompt=user_prompt,
         model="gpt-4o-mini",
+        cache=_llm_cache("/tasks/extract"),
     )
 
     tasks: list[dict[str, Any]] = []
@@ -840,20 +1220,24 @@ def tasks_extract(body: AiRequestEnvelope):
     except Exception:
         logger.warning(json.dumps({"event": "tasks_extract_parse_error"}))
 
-    data = TasksData(tasks=[TaskItem(**t) for t in tasks if isinstance(t, dict)]).model_dump()
-    return _ok(request_id, data)
+    return TasksData(tasks=[TaskItem(**t) for t in tasks if isinstance(t, dict)]).model_dump()
 
 @app.post("/missions/plan")
-def missions_plan(body: AiRequestEnvelope):
-    request_id = body.requestId
-    ctx = body.context or {}
-    chat_id = ctx.get("chatId")
+async def missions_plan(body: AiRequestEnvelope):
+    chat_id = (body.context or {}).get("chatId")
     payload = body.payload or {}
     prompt = str(payload.get("prompt", "")).strip()
+    data = await flights.do(
+        flight_key("/missions/plan", chat_id, payload),
+        lambda: _mission_plan_data(chat_id, prompt, body.requestId),
+    )
+    return _ok(body.requestId, data)
 
-    msgs = fs.fetch_recent_messages(chat_id, limit=200) if chat_id else []
-    rag.index_messages(msgs)
-    context = rag.build_context("Extract mission plan summary and tasks from chat context")
+
+async def _mission_plan_data(chat_id: str | None, prompt: str, request_id: str) -> Dict[str, Any]:
+    mode = _retrieval("/missions/plan")
+    await rag.arecent_messages(fs, chat_id, limit=200, mode=mode)
+    context = await rag.abuild_context(MISSION_QUERY, max_tokens=_context_tokens("/missions/plan"), chat_id=chat_id, mode=mode)
 
     plan_prompt = (
         "You are a mission planner. Propose a short mission title and 1-2 line description, "
@@ -863,7 +1247,7 @@ def missions_plan(body: AiRequestEnvelope):
         f"USER_PROMPT:\n{prompt}\n\n"
         f"CONTEXT:\n{context}"
     )
-    raw = llm.chat(
+    raw = await llm.chat(
         system_prompt=(
             "You produce short actionable tasks from chat. "
             "Conversations may be indirect; when users discuss plans or next steps, infer tasks and make your best guess. "
@@ -874,6 +1258,7 @@ def missions_plan(body: AiRequestEnvelope):
         ),
         user_prompt=plan_prompt,
         model="gpt-4o-mini",
+        cache=_llm_cache("/missions/plan"),
     )
 
     # Log raw model output (length + preview) to diagnose parsing issues
@@ -925,15 +1310,15 @@ def missions_plan(body: AiRequestEnvelope):
     except Exception:
         logger.warning(json.dumps({"event": "missions_plan_parse_error"}))
 
-    data = MissionPlanData(
+    return MissionPlanData(
         title=title, description=description, priority=priority,
         tasks=[TaskItem(**t) for t in tasks if isinstance(t, dict)]
     ).model_dump()
-    return _ok(request_id, data)
 
 
 @app.post("/rag/warm")
-def rag_warm(body: AiRequestEnvelope):
+async def rag_warm(body: AiRequestEnvelope):
+    """Queues a background warm of the chat's chunk embeddings; poll POST /rag/warm/status."""
     request_id = body.requestId
     ctx = body.context or {}
     payload = body.payload or {}
@@ -941,21 +1326,45 @@ def rag_warm(body: AiRequestEnvelope):
     if not chat_id:
         return _ok(request_id, {"warmed": 0})
     limit = int(payload.get("limit", 200))
-    msgs = fs.fetch_recent_messages(chat_id, limit=limit)
-    # Force embed and store per message chunks if none exist (compat warm); client/backfill will usually precompute
-    for m in msgs:
-        text = str(m.get("text") or "").strip()
-        if not text:
-            continue
-        chunks = [text[i : i + 700] for i in range(0, len(text), 700)]
-        rows = []
-        for idx, ch in enumerate(chunks):
-            vec = llm.embed(ch)
-            rows.append({"seq": idx, "text": ch, "len": len(ch), "embed": vec})
-        try:
-            store.write_chunks(chat_id, m.get("id") or str(id(m)), rows)
-        except Exception:
-            pass
-    return _ok(request_id, {"warmed": len(msgs)})
+    try:
+        job = warm_jobs.submit(chat_id, limit, request_id)
+    except WarmQueueFull as e:
+        return _err(request_id, str(e), status=429)
+    return _ok(request_id, job.to_dict())
 
 
+@app.post("/rag/warm/status")
+async def rag_warm_status(body: AiRequestEnvelope):
+    """Envelope form of GET /rag/warm/{jobId}, so the Functions proxy (POST only) can poll a job."""
+    request_id = body.requestId
+    ctx = body.context or {}
+    payload = body.payload or {}
+    job = warm_jobs.get(str(payload.get("jobId") or ""))
+    # Scoped to the caller's chat: job ids alone are not a capability
+    if job is None or job.chat_id != ctx.get("chatId"):
+        return _err(request_id, "Unknown warm job", status=404)
+    return _ok(request_id, job.to_dict())
+
+
+@app.get("/rag/warm/{job_id}")
+async def rag_warm_job(job_id: str):
+    # Internal (not proxied): operators and scripts inside the service network
+    job = warm_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown warm job"})
+    return job.to_dict()
+
+
+@app.get("/rag/stats")
+async def rag_stats():
+    stats = rag.stats()
+    # SQLite-backed caches COUNT(*) their tables; off the event loop like the provider's lookups
+    if llm.cache is not None:
+        stats["llm_cache"] = await asyncio.to_thread(llm.cache.stats)
+    if llm.embed_cache is not None:
+        stats["embed_cache"] = await asyncio.to_thread(llm.embed_cache.stats)
+    stats["singleflight"] = flights.stats()
+    stats["warm_jobs"] = warm_jobs.stats()
+    if llm.dispatcher is not None:
+        stats["embed_dispatch"] = llm.dispatcher.stats()
+    return stats
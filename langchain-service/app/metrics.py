@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import functools
+import threading
+import time
+
+
+# Seconds; spans the ~ms stages (HMAC, scoring) up to the 8s CASEVAC budget
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0)
+
+REQUEST_METRIC = "messageai_request_duration_seconds"
+STAGE_METRIC = "messageai_stage_duration_seconds"
+
+_HELP = {
+    REQUEST_METRIC: "End-to-end request latency by endpoint and status.",
+    STAGE_METRIC: "Latency of request stages (hmac, firestore_read, chunk_read, embed, score, pack, llm, serialize) by endpoint.",
+}
+
+# Endpoint of the request being served and its per-stage totals (ms). Tasks and threads
+# spawned by a handler copy the context, so their spans land on the same request.
+_endpoint: ContextVar[str] = ContextVar("messageai_endpoint", default="-")
+_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("messageai_stages", default=None)
+# Request facts (e.g. packed context tokens) added to the request's timing log line
+_notes: ContextVar[Optional[Dict[str, Any]]] = ContextVar("messageai_notes", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense (per label set)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], Histogram]] = {}
+
+    def observe(self, name: str, labels: Dict[str, str], seconds: float) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[Tuple[Tuple[str, str], ...], Histogram]]:
+        with self._lock:
+            return {name: dict(series) for name, series in self._histograms.items()}
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for name, series in sorted(self.snapshot().items()):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(series.items()):
+                labels = dict(key)
+                cumulative = 0
+                for bound, n in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += n
+                    le = bound if isinstance(bound, str) else repr(float(bound))
+                    lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Dict[str, str], **extra: str) -> str:
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def request_scope(endpoint: str) -> Iterator[Dict[str, float]]:
+    """Binds spans recorded in this context to `endpoint`; yields the per-stage totals (ms)."""
+    stages: Dict[str, float] = {}
+    endpoint_token = _endpoint.set(endpoint)
+    stages_token = _stages.set(stages)
+    notes_token = _notes.set({})
+    try:
+        yield stages
+    finally:
+        _endpoint.reset(endpoint_token)
+        _stages.reset(stages_token)
+        _notes.reset(notes_token)
+
+
+def note(key: str, value: Any) -> None:
+    """Attaches `value` to the current request's timing log line (no-op outside a request)."""
+    notes = _notes.get()
+    if notes is not None:
+        notes[key] = value
+
+
+def request_notes() -> Dict[str, Any]:
+    return dict(_notes.get() or {})
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    registry.observe(STAGE_METRIC, {"endpoint": _endpoint.get(), "stage": stage}, seconds)
+    stages = _stages.get()
+    if stages is not None:
+        stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times a stage of the current request into the stage histogram (and the request's totals)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed(stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator form of `span` for sync and async functions."""
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float) -> None:
+    registry.observe(REQUEST_METRIC, {"endpoint": endpoint, "method": method, "status": str(status)}, seconds)
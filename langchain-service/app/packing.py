@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+import re
+
+import numpy as np
+
+from .chunking import CHARS_PER_TOKEN, count_tokens
+from .config import RAG_CONTEXT_DUP_BITS, RAG_CONTEXT_TOKENS
+
+
+_WORD = re.compile(r"\w+")
+# Words per shingle: re-sent or re-windowed text maps to the same shingle set
+SHINGLE = 3
+_BITS = np.arange(64, dtype=np.uint64)
+_MASK = (1 << 64) - 1
+
+
+def simhash(text: str, shingle: int = SHINGLE) -> int:
+    """64-bit SimHash over lowercased word shingles; near-identical texts differ in few bits (per process)."""
+    words = _WORD.findall((text or "").lower())
+    if not words:
+        return 0
+    grams = {" ".join(words[i : i + shingle]) for i in range(max(1, len(words) - shingle + 1))}
+    # Builtin str hashing is salted per process; fine, fingerprints are only compared within one call
+    hashes = np.fromiter((hash(g) & _MASK for g in grams), dtype=np.uint64, count=len(grams))
+    bits = (hashes[:, None] >> _BITS) & np.uint64(1)
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(grams)
+    return int(sum(1 << i for i in np.flatnonzero(votes > 0).tolist()))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    budget: int
+    candidates: int
+    items: int
+    duplicates: int
+    truncated: bool = False
+
+    def stats(self) -> Dict[str, Any]:
+        out = asdict(self)
+        del out["text"]
+        return out
+
+
+def pack_context(texts: Sequence[str], max_tokens: int = RAG_CONTEXT_TOKENS, dup_bits: int = RAG_CONTEXT_DUP_BITS) -> PackedContext:
+    """
+    Packs ranked `texts` (best first) into `max_tokens` prompt tokens.
+
+    Items are taken in rank order until the first one that does not fit; the leftover
+    budget then goes to the largest remaining items that still fit, so one long chunk no
+    longer ends packing. An item within `dup_bits` SimHash bits of one already taken is
+    skipped (overlapping windows differ by far more). The output keeps rank order. If not
+    even the best item fits, its head is kept rather than sending no context.
+    """
+    ranked: List[Tuple[int, str, int]] = [(rank, text, count_tokens(text)) for rank, text in enumerate(t for t in texts if t)]
+    seen: List[int] = []
+    chosen: List[Tuple[int, str, int]] = []
+    duplicates = 0
+    budget = max(0, max_tokens)
+
+    def take(item: Tuple[int, str, int]) -> bool:
+        # Fingerprints only for items that fit, so a long ranked list costs little to pack
+        nonlocal budget, duplicates
+        h = simhash(item[1])
+        if any(hamming(h, s) <= dup_bits for s in seen):
+            duplicates += 1
+            return False
+        seen.append(h)
+        chosen.append(item)
+        budget -= item[2]
+        return True
+
+    rest = list(ranked)
+    while rest and rest[0][2] <= budget:
+        take(rest.pop(0))
+    # Best fit: the largest item that still fits, earliest rank on ties
+    rest.sort(key=lambda it: (-it[2], it[0]))
+    for item in rest:
+        if item[2] <= budget:
+            take(item)
+
+    truncated = False
+    if not chosen and ranked and max_tokens > 0:
+        head = ranked[0][1][: max_tokens * CHARS_PER_TOKEN]
+        chosen = [(0, head, min(count_tokens(head), max_tokens))]
+        truncated = True
+
+    chosen.sort(key=lambda it: it[0])
+    return PackedContext(
+        text="\n".join(text for _, text, _ in chosen),
+        tokens=sum(tokens for _, _, tokens in chosen),
+        budget=max_tokens,
+        candidates=len(ranked),
+        items=len(chosen),
+        duplicates=duplicates,
+        truncated=truncated,
+    )
@@ -1,36 +1,464 @@
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
 import os
 
-from openai import OpenAI
+from .config import (
+    OPENAI_API_KEY,
+    EMBED_BATCH_SIZE,
+    EMBED_BATCH_MAX_CHARS,
+    EMBED_DISPATCH_WINDOW_MS,
+    EMBED_DISPATCH_MAX_BATCH,
+    EMBED_DISPATCH_MAX_QUEUE,
+)
+from .llm_cache import ResponseCache, SqliteResponseCache, llm_cache_key
+from .embed_cache import EmbeddingCache
+from .metrics import timed
 
-from .config import OPENAI_API_KEY
+
+def _embed_batches(texts: List[str], batch_size: int, max_chars: int) -> List[List[int]]:
+    """Groups indexes of non-empty `texts` into batches bounded by item count and total chars."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    chars = 0
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        if current and (len(current) >= batch_size or chars + len(text) > max_chars):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(i)
+        chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _input_error(e: Exception) -> bool:
+    """
+    True when the API rejected the inputs themselves (invalid or too long: HTTP 400/413/422),
+    the only case where retrying a failed batch item by item can help. Timeouts, 429s and
+    5xx mean the service is struggling; per-item calls would only multiply the wait.
+    """
+    return getattr(e, "status_code", None) in (400, 413, 422)
+
+
+def _openai_client(kind: str) -> Any:
+    # Imported on first construction rather than with this module: the openai package is
+    # a large share of cold-start import time and mock mode never needs it
+    import openai
+
+    return getattr(openai, kind)(api_key=OPENAI_API_KEY)
 
 
 class OpenAIProvider:
-    def __init__(self) -> None:
+    def __init__(self, cache: Optional[ResponseCache] = None, embed_cache: Optional[EmbeddingCache] = None) -> None:
         self.enabled = bool(OPENAI_API_KEY)
-        self.client = OpenAI(api_key=OPENAI_API_KEY) if self.enabled else None
+        self.client = _openai_client("OpenAI") if self.enabled else None
+        self.cache = cache
+        # Content-addressed vectors: repeated texts are embedded once (mock vectors are never stored)
+        self.embed_cache = embed_cache
+        self._logger = logging.getLogger("messageai.providers")
 
-    def chat(self, system_prompt: str, user_prompt: str, model: str = "gpt-4o-mini") -> str:
+    def chat(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.3,
+        max_tokens: int = 800,
+        cache: bool = True,
+    ) -> str:
+        """
+        Chat completion text. With a response cache configured and `cache=True`, identical
+        requests (same model, prompts, temperature, max_tokens) are answered from the cache;
+        callers whose calls must reach the model every time pass `cache=False`.
+        """
         if not self.enabled or not self.client:
             # Fallback mock response if no key present
             return "[MOCK] " + user_prompt[:256]
+        key = llm_cache_key(model, system_prompt, user_prompt, temperature, max_tokens) if cache and self.cache else None
+        if key is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
         resp = self.client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
-            temperature=0.3,
-            max_tokens=800,
+            temperature=temperature,
+            max_tokens=max_tokens,
         )
-        return resp.choices[0].message.content or ""
+        text = resp.choices[0].message.content or ""
+        if key is not None and text:
+            self.cache.put(key, text)
+        return text
 
     def embed(self, text: str, model: str = "text-embedding-3-small") -> Any:
+        if self.embed_cache is None or not self.enabled or not text:
+            return self._embed_now(text, model)
+        out, todo, positions = self.embed_cache.lookup(model, [text])
+        if todo:
+            self.embed_cache.fill(model, out, todo, positions, [self._embed_now(text, model)])
+        return out[0]
+
+    def _embed_now(self, text: str, model: str) -> Any:
         if not self.enabled or not self.client:
             # Deterministic small vector for mock mode
             return [0.0] * 5
         resp = self.client.embeddings.create(model=model, input=text)
         return resp.data[0].embedding
 
+    def embed_many(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-small",
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_chars: int = EMBED_BATCH_MAX_CHARS,
+    ) -> List[Optional[List[float]]]:
+        """
+        Embeds `texts` with one API call per batch. Results line up with `texts`; an entry is
+        None when that item could not be embedded: empty text, its batch failed on the service
+        side (later batches are then not attempted), or the API rejected the batch's inputs and
+        this item also failed when retried on its own. With an embedding cache, only texts
+        it has not seen are sent, each distinct text once.
+        """
+        if self.embed_cache is None or not self.enabled:
+            return self._embed_many_now(texts, model, batch_size, max_chars)
+        out, todo, positions = self.embed_cache.lookup(model, texts)
+        if todo:
+            self.embed_cache.fill(model, out, todo, positions, self._embed_many_now(todo, model, batch_size, max_chars))
+        return out
+
+    def _embed_many_now(self, texts: List[str], model: str, batch_size: int, max_chars: int) -> List[Optional[List[float]]]:
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        for batch in _embed_batches(texts, max(1, batch_size), max_chars):
+            if not self.enabled or not self.client:
+                for i in batch:
+                    out[i] = [0.0] * 5
+                continue
+            try:
+                resp = self.client.embeddings.create(model=model, input=[texts[i] for i in batch])
+                for item in resp.data:
+                    out[batch[item.index]] = item.embedding
+                continue
+            except Exception as e:
+                self._logger.warning(json.dumps({"event": "embed_batch_error", "size": len(batch), "error": str(e)}))
+                if not _input_error(e):
+                    # Service-side failure: the remaining batches are left None too (callers retry later)
+                    break
+            # Isolate the failing input(s) so one bad item doesn't sink the whole batch
+            for i in batch:
+                try:
+                    out[i] = self._embed_now(texts[i], model)
+                except Exception as e:
+                    self._logger.error(json.dumps({"event": "embed_item_error", "index": i, "error": str(e)}))
+        return out
+
+
+class AsyncOpenAIProvider:
+    """Async counterpart of `OpenAIProvider` for the request path; same methods, awaitable."""
+
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        dispatch: bool = EMBED_DISPATCH_WINDOW_MS > 0,
+        embed_cache: Optional[EmbeddingCache] = None,
+    ) -> None:
+        self.enabled = bool(OPENAI_API_KEY)
+        self.client = _openai_client("AsyncOpenAI") if self.enabled else None
+        self.cache = cache
+        self.embed_cache = embed_cache
+        # Micro-batches embed calls across concurrent requests (see EmbeddingDispatcher)
+        self.dispatcher = EmbeddingDispatcher(self._embed_many_now) if dispatch else None
+        self._logger = logging.getLogger("messageai.providers")
+
+    @timed("llm")
+    async def chat(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.3,
+        max_tokens: int = 800,
+        cache: bool = True,
+    ) -> str:
+        """See `OpenAIProvider.chat`."""
+        if not self.enabled or not self.client:
+            return "[MOCK] " + user_prompt[:256]
+        key = llm_cache_key(model, system_prompt, user_prompt, temperature, max_tokens) if cache and self.cache else None
+        if key is not None:
+            hit = await self._response_get(key)
+            if hit is not None:
+                return hit
+        resp = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        text = resp.choices[0].message.content or ""
+        if key is not None and text:
+            await self._response_put(key, text)
+        return text
+
+    async def _response_get(self, key: str) -> Optional[str]:
+        # SQLite waits up to its busy timeout on another worker's write lock and prunes on
+        # put: keep it off the event loop (the memory cache stays inline)
+        if isinstance(self.cache, SqliteResponseCache):
+            return await asyncio.to_thread(self.cache.get, key)
+        return self.cache.get(key)
+
+    async def _response_put(self, key: str, text: str) -> None:
+        if isinstance(self.cache, SqliteResponseCache):
+            await asyncio.to_thread(self.cache.put, key, text)
+        else:
+            self.cache.put(key, text)
+
+    async def chat_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.3,
+        max_tokens: int = 800,
+        cache: bool = True,
+    ) -> AsyncIterator[str]:
+        """
+        Same request as `chat`, yielding content deltas as the completion streams in. A cache
+        hit (or mock mode) yields the whole text at once; a completed stream fills the cache.
+        """
+        if not self.enabled or not self.client:
+            yield "[MOCK] " + user_prompt[:256]
+            return
+        key = llm_cache_key(model, system_prompt, user_prompt, temperature, max_tokens) if cache and self.cache else None
+        if key is not None:
+            hit = await self._response_get(key)
+            if hit is not None:
+                yield hit
+                return
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        parts: List[str] = []
+        async for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        text = "".join(parts)
+        if key is not None and text:
+            await self._response_put(key, text)
+
+    @timed("embed")
+    async def embed(self, text: str, model: str = "text-embedding-3-small") -> Any:
+        if self.embed_cache is None or not self.enabled or not text:
+            return await self._embed_uncached(text, model)
+        out, todo, positions = await self._cache_lookup(model, [text])
+        if todo:
+            await self._cache_fill(model, out, todo, positions, [await self._embed_uncached(text, model)])
+        return out[0]
+
+    async def _cache_lookup(self, model: str, texts: List[str]) -> Tuple[List[Optional[List[float]]], List[str], List[List[int]]]:
+        # The SQLite backend does blocking disk I/O (and periodic pruning): keep it off the event loop
+        if self.embed_cache.path:
+            return await asyncio.to_thread(self.embed_cache.lookup, model, texts)
+        return self.embed_cache.lookup(model, texts)
+
+    async def _cache_fill(self, model: str, out: List[Optional[List[float]]], todo: List[str], positions: List[List[int]], vectors: List[Optional[Any]]) -> None:
+        if self.embed_cache.path:
+            await asyncio.to_thread(self.embed_cache.fill, model, out, todo, positions, vectors)
+        else:
+            self.embed_cache.fill(model, out, todo, positions, vectors)
+
+    async def _embed_uncached(self, text: str, model: str) -> Any:
+        if self.dispatcher is not None:
+            vec = (await self.dispatcher.embed_many([text], model))[0]
+            if vec is None:
+                raise RuntimeError("embedding failed")
+            return vec
+        return await self._embed_now(text, model)
+
+    async def _embed_now(self, text: str, model: str) -> Any:
+        if not self.enabled or not self.client:
+            return [0.0] * 5
+        resp = await self.client.embeddings.create(model=model, input=text)
+        return resp.data[0].embedding
+
+    @timed("embed")
+    async def embed_many(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-small",
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_chars: int = EMBED_BATCH_MAX_CHARS,
+    ) -> List[Optional[List[float]]]:
+        """
+        See `OpenAIProvider.embed_many`. Small requests go through the dispatcher (when
+        configured) so they share API calls with other in-flight requests; requests that
+        already fill a batch are sent directly.
+        """
+        if self.embed_cache is None or not self.enabled:
+            return await self._embed_many_uncached(texts, model, batch_size, max_chars)
+        out, todo, positions = await self._cache_lookup(model, texts)
+        if todo:
+            vectors = await self._embed_many_uncached(todo, model, batch_size, max_chars)
+            await self._cache_fill(model, out, todo, positions, vectors)
+        return out
+
+    async def _embed_many_uncached(self, texts: List[str], model: str, batch_size: int, max_chars: int) -> List[Optional[List[float]]]:
+        if self.dispatcher is not None and sum(1 for t in texts if t) < self.dispatcher.max_batch:
+            return await self.dispatcher.embed_many(texts, model)
+        return await self._embed_many_now(texts, model, batch_size, max_chars)
+
+    async def _embed_many_now(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-small",
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_chars: int = EMBED_BATCH_MAX_CHARS,
+    ) -> List[Optional[List[float]]]:
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        for batch in _embed_batches(texts, max(1, batch_size), max_chars):
+            if not self.enabled or not self.client:
+                for i in batch:
+                    out[i] = [0.0] * 5
+                continue
+            try:
+                resp = await self.client.embeddings.create(model=model, input=[texts[i] for i in batch])
+                for item in resp.data:
+                    out[batch[item.index]] = item.embedding
+                continue
+            except Exception as e:
+                self._logger.warning(json.dumps({"event": "embed_batch_error", "size": len(batch), "error": str(e)}))
+                if not _input_error(e):
+                    break
+            for i in batch:
+                try:
+                    out[i] = await self._embed_now(texts[i], model)
+                except Exception as e:
+                    self._logger.error(json.dumps({"event": "embed_item_error", "index": i, "error": str(e)}))
+        return out
+
+
+class EmbeddingDispatcher:
+    """
+    Cross-request micro-batching for embeddings. Inputs queued by concurrent callers are
+    flushed as one `embed_many` call when the oldest has waited `window_ms` or `max_batch`
+    inputs are queued, whichever comes first; results are fanned back to each caller.
+    Identical texts in a flush are sent once. When `max_queue` inputs are already waiting,
+    new requests bypass the queue instead of adding latency to it.
+    """
+
+    def __init__(
+        self,
+        embed_now: Callable[[List[str], str], Awaitable[List[Optional[Any]]]],
+        window_ms: float = EMBED_DISPATCH_WINDOW_MS,
+        max_batch: int = EMBED_DISPATCH_MAX_BATCH,
+        max_queue: int = EMBED_DISPATCH_MAX_QUEUE,
+    ) -> None:
+        self.embed_now = embed_now
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.max_queue = max(self.max_batch, max_queue)
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._logger = logging.getLogger("messageai.providers")
+        self.requests = 0
+        self.inputs = 0
+        self.flushes = 0
+        self.flushed_inputs = 0
+        self.deduped = 0
+        self.bypassed = 0
+        self.flush_reasons: Dict[str, int] = {"window": 0, "size": 0}
+        self.max_depth = 0
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    async def embed_many(self, texts: List[str], model: str) -> List[Optional[Any]]:
+        if self.depth() >= self.max_queue:
+            self.bypassed += 1
+            return await self.embed_now(texts, model)
+        loop = asyncio.get_running_loop()
+        queue = self._pending.setdefault(model, [])
+        futures: List[Optional[asyncio.Future]] = []
+        for text in texts:
+            if not text:
+                futures.append(None)
+                continue
+            fut = loop.create_future()
+            queue.append((text, fut))
+            futures.append(fut)
+        self.requests += 1
+        self.inputs += sum(1 for f in futures if f is not None)
+        self.max_depth = max(self.max_depth, self.depth())
+        while len(self._pending[model]) >= self.max_batch:
+            self._flush(model, "size")
+        if self._pending[model] and model not in self._timers:
+            self._timers[model] = loop.call_later(self.window, self._flush, model, "window")
+        results = await asyncio.gather(*(f for f in futures if f is not None))
+        it = iter(results)
+        return [next(it) if f is not None else None for f in futures]
+
+    def _flush(self, model: str, reason: str) -> None:
+        timer = self._timers.pop(model, None)
+        if timer is not None and reason != "window":
+            timer.cancel()
+        queue = self._pending.get(model) or []
+        batch = queue[: self.max_batch]
+        self._pending[model] = queue[self.max_batch :]
+        if self._pending[model]:
+            self._timers[model] = asyncio.get_running_loop().call_later(self.window, self._flush, model, "window")
+        if not batch:
+            return
+        self.flushes += 1
+        self.flushed_inputs += len(batch)
+        self.flush_reasons[reason] += 1
+        task = asyncio.get_running_loop().create_task(self._run(model, batch))
+        # Keep a reference so the flush is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model: str, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        self.deduped += len(batch) - len(unique)
+        try:
+            vectors = dict(zip(unique, await self.embed_now(unique, model)))
+        except Exception as e:
+            self._logger.warning(json.dumps({"event": "embed_dispatch_error", "size": len(unique), "error": str(e)}))
+            vectors = {}
+        for text, fut in batch:
+            # Callers that were cancelled meanwhile have already given up on their futures
+            if not fut.done():
+                fut.set_result(vectors.get(text))
 
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "max_batch": self.max_batch,
+            "max_queue": self.max_queue,
+            "queue_depth": self.depth(),
+            "max_queue_depth": self.max_depth,
+            "requests": self.requests,
+            "inputs": self.inputs,
+            "flushes": self.flushes,
+            "avg_flush_size": round(self.flushed_inputs / self.flushes, 2) if self.flushes else None,
+            "flush_reasons": dict(self.flush_reasons),
+            "deduped": self.deduped,
+            "bypassed": self.bypassed,
+        }
@@ -1,12 +1,38 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Tuple
 import math
 import json
 import logging
+import re
+import asyncio
+import itertools
+import threading
+import time
 
-from .providers import OpenAIProvider
-from .embedding_store import FirestoreEmbeddingStore
+import numpy as np
+
+from .providers import AsyncOpenAIProvider, OpenAIProvider
+from .embedding_store import AsyncFirestoreEmbeddingStore, FirestoreEmbeddingStore
+from .embed_codec import decode_embed
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .packing import pack_context
+from .metrics import note, timed
+from .config import (
+    RAG_CACHE_MAX_CHATS,
+    RAG_CACHE_MAX_ENTRIES,
+    RAG_CACHE_MAX_BYTES,
+    EMBED_MODEL,
+    RAG_QUERY_CACHE_SIZE,
+    RAG_QUERY_CACHE_TTL_SECONDS,
+    RAG_RETRIEVAL,
+    RAG_EMBED_TIMEOUT_MS,
+    RAG_EMBED_BACKOFF_MS,
+    RAG_RRF_K,
+    RAG_CONTEXT_TOKENS,
+)
 
 
 def _cosine(a: List[float], b: List[float]) -> float:
@@ -20,75 +46,669 @@ def _cosine(a: List[float], b: List[float]) -> float:
     return dot / (na * nb)
 
 
+# Matrix-backed scoring ---------------------------------------------------------
+
+def _normalize(vec: Any) -> np.ndarray | None:
+    """Returns `vec` as a unit-length float32 row, or None when empty/zero."""
+    if vec is None or len(vec) == 0:
+        return None
+    arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(arr))
+    if norm == 0.0 or not math.isfinite(norm):
+        return None
+    return arr / norm
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores, best first; ties keep insertion order like a stable sort."""
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        # argpartition picks arbitrary members among scores equal to the kth; keep every
+        # candidate at or above it (in index order) and let the stable sort choose
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        idx = np.flatnonzero(scores >= kth)
+    else:
+        idx = np.arange(n)
+    order = np.argsort(-scores[idx], kind="stable")
+    return idx[order[:k]]
+
+
+class _VectorMatrix:
+    """
+    Pre-normalized float32 matrix of row vectors.
+
+    Rows that are empty, zero, or of a different dimension than the majority score 0.0,
+    which matches `_cosine` for the length-mismatch and zero-norm cases.
+    """
+
+    def __init__(self, vectors: Sequence[Any]) -> None:
+        self.size = len(vectors)
+        dims: Dict[int, int] = {}
+        for v in vectors:
+            n = len(v) if v is not None else 0
+            if n:
+                dims[n] = dims.get(n, 0) + 1
+        self.dim = max(dims, key=lambda d: dims[d]) if dims else 0
+        self.matrix = np.zeros((self.size, self.dim), dtype=np.float32)
+        for i, v in enumerate(vectors):
+            if v is None or len(v) != self.dim:
+                continue
+            row = _normalize(v)
+            if row is not None:
+                self.matrix[i] = row
+
+    def scores(self, query: Any) -> np.ndarray:
+        qv = _normalize(query)
+        if qv is None or qv.shape[0] != self.dim or self.size == 0:
+            return np.zeros(self.size, dtype=np.float32)
+        return self.matrix @ qv
+
+    def top_k(self, query: Any, k: int, mask: np.ndarray | None = None) -> List[Tuple[int, float]]:
+        """Best `k` (row, score); only rows where `mask` is true when given."""
+        scores = self.scores(query)
+        if mask is None:
+            return [(int(i), float(scores[i])) for i in _top_k_indices(scores, k)]
+        rows = np.flatnonzero(mask)
+        return [(int(rows[i]), float(scores[rows[i]])) for i in _top_k_indices(scores[rows], k)]
+
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query or "").strip().casefold()
+
+
+class QueryVectorCache:
+    """LRU + TTL cache of query embeddings keyed by (model, normalized query)."""
+
+    def __init__(self, max_size: int = RAG_QUERY_CACHE_SIZE, ttl_seconds: float = RAG_QUERY_CACHE_TTL_SECONDS) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: str, query: str) -> List[float] | None:
+        key = (model, _normalize_query(query))
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] <= self.ttl_seconds:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, model: str, query: str, vec: List[float]) -> None:
+        if not vec or self.max_size <= 0:
+            return
+        key = (model, _normalize_query(query))
+        with self._lock:
+            self._items[key] = (time.monotonic(), vec)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+_WINDOW_ROW_OVERHEAD = 256  # rough per-message dict cost beyond the text itself
+
+
+def _order_field(messages: List[Dict[str, Any]]) -> str:
+    # fetch_recent_messages orders by createdAt when every doc has it, else by timestamp
+    return "createdAt" if messages and all(m.get("createdAt") is not None for m in messages) else "timestamp"
+
+
+class _ChatIndex:
+    """
+    Message texts (BM25-indexed) and vectors for a single chat; the unit of LRU eviction.
+    Every indexed message is in `texts` and `lexical`; `embeds` holds those embedded so far.
+    """
+
+    def __init__(self) -> None:
+        self.embeds: Dict[str, np.ndarray] = {}
+        self.texts: Dict[str, str] = {}
+        self.lexical = BM25Index()
+        # Ids with an embed call in flight (possibly past its request's deadline)
+        self.inflight: set = set()
+        self.nbytes = 0
+        self._matrix: _VectorMatrix | None = None
+        self._matrix_ids: List[str] = []
+        # Incremental refresh state: most recent messages (newest first), the largest window
+        # fetched so far, and the high-water mark of the ordering field seen in Firestore
+        self.window: List[Dict[str, Any]] = []
+        self.window_limit = 0
+        self.hwm: Any = None
+        self.hwm_field = ""
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def retain(self, keep: set) -> None:
+        for mid in [mid for mid in self.texts if mid not in keep]:
+            self.nbytes -= len(self.texts.pop(mid))
+            self.lexical.remove(mid)
+            vec = self.embeds.pop(mid, None)
+            if vec is not None:
+                self.nbytes -= vec.nbytes
+                self._matrix = None
+
+    def add_text(self, mid: str, text: str) -> None:
+        if mid in self.texts:
+            return
+        self.texts[mid] = text
+        self.nbytes += len(text)
+        self.lexical.add(mid, text)
+
+    def add(self, mid: str, text: str, vec: Any) -> None:
+        self.add_text(mid, text)
+        arr = np.asarray(vec if vec is not None else [], dtype=np.float32).reshape(-1)
+        previous = self.embeds.get(mid)
+        self.embeds[mid] = arr
+        self.nbytes += arr.nbytes - (previous.nbytes if previous is not None else 0)
+        self._matrix = None
+
+    def matrix(self) -> Tuple[_VectorMatrix, List[str]]:
+        # Rebuilt lazily after new vectors arrive; scoring reuses it across queries
+        if self._matrix is None:
+            self._matrix_ids = list(self.embeds.keys())
+            self._matrix = _VectorMatrix([self.embeds[mid] for mid in self._matrix_ids])
+        return self._matrix, self._matrix_ids
+
+    def footprint(self) -> int:
+        # Vectors + texts, plus the cached normalized matrix and the message window when present
+        window = sum(len(str(m.get("text") or "")) + _WINDOW_ROW_OVERHEAD for m in self.window)
+        matrix = self._matrix.matrix.nbytes if self._matrix is not None else 0
+        return self.nbytes + window + matrix + self.lexical.footprint()
+
+
 class RAGCache:
-    def __init__(self, llm: OpenAIProvider, store: FirestoreEmbeddingStore | None = None) -> None:
+    """
+    Per-chat message embedding cache.
+
+    Each chat gets its own `_ChatIndex`, so ranking for one chat never sees another chat's
+    messages. Indexes are kept in LRU order and whole chats are evicted once the cache
+    exceeds its chat/entry/byte budget (see RAG_CACHE_* in config).
+
+    Retrieval (`retrieval`, or per call `mode`): "hybrid" fuses the vector and BM25
+    rankings with reciprocal rank fusion, "vector" and "lexical" use one of them. Lexical
+    never waits on an embed call. Indexing and query embeds each wait at most
+    `embed_timeout_ms`; a timed-out embed keeps running and lands in the index (or query
+    cache) when done. When the query vector is unusable (embed failed, mock zero vector, or
+    too slow) the call falls back to lexical, and after a timeout or failure request paths
+    skip embedding for `embed_backoff_ms` so an outage costs one deadline, not one per call.
+    """
+
+    def __init__(
+        self,
+        llm: OpenAIProvider | AsyncOpenAIProvider,
+        store: FirestoreEmbeddingStore | AsyncFirestoreEmbeddingStore | None = None,
+        max_chats: int = RAG_CACHE_MAX_CHATS,
+        max_entries: int = RAG_CACHE_MAX_ENTRIES,
+        max_bytes: int = RAG_CACHE_MAX_BYTES,
+        embed_model: str = EMBED_MODEL,
+        retrieval: str = RAG_RETRIEVAL,
+        embed_timeout_ms: float = RAG_EMBED_TIMEOUT_MS,
+        embed_backoff_ms: float = RAG_EMBED_BACKOFF_MS,
+    ) -> None:
         self.llm = llm
-        self._embeds: Dict[str, List[float]] = {}
-        self._texts: Dict[str, str] = {}
+        self.retrieval = retrieval
+        self.embed_timeout_ms = embed_timeout_ms
+        self.embed_backoff_ms = embed_backoff_ms
+        self._embed_down_until = 0.0
+        self._retrievals: Dict[str, int] = {"hybrid": 0, "vector": 0, "lexical": 0}
+        self._fallbacks = 0
+        self._embed_timeouts = 0
+        self.embed_model = embed_model
+        self.queries = QueryVectorCache()
+        self._chats: "OrderedDict[str, _ChatIndex]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.max_chats = max_chats
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
         self._logger = logging.getLogger("messageai.rag")
         self.store = store
 
-    def index_messages(self, messages: List[Dict[str, Any]], max_items: int = 300, chat_id: str | None = None) -> None:
+    # Chat index bookkeeping ------------------------------------------------------
+    def _chat(self, chat_id: str | None, create: bool = True) -> _ChatIndex | None:
+        key = chat_id or ""
+        with self._lock:
+            idx = self._chats.get(key)
+            if idx is not None:
+                self._chats.move_to_end(key)
+            elif create:
+                idx = _ChatIndex()
+                self._chats[key] = idx
+            return idx
+
+    def _over_budget(self) -> bool:
+        entries = sum(len(c) for c in self._chats.values())
+        nbytes = sum(c.footprint() for c in self._chats.values())
+        return len(self._chats) > self.max_chats or entries > self.max_entries or nbytes > self.max_bytes
+
+    def _evict(self, keep: str) -> None:
+        # The chat being served is never evicted; only older chats make room for it
+        with self._lock:
+            while self._over_budget():
+                victim = next((key for key in self._chats if key != keep), None)
+                if victim is None:
+                    return
+                dropped = self._chats.pop(victim)
+                self._evictions += 1
+                self._logger.info(json.dumps({
+                    "event": "rag_cache_evict",
+                    "chat_id": victim,
+                    "entries": len(dropped),
+                    "bytes": dropped.footprint(),
+                }))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "chats": len(self._chats),
+                "entries": sum(len(c) for c in self._chats.values()),
+                "bytes": sum(c.footprint() for c in self._chats.values()),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "query_cache": {"size": len(self.queries), "hits": self.queries.hits, "misses": self.queries.misses},
+                "retrieval": {"mode": self.retrieval, "calls": dict(self._retrievals), "lexical_fallbacks": self._fallbacks,
+                              "embed_timeouts": self._embed_timeouts, "embed_backoff_s": round(max(0.0, self._embed_down_until - time.monotonic()), 1)},
+                "max_chats": self.max_chats,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def evict_chat(self, chat_id: str | None) -> None:
+        with self._lock:
+            self._chats.pop(chat_id or "", None)
+
+    # Indexing + retrieval ----------------------------------------------------------
+    # Sync methods expect a sync provider (`OpenAIProvider`); the `a*` variants await an
+    # `AsyncOpenAIProvider`. Both share the CPU-side helpers below.
+    def _pending(self, messages: List[Dict[str, Any]], max_items: int, chat_id: str | None, embed: bool = True) -> Tuple[_ChatIndex, Dict[str, str]]:
+        idx = self._chat(chat_id)
+        pending: Dict[str, str] = {}
         for m in messages[:max_items]:
             mid = m.get("id") or m.get("_id") or str(id(m))
             text = str(m.get("text") or "").strip()
             if not text:
                 continue
-            if mid in self._embeds:
+            # BM25 postings are local and cheap: every message is searchable right away
+            with self._lock:
+                idx.add_text(mid, text)
+            if not embed or mid in idx.inflight:
+                continue
+            if mid in idx.embeds or mid in pending:
+                self._hits += 1
                 continue
-            self._texts[mid] = text
-            vec: List[float] | None = None
-            # Read from store if available
-            if self.store and chat_id:
-                try:
-                    # Chunks are preferred; if present, skip per-message embed here
-                    # The warm path writes chunk vectors; index_messages keeps compatibility for non-warm runs
-                    vec = None
-                except Exception:
-                    vec = None
-            if vec is None:
-                try:
-                    vec = self.llm.embed(text)
-                except Exception as e:
-                    self._logger.error(json.dumps({"event": "embed_error", "message_id": str(mid), "error": str(e)}))
-                    vec = []
-            self._embeds[mid] = vec or []
-
-    def top_k(self, query: str, k: int = 20) -> List[Tuple[str, str, float]]:
+            self._misses += 1
+            pending[mid] = text
+        return idx, pending
+
+    def _absorb(self, idx: _ChatIndex, pending: Dict[str, str], vectors: List[Any], chat_id: str | None) -> None:
+        failed = 0
+        with self._lock:
+            for mid, vec in zip(pending.keys(), vectors):
+                if vec is None:
+                    # Left out of the index so the next request retries it
+                    failed += 1
+                    continue
+                idx.add(mid, pending[mid], vec)
+        if failed:
+            self._logger.error(json.dumps({"event": "embed_error", "chat_id": chat_id or "", "failed": failed, "count": len(pending)}))
+        self._evict(keep=chat_id or "")
+
+    def _embed_pending_error(self, pending: Dict[str, str], chat_id: str | None, e: Exception) -> List[Any]:
+        self._logger.error(json.dumps({"event": "embed_error", "chat_id": chat_id or "", "count": len(pending), "error": str(e)}))
+        return [None] * len(pending)
+
+    def index_messages(self, messages: List[Dict[str, Any]], max_items: int = 300, chat_id: str | None = None, mode: str | None = None) -> None:
+        idx, pending = self._pending(messages, max_items, chat_id, embed=(mode or self.retrieval) != "lexical")
+        vectors: List[Any] = []
+        if pending:
+            # One batched embed call for every uncached message; the warm path writes chunk
+            # vectors to the store, index_messages keeps compatibility for non-warm runs
+            try:
+                vectors = self.llm.embed_many(list(pending.values()), model=self.embed_model)
+            except Exception as e:
+                vectors = self._embed_pending_error(pending, chat_id, e)
+        self._absorb(idx, pending, vectors, chat_id)
+
+    async def aindex_messages(self, messages: List[Dict[str, Any]], max_items: int = 300, chat_id: str | None = None, mode: str | None = None) -> None:
+        embed = (mode or self.retrieval) != "lexical" and self._embed_available()
+        idx, pending = self._pending(messages, max_items, chat_id, embed=embed)
+        if not pending:
+            self._evict(keep=chat_id or "")
+            return
+        with self._lock:
+            idx.inflight.update(pending)
+        task = asyncio.ensure_future(self._aembed_pending(idx, pending, chat_id))
+        try:
+            await self._within_deadline(task)
+        except asyncio.TimeoutError:
+            # The messages are already searchable lexically; their vectors land when the call returns
+            self._embed_timeouts += 1
+            self._embed_unavailable("index_timeout", len(pending))
+
+    async def _aembed_pending(self, idx: _ChatIndex, pending: Dict[str, str], chat_id: str | None) -> None:
+        try:
+            vectors = await self.llm.embed_many(list(pending.values()), model=self.embed_model)
+        except Exception as e:
+            vectors = self._embed_pending_error(pending, chat_id, e)
+        finally:
+            with self._lock:
+                idx.inflight.difference_update(pending)
+        if all(vec is None for vec in vectors):
+            self._embed_unavailable("index_error", len(pending))
+        self._absorb(idx, pending, vectors, chat_id)
+
+    async def _within_deadline(self, task: "asyncio.Future[Any]") -> Any:
+        if self.embed_timeout_ms <= 0:
+            return await task
+        # shield: past the deadline the call keeps running and its result is still kept
+        return await asyncio.wait_for(asyncio.shield(task), self.embed_timeout_ms / 1000.0)
+
+    def _embed_available(self) -> bool:
+        return time.monotonic() >= self._embed_down_until
+
+    def _embed_unavailable(self, reason: str, count: int = 1) -> None:
+        self._embed_down_until = time.monotonic() + self.embed_backoff_ms / 1000.0
+        self._logger.warning(json.dumps({"event": "embed_backoff", "reason": reason, "count": count, "backoff_ms": self.embed_backoff_ms}))
+
+    async def arecent_messages(self, fs: Any, chat_id: str | None, limit: int, index: bool = True, mode: str | None = None) -> List[Dict[str, Any]]:
+        """
+        Most recent `limit` messages for a chat (newest first), refreshed incrementally.
+
+        The first call for a chat (or a larger `limit` than seen before) reads the full window;
+        later calls only read messages at or after the stored high-water mark and embed only
+        those. Vectors for messages that fall out of the window are dropped from the index.
+        """
+        if not chat_id:
+            return []
+        idx = self._chat(chat_id)
+        if idx.hwm is None or limit > idx.window_limit:
+            window = await fs.fetch_recent_messages(chat_id, limit=limit)
+            field = _order_field(window)
+            fetched = len(window)
+        else:
+            field = idx.hwm_field
+            # Read up to the cached window size, not `limit`: a smaller call must not leave a
+            # gap between the newest `limit` messages and the older cached ones
+            fresh = await fs.fetch_messages_since(chat_id, field, idx.hwm, limit=idx.window_limit)
+            fresh_ids = {m.get("id") for m in fresh}
+            window = fresh + [m for m in idx.window if m.get("id") not in fresh_ids]
+            fetched = len(fresh)
+        window = window[: max(limit, idx.window_limit)]
+        marks = [m.get(field) for m in window if m.get(field) is not None]
+        with self._lock:
+            idx.window = window
+            idx.window_limit = max(limit, idx.window_limit)
+            idx.hwm_field = field
+            try:
+                idx.hwm = max(marks) if marks else None
+            except TypeError:
+                # Mixed value types under one field; fall back to a full read next time
+                idx.hwm = None
+            idx.retain({m.get("id") for m in window})
+        self._logger.info(json.dumps({
+            "event": "rag_window_refresh",
+            "chat_id": chat_id,
+            "limit": limit,
+            "fetched": fetched,
+            "window": len(window),
+        }))
+        recent = window[:limit]
+        if index:
+            await self.aindex_messages(recent, chat_id=chat_id, mode=mode)
+        return recent
+
+    async def awindow_messages(self, fs: Any, chat_id: str | None, since: datetime, mode: str | None = None) -> List[Dict[str, Any]]:
+        """
+        Messages created at or after `since` (newest first), paged from Firestore; only these
+        are indexed (embedding the ones not seen yet). Rank within them by passing their ids
+        as `message_ids`.
+        """
+        if not chat_id:
+            return []
+        msgs = await fs.fetch_messages_in_window(chat_id, since)
+        await self.aindex_messages(msgs, max_items=len(msgs), chat_id=chat_id, mode=mode)
+        self._logger.info(json.dumps({
+            "event": "rag_time_window",
+            "chat_id": chat_id,
+            "since": since.isoformat(),
+            "messages": len(msgs),
+        }))
+        return msgs
+
+    def _query_vector(self, query: str) -> List[float]:
+        cached = self.queries.get(self.embed_model, query)
+        if cached is not None:
+            return cached
         try:
-            qv = self.llm.embed(query)
+            vec = self.llm.embed(query, model=self.embed_model)
         except Exception as e:
             self._logger.error(json.dumps({"event": "query_embed_error", "error": str(e)}))
-            qv = []
-        scored: List[Tuple[str, str, float]] = []
-        for mid, vec in self._embeds.items():
-            score = _cosine(qv, vec) if qv else 0.0
-            scored.append((mid, self._texts.get(mid, ""), score))
-        scored.sort(key=lambda t: t[2], reverse=True)
-        return scored[:k]
+            return []
+        self.queries.put(self.embed_model, query, vec)
+        return vec
 
-    def build_context(self, query: str, max_chars: int = 4000) -> str:
-        chunks = []
-        total = 0
-        for _, text, _ in self.top_k(query, k=30):
-            if not text:
-                continue
-            if total + len(text) > max_chars:
-                break
-            chunks.append(text)
-            total += len(text)
-        return "\n".join(chunks)
+    async def _aquery_vector(self, query: str) -> List[float]:
+        cached = self.queries.get(self.embed_model, query)
+        if cached is not None:
+            return cached
+        if not self._embed_available():
+            return []
+        embed = asyncio.ensure_future(self._aembed_query(query))
+        try:
+            # A slow embed keeps running and lands in the query cache for later calls
+            return await self._within_deadline(embed)
+        except asyncio.TimeoutError:
+            self._embed_timeouts += 1
+            self._embed_unavailable("query_timeout")
+            return []
 
-    # Use chunk vectors from store directly (fast-path) ---------------------------------
-    def build_context_from_chunks(self, query: str, chunk_rows: List[Dict[str, Any]], max_chars: int = 4000) -> str:
+    async def _aembed_query(self, query: str) -> List[float]:
         try:
-            qv = self.llm.embed(query)
+            vec = await self.llm.embed(query, model=self.embed_model)
         except Exception as e:
             self._logger.error(json.dumps({"event": "query_embed_error", "error": str(e)}))
-            qv = []
+            self._embed_unavailable("query_error")
+            return []
+        self.queries.put(self.embed_model, query, vec)
+        return vec
+
+    def _preseed_store(self, todo: List[str], vectors: List[Any]) -> int:
+        seeded = 0
+        for q, vec in zip(todo, vectors):
+            if vec:
+                self.queries.put(self.embed_model, q, vec)
+                seeded += 1
+        self._logger.info(json.dumps({"event": "query_preseed", "queries": len(todo), "seeded": seeded}))
+        return seeded
+
+    def preseed_queries(self, queries: List[str]) -> int:
+        """Embeds known constant queries in one batch so their first request skips the embed call."""
+        todo = [q for q in dict.fromkeys(queries) if self.queries.get(self.embed_model, q) is None]
+        if not todo:
+            return 0
+        try:
+            vectors = self.llm.embed_many(todo, model=self.embed_model)
+        except Exception as e:
+            self._logger.warning(json.dumps({"event": "query_preseed_error", "error": str(e)}))
+            return 0
+        return self._preseed_store(todo, vectors)
+
+    async def apreseed_queries(self, queries: List[str]) -> int:
+        todo = [q for q in dict.fromkeys(queries) if self.queries.get(self.embed_model, q) is None]
+        if not todo:
+            return 0
+        try:
+            vectors = await self.llm.embed_many(todo, model=self.embed_model)
+        except Exception as e:
+            self._logger.warning(json.dumps({"event": "query_preseed_error", "error": str(e)}))
+            return 0
+        return self._preseed_store(todo, vectors)
+
+    @timed("score")
+    def _rank(self, qv: List[float], k: int, chat_id: str | None, message_ids: set | None = None) -> List[Tuple[str, str, float]]:
+        idx = self._chat(chat_id, create=False)
+        if idx is None:
+            return []
+        with self._lock:
+            matrix, ids = idx.matrix()
+            texts = idx.texts
+        mask = None if message_ids is None else np.fromiter((mid in message_ids for mid in ids), dtype=bool, count=len(ids))
+        return [(ids[i], texts.get(ids[i], ""), score) for i, score in matrix.top_k(qv, k, mask)]
+
+    @staticmethod
+    @timed("score")
+    def _rank_chunks(qv: List[float], chunk_rows: List[Dict[str, Any]], k: int = 60) -> List[str]:
+        rows = [row for row in chunk_rows if row.get("text")]
+        matrix = _VectorMatrix([decode_embed(row) for row in rows])
+        return [rows[i].get("text") or "" for i, _ in matrix.top_k(qv, k)]
+
+    @timed("score")
+    def _rank_lexical(self, query: str, k: int, chat_id: str | None, pad: bool, message_ids: set | None = None) -> List[Tuple[str, str, float]]:
+        idx = self._chat(chat_id, create=False)
+        if idx is None:
+            return []
+        with self._lock:
+            out = [(mid, idx.texts.get(mid, ""), score) for mid, score in idx.lexical.search(query, k, message_ids)]
+            if pad and len(out) < k:
+                # Endpoint queries are generic ("summarize unit activity") and may share few
+                # terms with the chat; fill up with the most recent messages. `texts` is in
+                # insertion order (incremental refreshes append), so recency comes from the
+                # newest-first window, then anything indexed outside it
+                seen = {mid for mid, _, _ in out}
+                for mid in itertools.chain((m.get("id") for m in idx.window), idx.texts):
+                    if len(out) >= k:
+                        break
+                    if mid in seen or mid not in idx.texts or (message_ids is not None and mid not in message_ids):
+                        continue
+                    seen.add(mid)
+                    out.append((mid, idx.texts[mid], 0.0))
+        return out[:k]
+
+    @staticmethod
+    @timed("score")
+    def _rank_chunks_lexical(query: str, chunk_rows: List[Dict[str, Any]], k: int = 60, pad: bool = True) -> List[str]:
+        rows = [row for row in chunk_rows if row.get("text")]
+        index = BM25Index()
+        for i, row in enumerate(rows):
+            index.add(str(i), row.get("text") or "")
+        order = [int(i) for i, _ in index.search(query, k)]
+        if pad and len(order) < k:
+            seen = set(order)
+            order.extend(i for i in range(len(rows)) if i not in seen)
+        return [rows[i].get("text") or "" for i in order[:k]]
+
+    @staticmethod
+    def _fuse(rankings: List[List[str]], k: int) -> List[str]:
+        return [key for key, _ in reciprocal_rank_fusion(rankings, RAG_RRF_K)[:k]]
+
+    def _mode(self, mode: str | None, qv: List[float] | None) -> str:
+        mode = mode or self.retrieval
+        if mode != "lexical" and qv is not None and _normalize(qv) is None:
+            # Embed failed, timed out, or returned the mock zero vector: vector scores are all 0
+            self._fallbacks += 1
+            self._logger.warning(json.dumps({"event": "rag_lexical_fallback", "mode": mode}))
+            mode = "lexical"
+        self._retrievals[mode] = self._retrievals.get(mode, 0) + 1
+        return mode
+
+    def _select(
+        self, query: str, qv: List[float] | None, k: int, chat_id: str | None, mode: str | None, message_ids: set | None = None
+    ) -> List[Tuple[str, str, float]]:
+        mode = self._mode(mode, qv)
+        if mode == "lexical":
+            return self._rank_lexical(query, k, chat_id, pad=True, message_ids=message_ids)
+        vector = self._rank(qv, k, chat_id, message_ids)
+        if mode == "vector":
+            return vector
+        lexical = self._rank_lexical(query, k, chat_id, pad=False, message_ids=message_ids)
+        texts = {mid: text for mid, text, _ in vector + lexical}
+        fused = reciprocal_rank_fusion([[mid for mid, _, _ in vector], [mid for mid, _, _ in lexical]], RAG_RRF_K)
+        return [(mid, texts[mid], score) for mid, score in fused[:k]]
+
+    def _select_chunks(self, query: str, qv: List[float] | None, chunk_rows: List[Dict[str, Any]], mode: str | None) -> List[str]:
+        mode = self._mode(mode, qv)
+        if mode == "lexical":
+            return self._rank_chunks_lexical(query, chunk_rows)
+        vector = self._rank_chunks(qv, chunk_rows)
+        if mode == "vector":
+            return vector
+        return self._fuse([vector, self._rank_chunks_lexical(query, chunk_rows, pad=False)], 60)
+
+    @timed("pack")
+    def _pack(self, texts: List[str], max_tokens: int | None) -> str:
+        packed = pack_context(texts, max_tokens or RAG_CONTEXT_TOKENS)
+        note("context", packed.stats())
+        return packed.text
+
+    # `message_ids` restricts ranking to those messages (e.g. a sitrep's time window)
+    def top_k(
+        self, query: str, k: int = 20, chat_id: str | None = None, mode: str | None = None, message_ids: set | None = None
+    ) -> List[Tuple[str, str, float]]:
+        qv = None if (mode or self.retrieval) == "lexical" else self._query_vector(query)
+        return self._select(query, qv, k, chat_id, mode, message_ids)
+
+    async def atop_k(
+        self, query: str, k: int = 20, chat_id: str | None = None, mode: str | None = None, message_ids: set | None = None
+    ) -> List[Tuple[str, str, float]]:
+        qv = None if (mode or self.retrieval) == "lexical" else await self._aquery_vector(query)
+        return self._select(query, qv, k, chat_id, mode, message_ids)
+
+    def build_context(
+        self, query: str, max_tokens: int | None = None, chat_id: str | None = None, mode: str | None = None, message_ids: set | None = None
+    ) -> str:
+        ranked = self.top_k(query, k=30, chat_id=chat_id, mode=mode, message_ids=message_ids)
+        return self._pack([text for _, text, _ in ranked], max_tokens)
+
+    async def abuild_context(
+        self, query: str, max_tokens: int | None = None, chat_id: str | None = None, mode: str | None = None, message_ids: set | None = None
+    ) -> str:
+        ranked = await self.atop_k(query, k=30, chat_id=chat_id, mode=mode, message_ids=message_ids)
+        return self._pack([text for _, text, _ in ranked], max_tokens)
+
+    # Use chunk vectors from store directly (fast-path) ---------------------------------
+    def build_context_from_chunks(self, query: str, chunk_rows: List[Dict[str, Any]], max_tokens: int | None = None, mode: str | None = None) -> str:
+        qv = None if (mode or self.retrieval) == "lexical" else self._query_vector(query)
+        return self._pack(self._select_chunks(query, qv, chunk_rows, mode), max_tokens)
+
+    async def abuild_context_from_chunks(self, query: str, chunk_rows: List[Dict[str, Any]], max_tokens: int | None = None, mode: str | None = None) -> str:
+        qv = None if (mode or self.retrieval) == "lexical" else await self._aquery_vector(query)
+        return self._pack(self._select_chunks(query, qv, chunk_rows, mode), max_tokens)
+
+    def top_k_reference(self, query: str, k: int = 20, chat_id: str | None = None) -> List[Tuple[str, str, float]]:
+        """Pure-Python reference for `top_k` (full sort over `_cosine`); kept for result checks."""
+        qv = self._query_vector(query)
+        idx = self._chat(chat_id, create=False)
+        if idx is None:
+            return []
+        scored: List[Tuple[str, str, float]] = []
+        for mid, vec in list(idx.embeds.items()):
+            score = _cosine(qv, vec.tolist()) if qv else 0.0
+            scored.append((mid, idx.texts.get(mid, ""), score))
+        scored.sort(key=lambda t: t[2], reverse=True)
+        return scored[:k]
+
+    def build_context_from_chunks_reference(self, query: str, chunk_rows: List[Dict[str, Any]], max_chars: int = 4000) -> str:
+        """Pure-Python reference for the vector ranking of `build_context_from_chunks` (packed by characters); kept for result checks."""
+        qv = self._query_vector(query)
         scored: List[Tuple[int, str, float]] = []
         for row in chunk_rows:
-            vec = row.get("embed") or []
+            # Rows may carry lists, numpy views (local store) or packed blobs
+            vec = decode_embed(row)
+            vec = [] if vec is None else [float(x) for x in vec]
             text = row.get("text") or ""
             seq = int(row.get("seq") or 0)
             score = _cosine(qv, vec) if qv else 0.0
@@ -103,5 +723,3 @@ class RAGCache:
             out.append(text)
             total += len(text)
         return "\n".join(out)
-
-
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+
+
+def flight_key(endpoint: str, chat_id: Optional[str], payload: Optional[Dict[str, Any]]) -> Tuple[str, str, str]:
+    """(endpoint, chatId, digest of the payload with keys sorted) — requestId is not part of it."""
+    normalized = json.dumps(payload or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return endpoint, str(chat_id or ""), hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls within the process: the first caller for a key
+    (the leader) runs the work, callers arriving while it is in flight await the same
+    result (or exception). Nothing is kept once the leader finishes.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, endpoint: str, name: str) -> None:
+        c = self._counters.setdefault(endpoint, {"leaders": 0, "joined": 0})
+        c[name] += 1
+
+    async def do(self, key: Tuple[str, str, str], fn: Callable[[], Awaitable[Any]]) -> Any:
+        endpoint = key[0]
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self._count(endpoint, "joined")
+            try:
+                # shield: a follower that goes away must not cancel the shared future
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # The leader was cancelled, not us: run the work ourselves
+                if fut.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.do(key, fn)
+                raise
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self._count(endpoint, "leaders")
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # Mark retrieved so a failure nobody joined does not log "exception never retrieved"
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-endpoint leaders (upstream runs) and joined (runs saved), plus keys in flight."""
+        return {
+            "inflight": len(self._inflight),
+            "saved": sum(c["joined"] for c in self._counters.values()),
+            "endpoints": {k: dict(v) for k, v in self._counters.items()},
+        }
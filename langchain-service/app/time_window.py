@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+import re
+
+
+_WINDOW = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$")
+_UNIT_SECONDS = {
+    "s": 1, "sec": 1, "secs": 1, "second": 1, "seconds": 1,
+    "m": 60, "min": 60, "mins": 60, "minute": 60, "minutes": 60,
+    "h": 3600, "hr": 3600, "hrs": 3600, "hour": 3600, "hours": 3600, "": 3600,
+    "d": 86400, "day": 86400, "days": 86400,
+    "w": 604800, "wk": 604800, "week": 604800, "weeks": 604800,
+}
+
+
+def parse_time_window(value: Any) -> Optional[timedelta]:
+    """
+    A sitrep `timeWindow` ("6h", "30m", "2d", "1w", "90 min") as a timedelta; a bare number
+    means hours, like the "6h"/"12h"/"24h" the clients send. None when it cannot be parsed.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+    match = _WINDOW.match(value.lower())
+    if not match or match.group(2) not in _UNIT_SECONDS:
+        return None
+    seconds = float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    return timedelta(seconds=seconds) if seconds > 0 else None
+
+
+def window_start(window: timedelta, now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now(timezone.utc)) - window
+
+
+def window_bounds(since: datetime) -> List[Tuple[str, Any]]:
+    """
+    Range-filter values for `since` per message ordering field, in the order tried:
+    `createdAt` holds epoch milliseconds (scripts/load_chat.py), `timestamp` a server
+    timestamp (the Android client).
+    """
+    return [("createdAt", int(since.timestamp() * 1000)), ("timestamp", since)]
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines: locking stays in-process only
+    fcntl = None
+
+
+_SEGMENT = re.compile(r"seg-(\d+)\.npy")
+# Chats whose index and segment maps stay open per process
+_OPEN_CHATS = 64
+
+
+class LocalVectorStore:
+    """
+    On-disk chunk vector cache in front of Firestore.
+
+    Layout (per chat):
+      {root}/{chat_key}/seg-00000.npy   float32 (rows, dim) segments, append-only
+      {root}/{chat_key}/index.jsonl     sidecar, one line per chunk:
+          {"messageId", "seq", "seg", "row", "text", "len"}   (later lines win, and are newer)
+      {root}/{chat_key}/.lock           flock: writers exclusive, readers shared; mtime = last use
+
+    Segments are opened with `np.load(mmap_mode="r")`, so reading a chat maps the file and
+    hands out row views without copying or parsing floats. Firestore stays the source of
+    truth; this store only saves re-downloading vectors after a restart.
+
+    Several workers can share one root: segments and rewritten indexes are written to a
+    temp file and published with `os.replace`, and the per-chat lock keeps two processes
+    from picking the same segment number or reading half a compaction. Messages seen
+    without chunks get an empty marker (seq -1) that hides them from catch-up reads for
+    `empty_ttl_s` seconds.
+
+    The root is usually tmpfs (instance memory), so it is bounded twice: compaction keeps
+    only the `max_messages` most recently written messages of a chat (the recent window
+    reads need no more), and once the root outgrows `max_bytes` the least recently used
+    chats are dropped whole.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_segments: int = 16,
+        empty_ttl_s: float = 300.0,
+        max_messages: int = 200,
+        max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.root = Path(root)
+        self.max_segments = max_segments
+        self.empty_ttl_s = empty_ttl_s
+        self.max_messages = max(1, max_messages)
+        self.max_bytes = max(1, max_bytes)
+        self._lock = threading.RLock()
+        # chat_key -> (index file stamp when loaded, rows by (messageId, seq) in line order, open segments)
+        self._loaded: "OrderedDict[str, Tuple[Tuple[int, int, int], Dict[Tuple[str, int], Dict[str, Any]], Dict[int, np.ndarray]]]" = OrderedDict()
+        # Bytes this process wrote since it last checked the root against max_bytes
+        self._written = 0
+        self.evictions = 0
+        self._logger = logging.getLogger("messageai.vector_store")
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _chat_key(chat_id: str) -> str:
+        # Chat ids are user-derived; hash them into safe directory names
+        return hashlib.sha256(chat_id.encode("utf-8")).hexdigest()[:32]
+
+    def _dir(self, chat_id: str) -> Path:
+        return self.root / self._chat_key(chat_id)
+
+    def _segments(self, d: Path) -> List[int]:
+        # Temp files from an interrupted write do not match and are never read
+        return sorted(int(m.group(1)) for m in (_SEGMENT.fullmatch(p.name) for p in d.glob("seg-*.npy")) if m)
+
+    @contextmanager
+    def _locked(self, d: Path, exclusive: bool, wait: bool = True) -> Iterator[bool]:
+        # Callers already holding the lock use the *_locked helpers: flock is not re-entrant per fd.
+        # Yields False (nothing locked) only when `wait` is off and another process holds it.
+        with self._lock:
+            if fcntl is None:
+                yield True
+                return
+            d.mkdir(parents=True, exist_ok=True)
+            with (d / ".lock").open("a") as f:
+                try:
+                    fcntl.flock(f, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if wait else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    # Last use, for LRU eviction of whole chats
+                    os.utime(d / ".lock")
+                    yield True
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self, chat_id: str) -> Tuple[Dict[Tuple[str, int], Dict[str, Any]], Dict[int, np.ndarray]]:
+        d = self._dir(chat_id)
+        if not d.exists():
+            return {}, {}
+        with self._locked(d, exclusive=False):
+            return self._load_locked(chat_id)
+
+    def _load_locked(self, chat_id: str) -> Tuple[Dict[Tuple[str, int], Dict[str, Any]], Dict[int, np.ndarray]]:
+        key = self._chat_key(chat_id)
+        d = self._dir(chat_id)
+        index_path = d / "index.jsonl"
+        try:
+            st = index_path.stat()
+            # Compaction replaces the file (new inode), so an equal size alone is not "unchanged"
+            stamp = (st.st_size, st.st_mtime_ns, st.st_ino)
+        except FileNotFoundError:
+            stamp = (0, 0, 0)
+        cached = self._loaded.get(key)
+        if cached is not None and cached[0] == stamp:
+            self._loaded.move_to_end(key)
+            return cached[1], cached[2]
+        entries: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        if stamp[0]:
+            with index_path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                    except ValueError:
+                        continue  # torn trailing line from an interrupted write
+                    k = (str(e["messageId"]), int(e["seq"]))
+                    # Re-insert so dict order is the order rows were last written (recency)
+                    entries.pop(k, None)
+                    entries[k] = e
+        segments = {n: np.load(d / f"seg-{n:05d}.npy", mmap_mode="r") for n in self._segments(d)}
+        self._loaded[key] = (stamp, entries, segments)
+        self._loaded.move_to_end(key)
+        while len(self._loaded) > _OPEN_CHATS:
+            self._loaded.popitem(last=False)
+        return entries, segments
+
+    def read_chat(self, chat_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Chunk rows by message id (ordered by seq); `embed` is a read-only view into the mmap.
+
+        A message with a live empty marker and no chunks maps to `[]`.
+        """
+        entries, segments = self._load(chat_id)
+        now = time.time()
+        by_msg: Dict[str, List[Dict[str, Any]]] = {}
+        for (mid, seq), e in entries.items():
+            if seq < 0:
+                if now - float(e.get("emptyAt") or 0) < self.empty_ttl_s:
+                    by_msg.setdefault(mid, [])
+                continue
+            seg = segments.get(int(e.get("seg", -1)))
+            embed = seg[int(e["row"])] if seg is not None else None
+            by_msg.setdefault(mid, []).append({
+                "messageId": mid,
+                "seq": seq,
+                "text": e.get("text"),
+                "embed": embed,
+                "len": e.get("len"),
+            })
+        for rows in by_msg.values():
+            rows.sort(key=lambda r: r["seq"])
+        return by_msg
+
+    def write_rows(self, chat_id: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        Appends chunk rows (messageId, seq, text, len, embed) as a new segment. Rows should
+        come oldest message first: compaction keeps the most recently written messages.
+        """
+        if not rows:
+            return
+        d = self._dir(chat_id)
+        with self._locked(d, exclusive=True):
+            segs = self._segments(d)
+            seg_no = (segs[-1] + 1) if segs else 0
+            lines = self._write_segment(d, seg_no, rows)
+            self._append_index(d, lines)
+            seg_path = d / f"seg-{seg_no:05d}.npy"
+            self._written += sum(len(line) + 1 for line in lines) + (seg_path.stat().st_size if seg_path.exists() else 0)
+            if len(segs) + 1 > self.max_segments:
+                self._compact_locked(chat_id)
+        # Amortized: a full scan of the root every sixteenth of the budget written
+        if self._written >= self.max_bytes // 16:
+            self._written = 0
+            self.evict(keep=d.name)
+
+    def mark_empty(self, chat_id: str, message_ids: Iterable[str]) -> None:
+        """Records messages that had no chunks, so reads skip re-fetching them for a while."""
+        at = time.time()
+        lines = [json.dumps({"messageId": str(mid), "seq": -1, "seg": -1, "row": -1, "emptyAt": at}) for mid in message_ids]
+        if not lines:
+            return
+        d = self._dir(chat_id)
+        with self._locked(d, exclusive=True):
+            self._append_index(d, lines)
+
+    def _write_segment(self, d: Path, seg_no: int, rows: List[Dict[str, Any]]) -> List[str]:
+        # Writes the vectors as seg_no and returns the index lines for `rows`
+        vectors = [np.asarray(r.get("embed") if r.get("embed") is not None else [], dtype=np.float32).reshape(-1) for r in rows]
+        dims = {v.shape[0] for v in vectors if v.shape[0]}
+        dim = max(dims) if dims else 0
+        with_vec = [i for i, v in enumerate(vectors) if dim and v.shape[0] == dim]
+        if with_vec:
+            matrix = np.stack([vectors[i] for i in with_vec])
+            tmp = d / f"seg-{seg_no:05d}.npy.{os.getpid()}.tmp"
+            with tmp.open("wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp, d / f"seg-{seg_no:05d}.npy")
+        row_of = {i: n for n, i in enumerate(with_vec)}
+        return [json.dumps({
+            "messageId": str(r.get("messageId")),
+            "seq": int(r.get("seq") or 0),
+            "seg": seg_no if i in row_of else -1,
+            "row": row_of.get(i, -1),
+            "text": r.get("text"),
+            "len": r.get("len"),
+        }, ensure_ascii=False) for i, r in enumerate(rows)]
+
+    @staticmethod
+    def _append_index(d: Path, lines: List[str]) -> None:
+        with (d / "index.jsonl").open("a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def compact(self, chat_id: str) -> None:
+        """Rewrites a chat's live rows into a single segment and drops superseded ones."""
+        d = self._dir(chat_id)
+        with self._locked(d, exclusive=True):
+            self._compact_locked(chat_id)
+
+    def _compact_locked(self, chat_id: str) -> None:
+        d = self._dir(chat_id)
+        entries, segments = self._load_locked(chat_id)
+        now = time.time()
+        # Entries are in write order, so the last max_messages distinct messages are the newest
+        recent = list(dict.fromkeys(mid for (mid, seq) in reversed(entries) if seq >= 0))[: self.max_messages]
+        keep = set(recent)
+        rows, markers = [], []
+        for e in entries.values():
+            if int(e["seq"]) < 0:
+                if now - float(e.get("emptyAt") or 0) < self.empty_ttl_s:
+                    markers.append(json.dumps(e))
+                continue
+            if str(e["messageId"]) not in keep:
+                continue
+            seg = segments.get(int(e.get("seg", -1)))
+            rows.append({
+                "messageId": e["messageId"],
+                "seq": e["seq"],
+                "text": e.get("text"),
+                "len": e.get("len"),
+                "embed": np.array(seg[int(e["row"])]) if seg is not None else None,
+            })
+        old = self._segments(d)
+        # New segment and index first, published atomically; old segments go only after the
+        # index no longer references them (open mmaps of unlinked files stay readable)
+        lines = self._write_segment(d, (old[-1] + 1) if old else 0, rows) + markers
+        tmp = d / f"index.jsonl.{os.getpid()}.tmp"
+        tmp.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+        os.replace(tmp, d / "index.jsonl")
+        self._loaded.pop(self._chat_key(chat_id), None)
+        for n in old:
+            (d / f"seg-{n:05d}.npy").unlink(missing_ok=True)
+        self._logger.info(json.dumps({"event": "vector_store_compact", "segments": len(old), "rows": len(rows), "messages": len(keep)}))
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Drops least recently used chats (except the `keep` directory) until the root fits `max_bytes`."""
+        chats = []
+        for d in self.root.iterdir():
+            if not d.is_dir():
+                continue
+            try:
+                files = [p.stat() for p in d.iterdir()]
+                used = (d / ".lock").stat().st_mtime
+            except FileNotFoundError:
+                continue  # dropped or not fully created by another process meanwhile
+            chats.append((used, d, sum(st.st_size for st in files)))
+        total = sum(size for _, _, size in chats)
+        dropped = 0
+        for _, d, size in sorted(chats, key=lambda c: c[0]):
+            if total <= self.max_bytes:
+                break
+            if d.name == keep or not size:
+                continue
+            # A chat another process is using right now is skipped, not waited for
+            with self._locked(d, exclusive=True, wait=False) as got:
+                if not got:
+                    continue
+                self._drop_locked(d)
+            total -= size
+            dropped += 1
+        if dropped:
+            self.evictions += dropped
+            self._logger.info(json.dumps({"event": "vector_store_evict", "chats": dropped, "bytes": total}))
+        return dropped
+
+    def drop_chat(self, chat_id: str) -> None:
+        d = self._dir(chat_id)
+        if not d.exists():
+            return
+        with self._locked(d, exclusive=True):
+            self._drop_locked(d)
+
+    def _drop_locked(self, d: Path) -> None:
+        self._loaded.pop(d.name, None)
+        # The lock file stays: other processes may be waiting on it
+        for p in d.glob("*"):
+            if p.name != ".lock":
+                p.unlink(missing_ok=True)
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from .chunking import window_messages
+from .config import RAG_CHUNKING, WARM_BATCH_CHUNKS, WARM_KEEP_JOBS, WARM_MAX_QUEUE, WARM_RETRIES, WARM_RETRY_BASE_MS, WARM_WORKERS
+from .firestore_client import CHUNK_CHARS
+
+
+_logger = logging.getLogger("messageai")
+
+# Job states; "partial" is done with some messages left unwarmed (retried on the next warm)
+ACTIVE = ("queued", "running")
+
+
+_CAMEL = {
+    "id": "jobId",
+    "chat_id": "chatId",
+    "request_id": "requestId",
+    "created_at": "createdAt",
+    "started_at": "startedAt",
+    "finished_at": "finishedAt",
+}
+
+
+class WarmQueueFull(Exception):
+    pass
+
+
+@dataclass
+class WarmJob:
+    id: str
+    chat_id: str
+    limit: int
+    request_id: str = ""
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Progress, in messages: complete = already had all chunks (or a window), pending = needed warming
+    messages: int = 0
+    complete: int = 0
+    pending: int = 0
+    written: int = 0
+    windows: int = 0
+    failed: int = 0
+    retries: int = 0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        # camelCase like the request/response envelopes; `warmed` kept from the old synchronous response
+        out = {_CAMEL.get(k, k): v for k, v in asdict(self).items()}
+        out["warmed"] = self.messages
+        return out
+
+
+def _chunks(text: str) -> List[Tuple[int, str]]:
+    return [(seq, text[i : i + CHUNK_CHARS]) for seq, i in enumerate(range(0, len(text), CHUNK_CHARS))]
+
+
+async def _with_retry(job: WarmJob, what: str, fn: Callable[[], Awaitable[Any]], retries: int = WARM_RETRIES, base_ms: float = WARM_RETRY_BASE_MS) -> Any:
+    """Awaits `fn()`, retrying failures with exponential backoff (base, 2x base, ...)."""
+    for attempt in range(retries + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            job.retries += 1
+            delay = base_ms * (2 ** attempt) / 1000.0
+            _logger.warning(json.dumps({"event": "rag_warm_retry", "job_id": job.id, "what": what, "attempt": attempt + 1, "delay_s": delay, "error": str(e)}))
+            await asyncio.sleep(delay)
+
+
+async def warm_chat(job: WarmJob, fs: Any, llm: Any, store: Any, batch_chunks: int = WARM_BATCH_CHUNKS, chunking: str = RAG_CHUNKING) -> None:
+    """
+    Embeds and stores vectors for the chat's recent messages that do not have them yet:
+    conversation windows (RAG_CHUNKING=window) or per-message chunks. Messages already
+    covered are skipped; the rest go out in batches of about `batch_chunks` texts per
+    embeddings call.
+    """
+    msgs = await _with_retry(job, "fetch_messages", lambda: fs.fetch_recent_messages(job.chat_id, limit=job.limit))
+    if chunking == "window":
+        await _warm_windows(job, msgs, llm, store, batch_chunks)
+        return
+    existing = await _with_retry(job, "read_chunks", lambda: store.read_recent_chunks(job.chat_id, message_limit=job.limit))
+    stored: Dict[str, int] = {}
+    for row in existing:
+        if row.get("embed") is not None:
+            stored[str(row.get("messageId"))] = stored.get(str(row.get("messageId")), 0) + 1
+
+    todo: List[Tuple[str, List[Tuple[int, str]]]] = []
+    for m in msgs:
+        text = str(m.get("text") or "").strip()
+        mid = m.get("id")
+        if not text or not mid:
+            continue
+        job.messages += 1
+        chunks = _chunks(text)
+        if stored.get(str(mid), 0) >= len(chunks):
+            job.complete += 1
+        else:
+            todo.append((str(mid), chunks))
+    job.pending = len(todo)
+
+    batch: List[Tuple[str, List[Tuple[int, str]]]] = []
+    size = 0
+    for item in todo:
+        batch.append(item)
+        size += len(item[1])
+        if size >= batch_chunks:
+            await _warm_batch(job, llm, store, batch)
+            batch, size = [], 0
+    if batch:
+        await _warm_batch(job, llm, store, batch)
+
+
+async def _warm_windows(job: WarmJob, msgs: List[Dict[str, Any]], llm: Any, store: Any, batch_size: int) -> None:
+    # Up to one window per message, so reading `limit` windows covers the fetched messages
+    existing = await _with_retry(job, "read_windows", lambda: store.read_recent_windows(job.chat_id, limit=job.limit))
+    covered = {mid for w in existing if w.get("embed") is not None for mid in w.get("messageIds") or []}
+    fetched = [m for m in msgs if m.get("id") and str(m.get("text") or "").strip()]
+    job.messages = len(fetched)
+    job.complete = sum(1 for m in fetched if m["id"] in covered)
+    job.pending = job.messages - job.complete
+    # fetch_recent_messages is newest first; windows are built oldest first
+    order_field = "createdAt" if all(m.get("createdAt") is not None for m in fetched) else "timestamp"
+    windows = window_messages(fetched[::-1], covered=covered, order_field=order_field)
+    for i in range(0, len(windows), batch_size):
+        batch = windows[i : i + batch_size]
+        texts = [w.text for w in batch]
+
+        async def embed() -> List[Any]:
+            vectors = await llm.embed_many(texts)
+            if any(v is None for v in vectors):
+                raise RuntimeError(f"{sum(v is None for v in vectors)} of {len(vectors)} embeddings failed")
+            return vectors
+
+        new_ids = {mid for w in batch for mid in w.message_ids if mid not in covered}
+        try:
+            vectors = await _with_retry(job, "embed", embed)
+            rows = [w.row(vec) for w, vec in zip(batch, vectors)]
+            await _with_retry(job, "write", lambda: store.write_windows(job.chat_id, rows))
+        except Exception as e:
+            job.failed += len(new_ids)
+            job.error = str(e)
+            _logger.warning(json.dumps({"event": "rag_warm_window_error", "job_id": job.id, "windows": len(batch), "error": str(e)}))
+            continue
+        job.windows += len(batch)
+        job.written += len(new_ids)
+        covered |= new_ids
+
+
+async def _warm_batch(job: WarmJob, llm: Any, store: Any, batch: List[Tuple[str, List[Tuple[int, str]]]]) -> None:
+    texts = [text for _, chunks in batch for _, text in chunks]
+
+    async def embed() -> List[Any]:
+        vectors = await llm.embed_many(texts)
+        if any(v is None for v in vectors):
+            # embed_many reports per-item failures as None; retry the batch as a whole
+            raise RuntimeError(f"{sum(v is None for v in vectors)} of {len(vectors)} embeddings failed")
+        return vectors
+
+    try:
+        vectors = await _with_retry(job, "embed", embed)
+    except Exception as e:
+        job.failed += len(batch)
+        job.error = str(e)
+        _logger.warning(json.dumps({"event": "rag_warm_embed_error", "job_id": job.id, "messages": len(batch), "error": str(e)}))
+        return
+
+    offset = 0
+    writes = []
+    for mid, chunks in batch:
+        rows = [
+            {"seq": seq, "text": text, "len": len(text), "embed": vec}
+            for (seq, text), vec in zip(chunks, vectors[offset : offset + len(chunks)])
+        ]
+        offset += len(chunks)
+        writes.append(_write(job, store, mid, rows))
+    await asyncio.gather(*writes)
+
+
+async def _write(job: WarmJob, store: Any, mid: str, rows: List[Dict[str, Any]]) -> None:
+    try:
+        await _with_retry(job, "write", lambda: store.write_chunks(job.chat_id, mid, rows))
+        job.written += 1
+    except Exception as e:
+        job.failed += 1
+        job.error = str(e)
+        _logger.warning(json.dumps({"event": "rag_warm_write_error", "job_id": job.id, "message_id": mid, "error": str(e)}))
+
+
+class WarmJobQueue:
+    """
+    Bounded queue of /rag/warm jobs drained by a fixed pool of worker tasks. A chat with a
+    job already queued or running gets that job back instead of a second one. Finished
+    jobs are kept (up to `keep`) so their status can still be read.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[WarmJob], Awaitable[None]],
+        workers: int = WARM_WORKERS,
+        max_queue: int = WARM_MAX_QUEUE,
+        keep: int = WARM_KEEP_JOBS,
+    ) -> None:
+        self.run = run
+        self.workers = workers
+        self.max_queue = max_queue
+        self.keep = keep
+        self._jobs: "OrderedDict[str, WarmJob]" = OrderedDict()
+        self._active: Dict[str, WarmJob] = {}  # chatId -> queued/running job
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self) -> None:
+        # Workers need a running loop, so they start with the first job
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, chat_id: str, limit: int, request_id: str = "") -> WarmJob:
+        active = self._active.get(chat_id)
+        if active is not None and active.status in ACTIVE:
+            return active
+        self._start()
+        job = WarmJob(id=uuid.uuid4().hex, chat_id=chat_id, limit=limit, request_id=request_id)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise WarmQueueFull(f"{self._queue.qsize()} warm jobs already queued")
+        self._active[chat_id] = job
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status in ACTIVE:
+                break
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[WarmJob]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                await self.run(job)
+                job.status = "partial" if job.failed else "done"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "cancelled"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                if self._active.get(job.chat_id) is job:
+                    del self._active[job.chat_id]
+                self._queue.task_done()
+                _logger.info(json.dumps({"event": "rag_warm_job", **job.to_dict(), "elapsed_ms": round((job.finished_at - job.started_at) * 1000, 1)}))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "jobs": by_status,
+        }
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# `app` is a namespace package under langchain-service/, as the scripts import it
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,17 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH = Path(__file__).resolve().parents[2] / "scripts" / "bench_service.py"
+
+
+def test_bench_runs_every_route_against_the_fakes(tmp_path: Path) -> None:
+    # A subprocess: the harness swaps the service module's globals for its fakes
+    out = tmp_path / "report.json"
+    fast = ["--llm-ms", "1", "--embed-ms", "1", "--fs-ms", "0", "--jitter", "0"]
+    subprocess.run([sys.executable, str(BENCH), "--requests", "2", *fast, "--json", str(out)], check=True, capture_output=True, timeout=120)
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["total"]["errors"] == 0 and report["total"]["requests"] == 2 * len(report["routes"])
+    assert all(r["count"] == 2 for r in report["routes"].values())
+    assert report["upstream"]["llm_calls"] > 0 and report["upstream"]["embed_calls"] > 0
@@ -0,0 +1,42 @@
+from typing import Any, Dict, List
+
+from app.chunking import CHARS_PER_TOKEN, count_tokens, window_messages
+
+
+def _messages(n: int, words: int = 10) -> List[Dict[str, Any]]:
+    return [{"id": f"m{i}", "text": " ".join([f"w{i}"] * words), "createdAt": i} for i in range(n)]
+
+
+def test_count_tokens_never_below_word_count() -> None:
+    assert count_tokens("") == 0
+    assert count_tokens("N 10 RTB") == 3
+    assert count_tokens("x" * 40) == 40 // CHARS_PER_TOKEN
+
+
+def test_windows_fit_the_budget_cover_every_message_and_overlap() -> None:
+    windows = window_messages(_messages(20), max_tokens=40, overlap_tokens=10)
+    assert all(w.tokens <= 40 for w in windows)
+    assert {mid for w in windows for mid in w.message_ids} == {f"m{i}" for i in range(20)}
+    # Each window after the first repeats the previous window's last message
+    for prev, cur in zip(windows, windows[1:]):
+        assert cur.message_ids[0] == prev.message_ids[-1]
+    assert windows[-1].row()["lastAt"] == 19 and windows[-1].row()["messageId"] == "m19"
+
+
+def test_oversize_messages_split_into_distinct_windows() -> None:
+    text = "".join(chr(ord("a") + i % 26) for i in range(100 * CHARS_PER_TOKEN - 1))
+    msgs = [{"id": "long", "text": text, "createdAt": 0}]
+    windows = window_messages(msgs, max_tokens=40, overlap_tokens=0)
+    assert len(windows) == 3 and all(w.message_ids == ["long"] for w in windows)
+    assert len({w.id for w in windows}) == 3
+
+
+def test_incremental_windows_skip_covered_messages_but_keep_their_overlap() -> None:
+    msgs = _messages(12)
+    first = window_messages(msgs[:8], max_tokens=40, overlap_tokens=10)
+    covered = {mid for w in first for mid in w.message_ids}
+    later = window_messages(msgs, max_tokens=40, overlap_tokens=10, covered=covered)
+    assert later[0].message_ids[0] == "m7"
+    assert {mid for w in later for mid in w.message_ids} - covered == {"m8", "m9", "m10", "m11"}
+    # Re-windowing the same messages yields the same ids (re-warms overwrite, not duplicate)
+    assert [w.id for w in window_messages(msgs[:8], max_tokens=40, overlap_tokens=10)] == [w.id for w in first]
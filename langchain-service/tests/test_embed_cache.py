@@ -0,0 +1,23 @@
+from pathlib import Path
+
+import numpy as np
+
+from app.embed_cache import EmbeddingCache, text_hash
+
+
+def test_sqlite_cache_stores_f16_within_byte_budget(tmp_path: Path) -> None:
+    dim = 256
+    cache = EmbeddingCache(path=str(tmp_path / "embed.sqlite3"), max_bytes=40 * dim * 2, memory_entries=1)
+    rng = np.random.default_rng(0)
+    vectors = {f"text {i}": rng.standard_normal(dim).astype(np.float32) for i in range(200)}
+    for text, vec in vectors.items():
+        cache.put_many("m", [(text_hash(text), vec)])
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 40 * dim * 2 and stats["size"] <= 40
+    # The newest rows survive pruning and decode close to the float32 input
+    newest = "text 199"
+    got = cache.get_many("m", [text_hash(newest)])[text_hash(newest)]
+    assert got.dtype == np.float32
+    assert np.allclose(got, vectors[newest], atol=1e-2)
+    assert cache.get_many("m", [text_hash("text 0")]) == {}
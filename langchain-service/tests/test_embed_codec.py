@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from app.embed_codec import decode_embed, encode_embed
+
+
+@pytest.mark.parametrize("encoding, atol", [("f16", 1e-3), ("i8", 2e-2)])
+def test_blob_encodings_round_trip_with_small_error(encoding: str, atol: float) -> None:
+    vec = np.random.default_rng(0).standard_normal(1536).astype(np.float32) * 0.05
+    doc = encode_embed(vec.tolist(), encoding)
+    assert doc["encoding"] == encoding and doc["dim"] == 1536 and "embed" not in doc
+    assert len(doc["embedBlob"]) == 1536 * (2 if encoding == "f16" else 1)
+    got = decode_embed(doc)
+    assert got.dtype == np.float32 and np.allclose(got, vec, atol=atol)
+    cosine = float(got @ vec / (np.linalg.norm(got) * np.linalg.norm(vec)))
+    assert cosine > 0.999
+
+
+def test_array_docs_and_undecodable_blobs() -> None:
+    assert encode_embed([1.0, 2.0]) == {"embed": [1.0, 2.0]}
+    assert decode_embed({"embed": [1.0, 2.0], "norm": 2.2}) == [1.0, 2.0]
+    assert decode_embed({"encoding": "f16", "embedBlob": b"\x00\x01\x02"}) is None
+    assert decode_embed({"encoding": "bf16", "embedBlob": b"\x00\x01"}) is None
+    with pytest.raises(ValueError):
+        encode_embed([1.0], "bf16")
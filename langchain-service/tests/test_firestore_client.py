@@ -0,0 +1,173 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from app.firestore_client import CHUNK_CHARS, AsyncFirestoreReader, FirestoreReader, _ClientRegistry
+
+
+class _Ref:
+    """Path-addressed stand-in for the Firestore collection/document/query objects used by the reader."""
+
+    def __init__(self, store: Dict[str, Dict[str, Any]], path: str, **query: Any) -> None:
+        self.store = store
+        self.path = path
+        self.query = query
+
+    def collection(self, name: str) -> "_Ref":
+        return _Ref(self.store, f"{self.path}/{name}".lstrip("/"))
+
+    def document(self, name: str) -> "_Ref":
+        return _Ref(self.store, f"{self.path}/{name}")
+
+    def _with(self, **query: Any) -> "_Ref":
+        return _Ref(self.store, self.path, **{**self.query, **query})
+
+    def where(self, filter: Any) -> "_Ref":
+        return self._with(filter=filter)
+
+    def order_by(self, field: str, direction: Any = None) -> "_Ref":
+        return self._with(order=field, descending=direction == "DESCENDING")
+
+    def start_after(self, snap: Any) -> "_Ref":
+        return self._with(after=snap.id)
+
+    def limit(self, n: int) -> "_Ref":
+        return self._with(limit=n)
+
+    def stream(self) -> List[Any]:
+        prefix = self.path + "/"
+        docs = [_snap(self.store, p) for p in sorted(self.store) if p.startswith(prefix) and "/" not in p[len(prefix) :]]
+        q = self.query
+        if "filter" in q:
+            f = q["filter"]
+            docs = [d for d in docs if d.to_dict().get(f.field_path) is not None and d.to_dict()[f.field_path] >= f.value]
+        if "order" in q:
+            docs.sort(key=lambda d: d.to_dict().get(q["order"]) or 0, reverse=q["descending"])
+        if "after" in q:
+            docs = docs[[d.id for d in docs].index(q["after"]) + 1 :]
+        self.store.setdefault("_pages", {}).setdefault(self.path, []).append(q.get("limit"))
+        return docs[: q.get("limit", len(docs))]
+
+
+def _snap(store: Dict[str, Dict[str, Any]], path: str) -> Any:
+    return SimpleNamespace(
+        id=path.rsplit("/", 1)[-1], exists=path in store, reference=_Ref(store, path), to_dict=lambda: store.get(path)
+    )
+
+
+class _Client(_Ref):
+    def __init__(self, store: Dict[str, Dict[str, Any]]) -> None:
+        super().__init__(store, "")
+
+    def get_all(self, refs: List[_Ref]) -> List[Any]:
+        return [_snap(self.store, r.path) for r in refs]
+
+
+def test_bulk_and_serial_reads_drop_chunks_left_by_a_shortening_edit() -> None:
+    base = "chats/c/messages/m1"
+    # Written as three chunks, then edited down to one
+    store = {base: {"text": "short now"}}
+    for seq in range(3):
+        store[f"{base}/chunks/{seq}"] = {"seq": seq, "text": "x" * CHUNK_CHARS, "embed": [1.0, 0.0]}
+
+    class Reader(FirestoreReader):
+        client = _Client(store)
+
+    reader = Reader()
+    bulk = reader.fetch_recent_chunks_bulk("c")
+    serial = reader.fetch_recent_chunks_serial("c")
+    assert [r["seq"] for r in bulk] == [r["seq"] for r in serial] == [0]
+
+
+def test_window_reads_page_by_page_and_fall_back_to_timestamp() -> None:
+    now = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    since = now - timedelta(hours=1)
+    base = "chats/c/messages"
+    store: Dict[str, Dict[str, Any]] = {}
+    for i in range(7):
+        created = now - timedelta(minutes=10 * i)
+        store[f"{base}/m{i}"] = {"text": f"message {i}", "createdAt": int(created.timestamp() * 1000)}
+
+    class Reader(FirestoreReader):
+        client = _Client(store)
+
+    msgs = Reader().fetch_messages_in_window("c", since, page_size=2, max_messages=5)
+    # m6 is 60 minutes old (inside the window) but past max_messages
+    assert [m["id"] for m in msgs] == ["m0", "m1", "m2", "m3", "m4"]
+    assert store.pop("_pages")[base] == [2, 2, 1]
+
+    # Client-written messages carry only a server `timestamp`
+    for i in range(3):
+        store[f"{base}/m{i}"] = {"text": f"message {i}", "timestamp": now - timedelta(minutes=45 * i)}
+    for i in range(3, 7):
+        del store[f"{base}/m{i}"]
+    assert [m["id"] for m in Reader().fetch_messages_in_window("c", since, page_size=2)] == ["m0", "m1"]
+
+
+def test_client_pool_is_built_once_and_handed_out_round_robin() -> None:
+    built: List[Optional[str]] = []
+
+    def factory(project: Optional[str]) -> Any:
+        built.append(project)
+        return SimpleNamespace(n=len(built))
+
+    registry = _ClientRegistry(factory, "sync", size=2)
+    with ThreadPoolExecutor(8) as pool:
+        clients = list(pool.map(lambda _: registry.get(), range(16)))
+    assert len(built) == 2
+    assert sorted(c.n for c in clients) == [1] * 8 + [2] * 8
+    assert [c.n for c in registry.all()] == [1, 2]
+
+
+class _AsyncRef(_Ref):
+    """The AsyncClient shape: `stream()` and `get_all()` are async iterators."""
+
+    def collection(self, name: str) -> "_AsyncRef":
+        return _AsyncRef(self.store, super().collection(name).path)
+
+    def document(self, name: str) -> "_AsyncRef":
+        return _AsyncRef(self.store, super().document(name).path)
+
+    def _with(self, **query: Any) -> "_AsyncRef":
+        return _AsyncRef(self.store, self.path, **{**self.query, **query})
+
+    async def stream(self) -> Any:  # type: ignore[override]
+        for doc in super().stream():
+            yield doc
+
+    async def get_all(self, refs: List[_Ref]) -> Any:
+        for ref in refs:
+            yield _snap(self.store, ref.path)
+
+
+def test_async_reader_returns_the_sync_readers_rows() -> None:
+    now = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    store: Dict[str, Dict[str, Any]] = {}
+    for i in range(3):
+        base = f"chats/c/messages/m{i}"
+        store[base] = {"text": "y" * (CHUNK_CHARS * i + 1), "createdAt": int((now - timedelta(minutes=i)).timestamp() * 1000)}
+        for seq in range(i + 1):
+            store[f"{base}/chunks/{seq}"] = {"seq": seq, "text": f"chunk {seq}", "embed": [float(seq), 1.0]}
+
+    class Reader(FirestoreReader):
+        client = _Client(store)
+
+    class AsyncReader(AsyncFirestoreReader):
+        client = _AsyncRef(store, "")
+
+    since = now - timedelta(hours=1)
+
+    async def read() -> List[Any]:
+        reader = AsyncReader()
+        return [
+            await reader.fetch_recent_chunks_bulk("c"),
+            await reader.fetch_recent_chunks_serial("c"),
+            await reader.fetch_messages_in_window("c", since, page_size=2),
+        ]
+
+    sync = Reader()
+    expected = [sync.fetch_recent_chunks_bulk("c"), sync.fetch_recent_chunks_serial("c"), sync.fetch_messages_in_window("c", since, page_size=2)]
+    assert asyncio.run(read()) == expected
+    assert [(r["messageId"], r["seq"]) for r in expected[0]] == [("m0", 0), ("m1", 0), ("m1", 1), ("m2", 0), ("m2", 1), ("m2", 2)]
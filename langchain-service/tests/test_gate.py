@@ -0,0 +1,76 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.gate import classify_locally
+
+LABELS = Path(__file__).resolve().parents[2] / "scripts" / "seeds" / "chats_seed_gate_labels.json"
+
+
+@pytest.mark.parametrize("text", ["ok", "Copy.", "roger that", "lol", "Good copy, out."])
+def test_acknowledgements_skip(text: str) -> None:
+    assert classify_locally(text).escalate is False
+
+
+@pytest.mark.parametrize("text", [
+    "Contact front, shots fired from the treeline",
+    "Two WIA, need MEDEVAC at the HLZ",
+    "Send me a SITREP",
+    "Enemy BMP spotted at 38T MN 2385 5650",
+])
+def test_trigger_words_escalate(text: str) -> None:
+    res = classify_locally(text)
+    assert res.escalate is True and res.families
+
+
+def test_unclear_messages_go_to_the_llm() -> None:
+    res = classify_locally("Weather is turning colder tonight, bring an extra layer for the walk back")
+    assert res.escalate is None and res.reason == "no_trigger"
+
+
+def test_seed_labels_have_no_wrong_skips() -> None:
+    # A wrong skip silently drops an escalation; the shipped labels must never see one
+    labels = json.loads(LABELS.read_text(encoding="utf-8"))
+    wrong = [text for text, escalate in labels.items() if escalate and classify_locally(text).escalate is False]
+    assert wrong == []
+
+
+class _VotingLLM:
+    """Answers gate votes in order; each vote takes `delay` seconds and records cancellation."""
+
+    def __init__(self, votes: List[bool], delays: List[float]) -> None:
+        self.plan = list(zip(votes, delays))
+        self.cancelled = 0
+
+    async def chat(self, **kwargs: Any) -> str:
+        vote, delay = self.plan.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return json.dumps({"escalate": vote})
+
+
+@pytest.mark.parametrize("votes, delays, escalate, cancelled", [
+    # The slow third vote is cancelled once the first two agree
+    ([True, True, False], [0.0, 0.01, 5.0], True, 1),
+    ([False, True, False], [0.0, 0.01, 0.02], False, 0),
+])
+def test_gate_votes_stop_at_quorum(monkeypatch: Any, votes: List[bool], delays: List[float], escalate: bool, cancelled: int) -> None:
+    llm = _VotingLLM(votes, delays)
+    for name in ("fs", "store", "rag"):
+        monkeypatch.setattr(main, name, SimpleNamespace())
+    monkeypatch.setattr(main, "llm", llm)
+    monkeypatch.setattr(main, "PREGATE_ENABLED", False)
+    monkeypatch.setattr(main, "GATE_VOTES", 3)
+    monkeypatch.setattr(main, "GATE_QUORUM", 2)
+    r = TestClient(main.app).post("/assistant/gate", json={"requestId": "r1", "payload": {"prompt": "hmm"}})
+    assert r.status_code == 200 and r.json()["data"] == {"escalate": escalate}
+    assert llm.cancelled == cancelled
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Any, List
+
+from app.lazy import Lazy, aresolve, build_state, resolve
+
+
+def test_public_names_reach_the_wrapped_object() -> None:
+    wrapped = SimpleNamespace(name="inner", get=lambda: "got", ready="yes", build_ms=7)
+    lazy = Lazy("svc", lambda: wrapped)
+    assert (lazy.name, lazy.get(), lazy.ready, lazy.build_ms) == ("inner", "got", "yes", 7)
+    assert build_state(lazy)["ready"] is True
+
+
+def test_async_waiters_do_not_block_the_loop_during_a_build() -> None:
+    release = threading.Event()
+    calls: List[int] = []
+
+    def factory() -> Any:
+        calls.append(1)
+        release.wait(5)
+        return SimpleNamespace(value=42)
+
+    lazy = Lazy("svc", factory)
+    # The startup thread owns the build
+    builder = threading.Thread(target=resolve, args=(lazy,))
+    builder.start()
+    while not calls:
+        pass
+
+    async def run() -> None:
+        waiter = asyncio.create_task(aresolve(lazy))
+        ticks = 0
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert ticks == 5 and not waiter.done()
+        release.set()
+        assert (await waiter).value == 42
+
+    asyncio.run(run())
+    builder.join()
+    assert calls == [1] and build_state(lazy)["build_ms"] is not None
+
+
+def test_failed_build_is_retried() -> None:
+    attempts: List[int] = []
+
+    def factory() -> Any:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("no credentials yet")
+        return SimpleNamespace(ok=True)
+
+    lazy = Lazy("svc", factory)
+    try:
+        resolve(lazy)
+    except RuntimeError:
+        pass
+    assert asyncio.run(aresolve(lazy)).ok and len(attempts) == 2
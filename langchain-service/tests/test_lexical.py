@@ -0,0 +1,38 @@
+from app.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def _index() -> BM25Index:
+    index = BM25Index()
+    index.add("m1", "Convoy departs at 0600 from the north gate")
+    index.add("m2", "Copy, convoy delayed, new time to follow")
+    index.add("m3", "Grid 38SMB4484 contact, two vehicles moving north")
+    return index
+
+
+def test_tokenize_keeps_brevity_words_and_drops_function_words() -> None:
+    assert tokenize("Roger that, moving NORTH to the LZ") == ["roger", "moving", "north", "lz"]
+
+
+def test_bm25_ranks_rare_terms_above_common_ones() -> None:
+    index = _index()
+    ranked = index.search("contact north", k=3)
+    assert [doc for doc, _ in ranked] == ["m3", "m1"]
+    assert index.search("38smb4484", k=3)[0][0] == "m3"
+    assert [doc for doc, _ in index.search("convoy north", k=3, allowed={"m2"})] == ["m2"]
+    assert index.search("tank", k=3) == []
+
+
+def test_remove_and_retain_keep_postings_consistent() -> None:
+    index = _index()
+    index.add("m1", "Resupply at the north gate")
+    assert [doc for doc, _ in index.search("convoy", k=3)] == ["m2"]
+    index.retain({"m2"})
+    assert len(index) == 1 and "m3" not in index
+    assert set(index.postings) == set(tokenize("Copy, convoy delayed, new time to follow"))
+    assert index.total_length == sum(index.lengths.values())
+
+
+def test_rrf_rewards_agreement_between_rankings() -> None:
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [doc for doc, _ in fused] == ["b", "a", "d", "c"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
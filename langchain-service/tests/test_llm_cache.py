@@ -0,0 +1,68 @@
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, List
+
+from app import llm_cache
+from app.llm_cache import MemoryResponseCache, SqliteResponseCache, llm_cache_key
+from app.providers import AsyncOpenAIProvider
+
+
+def test_key_covers_everything_that_shapes_the_response() -> None:
+    base = ("gpt-4o-mini", "system", "user", 0.3, 800)
+    variants = [
+        ("gpt-4.1-nano", "system", "user", 0.3, 800),
+        ("gpt-4o-mini", "system!", "user", 0.3, 800),
+        ("gpt-4o-mini", "system", "user!", 0.3, 800),
+        ("gpt-4o-mini", "system", "user", 0.7, 800),
+        ("gpt-4o-mini", "system", "user", 0.3, 400),
+    ]
+    assert llm_cache_key(*base) == llm_cache_key(*base)
+    assert len({llm_cache_key(*v) for v in variants} | {llm_cache_key(*base)}) == 6
+
+
+def test_memory_cache_expires_and_evicts_least_recently_used(monkeypatch: Any) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "monotonic", lambda: now[0])
+    cache = MemoryResponseCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats() == {"backend": "memory", "size": 1, "hits": 3, "misses": 2}
+
+
+def test_sqlite_cache_is_shared_across_instances_until_expiry(tmp_path: Path, monkeypatch: Any) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    path = str(tmp_path / "llm.sqlite3")
+    SqliteResponseCache(path=path, ttl_seconds=60).put("k", "cached answer")
+    other = SqliteResponseCache(path=path, ttl_seconds=60)
+    assert other.get("k") == "cached answer"
+    now[0] += 61
+    assert other.get("k") is None and other.stats()["size"] == 0
+
+
+def test_cache_false_always_reaches_the_model() -> None:
+    provider = AsyncOpenAIProvider(cache=MemoryResponseCache(), dispatch=False)
+    provider.enabled = True
+    calls: List[str] = []
+
+    class _Completions:
+        async def create(self, **kwargs: Any) -> Any:
+            calls.append(kwargs["messages"][1]["content"])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer {len(calls)}"))])
+
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=_Completions()))
+
+    async def run() -> None:
+        assert await provider.chat("s", "u") == "answer 1"
+        assert await provider.chat("s", "u") == "answer 1"
+        assert await provider.chat("s", "u", cache=False) == "answer 2"
+        assert await provider.chat("s", "u", cache=False) == "answer 3"
+
+    asyncio.run(run())
+    assert len(calls) == 3
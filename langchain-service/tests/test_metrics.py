@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any
+
+from app.metrics import STAGE_METRIC, MetricsRegistry, observe_stage, registry, request_scope, timed
+
+
+def test_render_uses_cumulative_buckets_and_escaped_labels() -> None:
+    reg = MetricsRegistry()
+    for seconds in (0.002, 0.002, 3.0, 20.0):
+        reg.observe("latency_seconds", {"endpoint": '/a"b'}, seconds)
+    lines = reg.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds latency_seconds", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="0.001"} 0' in lines
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="0.005"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="4.0"} 3' in lines
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{endpoint="/a\\"b"} 4' in lines
+
+
+def test_spans_in_spawned_tasks_land_on_the_request() -> None:
+    @timed("embed")
+    async def embed() -> None:
+        await asyncio.sleep(0)
+
+    async def handler() -> Any:
+        with request_scope("/test/metrics") as stages:
+            await asyncio.gather(embed(), embed())
+            observe_stage("llm", 0.25)
+        return stages
+
+    stages = asyncio.run(handler())
+    assert set(stages) == {"embed", "llm"} and stages["llm"] == 250.0
+    series = registry.snapshot()[STAGE_METRIC]
+    assert series[(("endpoint", "/test/metrics"), ("stage", "embed"))].count == 2
@@ -0,0 +1,34 @@
+from app.chunking import count_tokens
+from app.packing import hamming, pack_context, simhash
+
+
+def _words(prefix: str, n: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_simhash_ignores_formatting_and_separates_distinct_texts() -> None:
+    text = "Enemy patrol moving north along the river road at grid 123456, two trucks and dismounts"
+    # Case, punctuation and spacing do not change the shingles
+    assert simhash(text) == simhash(text.upper()) == simhash(text.replace(",", "").replace(" ", "  ") + "!")
+    assert hamming(simhash(text), simhash("Resupply convoy delayed until 1800, request fuel and water at the LZ")) > 3
+    assert simhash("") == 0
+
+
+def test_packing_skips_near_duplicates_and_keeps_rank_order() -> None:
+    report = "Contact at checkpoint three, taking small arms fire from the tree line east of the bridge"
+    packed = pack_context([report, "Medevac requested for one casualty", report + ".", "Ammo is low"], max_tokens=200)
+    assert packed.text.split("\n") == [report, "Medevac requested for one casualty", "Ammo is low"]
+    assert (packed.candidates, packed.items, packed.duplicates) == (4, 3, 1)
+
+
+def test_leftover_budget_goes_to_the_largest_items_that_fit() -> None:
+    best, long, medium, small = _words("a", 40), _words("b", 200), _words("c", 50), _words("d", 10)
+    packed = pack_context([best, long, medium, small], max_tokens=count_tokens(best) + count_tokens(medium) + 5)
+    # The long item stops rank-order packing but no longer ends it
+    assert packed.text.split("\n") == [best, medium]
+    assert packed.tokens <= packed.budget and not packed.truncated
+
+
+def test_oversized_best_item_is_truncated_rather_than_dropped() -> None:
+    packed = pack_context([_words("w", 500)], max_tokens=20)
+    assert packed.truncated and packed.items == 1 and packed.tokens <= 20
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+from app.embed_cache import EmbeddingCache
+from app.llm_cache import SqliteResponseCache
+from app.providers import AsyncOpenAIProvider, EmbeddingDispatcher, OpenAIProvider, _embed_batches
+
+
+def test_sqlite_embed_cache_runs_off_the_event_loop(tmp_path: Path) -> None:
+    cache = EmbeddingCache(path=str(tmp_path / "embed.sqlite3"))
+    threads: List[int] = []
+    for name in ("lookup", "fill"):
+        real = getattr(cache, name)
+
+        def spy(*args: Any, _real: Any = real) -> Any:
+            threads.append(threading.get_ident())
+            return _real(*args)
+
+        setattr(cache, name, spy)
+
+    provider = AsyncOpenAIProvider(dispatch=False, embed_cache=cache)
+    provider.enabled = True
+
+    async def embed(texts: List[str], model: str, batch_size: int, max_chars: int) -> List[Optional[List[float]]]:
+        return [[float(len(t)), 1.0] for t in texts]
+
+    provider._embed_many_uncached = embed  # type: ignore[method-assign]
+
+    async def run() -> None:
+        loop_thread = threading.get_ident()
+        first = await provider.embed_many(["alpha", "bravo", "alpha"])
+        second = await provider.embed_many(["alpha", "bravo"])
+        assert first == [[5.0, 1.0], [5.0, 1.0], [5.0, 1.0]]
+        assert second == [[5.0, 1.0], [5.0, 1.0]]
+        assert threads and loop_thread not in threads
+
+    asyncio.run(run())
+    assert cache.stats()["hits"] >= 2
+
+
+def test_sqlite_response_cache_runs_off_the_event_loop(tmp_path: Path) -> None:
+    cache = SqliteResponseCache(path=str(tmp_path / "llm.sqlite3"))
+    threads: List[int] = []
+    for name in ("get", "put"):
+        real = getattr(cache, name)
+
+        def spy(*args: Any, _real: Any = real) -> Any:
+            threads.append(threading.get_ident())
+            return _real(*args)
+
+        setattr(cache, name, spy)
+
+    provider = AsyncOpenAIProvider(cache=cache, dispatch=False)
+    provider.enabled = True
+    calls: List[bool] = []
+
+    class _Completions:
+        async def create(self, stream: bool = False, **kwargs: Any) -> Any:
+            calls.append(stream)
+            if stream:
+                async def events() -> Any:
+                    for part in ("stream", "ed"):
+                        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+                return events()
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))])
+
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=_Completions()))
+
+    async def run() -> None:
+        loop_thread = threading.get_ident()
+        assert await provider.chat("s", "u") == "answer"
+        assert await provider.chat("s", "u") == "answer"
+        assert [d async for d in provider.chat_stream("s", "v")] == ["stream", "ed"]
+        assert [d async for d in provider.chat_stream("s", "v")] == ["streamed"]
+        assert calls == [False, True]
+        assert len(threads) == 6 and loop_thread not in threads
+
+    asyncio.run(run())
+
+
+def test_embed_batches_respect_count_and_char_limits() -> None:
+    texts = ["aaaa", "", "bb", "cccccc", "d", "ee"]
+    assert _embed_batches(texts, batch_size=2, max_chars=100) == [[0, 2], [3, 4], [5]]
+    assert _embed_batches(texts, batch_size=10, max_chars=8) == [[0, 2], [3, 4], [5]]
+
+
+class _APIError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class _Embeddings:
+    def __init__(self, status_code: int) -> None:
+        self.status_code = status_code
+        self.calls: List[List[str]] = []
+
+    def create(self, model: str, input: Any) -> Any:
+        inputs = [input] if isinstance(input, str) else list(input)
+        self.calls.append(inputs)
+        if "bad" in inputs:
+            raise _APIError(self.status_code)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t))]) for i, t in enumerate(inputs)])
+
+
+def _sync_provider(status_code: int) -> OpenAIProvider:
+    provider = OpenAIProvider()
+    provider.enabled = True
+    provider.client = SimpleNamespace(embeddings=_Embeddings(status_code))
+    return provider
+
+
+def test_rejected_batch_is_retried_item_by_item() -> None:
+    provider = _sync_provider(400)
+    out = provider.embed_many(["one", "bad", "three", "four"], batch_size=2)
+    assert out == [[3.0], None, [5.0], [4.0]]
+    assert provider.client.embeddings.calls == [["one", "bad"], ["one"], ["bad"], ["three", "four"]]
+
+
+def test_service_failure_leaves_the_remaining_batches_unembedded() -> None:
+    provider = _sync_provider(503)
+    assert provider.embed_many(["one", "bad", "three", "four"], batch_size=2) == [None] * 4
+    assert provider.client.embeddings.calls == [["one", "bad"]]
+
+
+def test_dispatcher_merges_concurrent_requests_into_one_call() -> None:
+    calls: List[List[str]] = []
+
+    async def embed_now(texts: List[str], model: str) -> List[Optional[List[float]]]:
+        calls.append(list(texts))
+        await asyncio.sleep(0)
+        return [[float(len(t))] for t in texts]
+
+    async def run() -> None:
+        dispatcher = EmbeddingDispatcher(embed_now, window_ms=20, max_batch=5)
+        first, second = await asyncio.gather(
+            dispatcher.embed_many(["alpha", "", "bravo"], "m"), dispatcher.embed_many(["bravo", "echo"], "m")
+        )
+        assert first == [[5.0], None, [5.0]] and second == [[5.0], [4.0]]
+        # Identical texts in one flush are sent once
+        assert calls == [["alpha", "bravo", "echo"]]
+        # A full batch flushes without waiting for the window
+        started = asyncio.get_running_loop().time()
+        await dispatcher.embed_many(["a", "b", "c", "d", "e"], "m")
+        assert asyncio.get_running_loop().time() - started < 0.02
+        stats = dispatcher.stats()
+        assert (stats["flushes"], stats["deduped"], stats["flush_reasons"]) == (2, 1, {"window": 1, "size": 1})
+
+    asyncio.run(run())
@@ -0,0 +1,181 @@
+import asyncio
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.rag import RAGCache, _VectorMatrix, _cosine
+
+
+class _LLM:
+    async def embed_many(self, texts: List[str], model: str | None = None) -> List[List[float]]:
+        return [[1.0, float(len(t) % 7), 0.5] for t in texts]
+
+    async def embed(self, text: str, model: str | None = None) -> List[float]:
+        return [1.0, 2.0, 0.5]
+
+
+class _FS:
+    """Messages newest first, like Firestore ordered by createdAt descending."""
+
+    def __init__(self) -> None:
+        self.messages: List[Dict[str, Any]] = []
+
+    def add(self, n: int) -> None:
+        start = len(self.messages)
+        self.messages = [{"id": f"m{i}", "text": f"message {i}", "createdAt": i} for i in range(start + n - 1, start - 1, -1)] + self.messages
+
+    async def fetch_recent_messages(self, chat_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return [dict(m) for m in self.messages[:limit]]
+
+    async def fetch_messages_since(self, chat_id: str, field: str, since: Any, limit: int = 50) -> List[Dict[str, Any]]:
+        return [dict(m) for m in self.messages if m[field] >= since][:limit]
+
+
+def test_recent_messages_mixed_limits_keep_window_contiguous() -> None:
+    async def run() -> None:
+        fs = _FS()
+        rag = RAGCache(_LLM(), None)
+        fs.add(200)
+        await rag.arecent_messages(fs, "c", limit=200)
+        fs.add(150)
+        small = await rag.arecent_messages(fs, "c", limit=50)
+        assert [m["id"] for m in small] == [f"m{i}" for i in range(349, 299, -1)]
+        full = await rag.arecent_messages(fs, "c", limit=200)
+        assert [m["id"] for m in full] == [f"m{i}" for i in range(349, 149, -1)]
+
+    asyncio.run(run())
+
+
+class _SlowLLM(_LLM):
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.calls = 0
+
+    async def embed_many(self, texts: List[str], model: str | None = None) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return await super().embed_many(texts, model)
+
+    async def embed(self, text: str, model: str | None = None) -> List[float]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return await super().embed(text, model)
+
+
+def test_slow_embeddings_fall_back_to_lexical_within_deadline() -> None:
+    async def run() -> None:
+        llm = _SlowLLM(delay=0.3)
+        rag = RAGCache(llm, None, retrieval="hybrid", embed_timeout_ms=50, embed_backoff_ms=60_000)
+        msgs = [{"id": "a", "text": "casualty at grid 123"}, {"id": "b", "text": "resupply water"}]
+        started = asyncio.get_running_loop().time()
+        await rag.aindex_messages(msgs, chat_id="c")
+        top = await rag.atop_k("casualty", k=1, chat_id="c")
+        assert asyncio.get_running_loop().time() - started < 0.25
+        assert [mid for mid, _, _ in top] == ["a"]
+        # In backoff no further embed calls are made; the timed-out one still lands in the index
+        assert llm.calls == 1
+        await asyncio.sleep(0.4)
+        assert rag.stats()["entries"] == 2 and len(rag._chat("c").embeds) == 2
+
+    asyncio.run(run())
+
+
+def test_lexical_padding_prefers_newest_after_incremental_refresh() -> None:
+    async def run() -> None:
+        fs = _FS()
+        rag = RAGCache(_LLM(), None, retrieval="lexical")
+        fs.add(10)
+        await rag.arecent_messages(fs, "c", limit=10, mode="lexical")
+        fs.add(3)
+        await rag.arecent_messages(fs, "c", limit=10, mode="lexical")
+        top = await rag.atop_k("no shared terms", k=4, chat_id="c", mode="lexical")
+        assert [mid for mid, _, _ in top] == ["m12", "m11", "m10", "m9"]
+
+    asyncio.run(run())
+
+
+class _SyncLLM:
+    def __init__(self, vectors: Dict[str, List[float]]) -> None:
+        self.vectors = vectors
+
+    def embed_many(self, texts: List[str], model: str | None = None) -> List[List[float]]:
+        return [self.vectors[t] for t in texts]
+
+    def embed(self, text: str, model: str | None = None) -> List[float]:
+        return [1.0, 0.0]
+
+
+def test_top_k_ties_match_reference_ranking() -> None:
+    # 100 equal scores and one best: the boundary ties must keep insertion order
+    texts = [f"t{i}" for i in range(101)]
+    vectors = {t: [1.0, 1.0] for t in texts[:100]}
+    vectors["t100"] = [1.0, 0.0]
+    rag = RAGCache(_SyncLLM(vectors), None, retrieval="vector")
+    rag.index_messages([{"id": t, "text": t} for t in texts], max_items=101, chat_id="c")
+    for k in (1, 5, 50, 101):
+        got = rag.top_k("q", k=k, chat_id="c")
+        want = rag.top_k_reference("q", k=k, chat_id="c")
+        assert [mid for mid, _, _ in got] == [mid for mid, _, _ in want]
+        assert [round(score, 5) for _, _, score in got] == [round(score, 5) for _, _, score in want]
+
+
+def test_hybrid_surfaces_keyword_matches_the_vectors_miss() -> None:
+    texts = {"a": "all quiet on the perimeter", "b": "fuel status nominal", "c": "contact at grid 38SMB4484"}
+    vectors = {texts["a"]: [1.0, 0.0], texts["b"]: [0.9, 0.1], texts["c"]: [0.0, 1.0]}
+    for mode, want in (("vector", "a"), ("lexical", "c"), ("hybrid", "c")):
+        rag = RAGCache(_SyncLLM(vectors), None, retrieval=mode)
+        rag.index_messages([{"id": mid, "text": t} for mid, t in texts.items()], chat_id="c")
+        # Each ranking is cut to k before fusion; with k=3 both see every message
+        assert rag.top_k("grid 38smb4484", k=3, chat_id="c")[0][0] == want
+    # Both rankings respect a message-id restriction
+    assert [mid for mid, _, _ in rag.top_k("grid 38smb4484", k=3, chat_id="c", message_ids={"a", "b"})] == ["a", "b"]
+
+
+def test_chats_are_isolated_and_evicted_least_recently_used_first() -> None:
+    vectors = {f"{chat} note {i}": [1.0, float(i)] for chat in "abc" for i in range(3)}
+    rag = RAGCache(_SyncLLM(vectors), None, max_chats=2, retrieval="vector")
+    for chat in "ab":
+        rag.index_messages([{"id": f"{chat}{i}", "text": f"{chat} note {i}"} for i in range(3)], chat_id=chat)
+    assert {mid for mid, _, _ in rag.top_k("q", k=10, chat_id="a")} == {"a0", "a1", "a2"}
+    # Reading "a" made "b" the least recently used chat
+    rag.index_messages([{"id": f"c{i}", "text": f"c note {i}"} for i in range(3)], chat_id="c")
+    assert rag.top_k("q", k=10, chat_id="b") == []
+    assert rag.stats()["chats"] == 2 and rag.stats()["evictions"] == 1
+
+
+class _CountingLLM(_SyncLLM):
+    def __init__(self) -> None:
+        super().__init__({})
+        self.embeds: List[str] = []
+        self.batches: List[List[str]] = []
+
+    def embed(self, text: str, model: str | None = None) -> List[float]:
+        self.embeds.append(text)
+        return [1.0, 0.0]
+
+    def embed_many(self, texts: List[str], model: str | None = None) -> List[List[float]]:
+        self.batches.append(list(texts))
+        return [[1.0, 0.0] for _ in texts]
+
+
+def test_query_vectors_are_cached_and_preseeded() -> None:
+    llm = _CountingLLM()
+    rag = RAGCache(llm, None, retrieval="vector")
+    assert rag.preseed_queries(["Summarize the last 6h", "Summarize the last 6h", "Find tasks"]) == 2
+    assert llm.batches == [["Summarize the last 6h", "Find tasks"]]
+    # Case and whitespace variants hit the pre-seeded vector
+    rag.top_k("  summarize THE last   6h ", chat_id="c")
+    rag.top_k("new question", chat_id="c")
+    rag.top_k("New question", chat_id="c")
+    assert llm.embeds == ["new question"]
+    assert rag.preseed_queries(["Find tasks"]) == 0
+
+
+def test_matrix_scores_match_cosine_for_odd_rows() -> None:
+    rows = [[1.0, 2.0, 3.0], [0.0, 0.0, 0.0], [1.0, 2.0], [], [-3.0, 1.0, 0.5], [2.0, 4.0, 6.0]]
+    query = [0.5, -1.0, 2.0]
+    matrix = _VectorMatrix(rows)
+    assert [round(float(s), 5) for s in matrix.scores(query)] == [round(_cosine(query, r), 5) for r in rows]
+    # Wrong-dimension or zero queries score every row 0
+    assert not matrix.scores([1.0, 2.0]).any() and not matrix.scores([0.0, 0.0, 0.0]).any()
+    assert [row for row, _ in matrix.top_k(query, 2, mask=np.array([False, True, True, True, True, True]))] == [5, 1]
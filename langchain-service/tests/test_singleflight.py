@@ -0,0 +1,67 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from app.singleflight import SingleFlight, flight_key
+
+
+def test_key_ignores_payload_key_order() -> None:
+    a = flight_key("/sitrep/summarize", "c", {"timeWindow": "6h", "format": "md"})
+    b = flight_key("/sitrep/summarize", "c", {"format": "md", "timeWindow": "6h"})
+    assert a == b and a != flight_key("/sitrep/summarize", "other", {"timeWindow": "6h", "format": "md"})
+
+
+def test_concurrent_identical_calls_run_once() -> None:
+    calls: List[int] = []
+
+    async def work() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "summary"
+
+    async def run() -> None:
+        flights = SingleFlight()
+        key = flight_key("/sitrep/summarize", "c", {})
+        results = await asyncio.gather(*(flights.do(key, work) for _ in range(5)))
+        assert results == ["summary"] * 5
+        assert flights.stats() == {"inflight": 0, "saved": 4, "endpoints": {"/sitrep/summarize": {"leaders": 1, "joined": 4}}}
+        # Nothing is cached once the leader finished
+        await flights.do(key, work)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_followers_share_the_leaders_failure() -> None:
+    async def work() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run() -> None:
+        flights = SingleFlight()
+        key = flight_key("/assistant/route", "c", {})
+        results = await asyncio.gather(*(flights.do(key, work) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    asyncio.run(run())
+
+
+def test_follower_takes_over_when_the_leader_is_cancelled() -> None:
+    async def work() -> str:
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run() -> None:
+        flights = SingleFlight()
+        key = flight_key("/assistant/route", "c", {})
+        leader = asyncio.create_task(flights.do(key, work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do(key, work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import app.main as main
+
+
+class _StreamLLM:
+    def __init__(self, deltas: List[str], fail: bool = False) -> None:
+        self.deltas = deltas
+        self.fail = fail
+
+    async def chat_stream(self, system_prompt: str, user_prompt: str, **kwargs: Any) -> AsyncIterator[str]:
+        for delta in self.deltas:
+            yield delta
+        if self.fail:
+            raise RuntimeError("stream reset")
+
+
+def _body(mode: str, prompt: Optional[str] = "prompt") -> str:
+    async def build_prompt() -> Optional[str]:
+        return prompt
+
+    def finish(text: Optional[str]) -> Dict[str, Any]:
+        return {"content": text if text is not None else "empty"}
+
+    response = main._stream_llm("r1", mode, "/sitrep/summarize", "system", "gpt-4o-mini", build_prompt, finish)
+
+    async def read() -> str:
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(read())
+
+
+def test_stream_mode_is_opt_in() -> None:
+    assert main._stream_mode({}) is None
+    assert main._stream_mode({"stream": False}) is None
+    assert main._stream_mode({"stream": True}) == main._stream_mode({"stream": "ndjson"}) == "ndjson"
+    assert main._stream_mode({"stream": "sse"}) == "sse"
+
+
+def test_ndjson_frames_end_with_the_full_envelope(monkeypatch: Any) -> None:
+    monkeypatch.setattr(main, "llm", _StreamLLM(["# SIT", "REP"]))
+    frames = [json.loads(line) for line in _body("ndjson").splitlines()]
+    assert [f["status"] for f in frames] == ["partial"] * 4 + ["ok"]
+    assert [f["data"] for f in frames[:4]] == [{"stage": "context"}, {"stage": "generating"}, {"delta": "# SIT"}, {"delta": "REP"}]
+    assert frames[-1]["data"] == {"content": "# SITREP"} and frames[-1]["requestId"] == "r1"
+
+
+def test_sse_frames_and_skipped_llm(monkeypatch: Any) -> None:
+    monkeypatch.setattr(main, "llm", _StreamLLM(["unused"]))
+    events = [block.split("\n") for block in _body("sse", prompt=None).strip().split("\n\n")]
+    assert [e[0] for e in events] == ["event: partial", "event: final"]
+    assert json.loads(events[-1][1][len("data: ") :])["data"] == {"content": "empty"}
+
+
+def test_stream_failure_ends_with_an_error_frame(monkeypatch: Any) -> None:
+    monkeypatch.setattr(main, "llm", _StreamLLM(["partial text"], fail=True))
+    frames = [json.loads(line) for line in _body("ndjson").splitlines()]
+    assert frames[-2]["data"] == {"delta": "partial text"}
+    assert frames[-1]["status"] == "error" and frames[-1]["error"] == "stream reset"
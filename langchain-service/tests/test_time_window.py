@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.time_window import parse_time_window, window_bounds
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("6h", timedelta(hours=6)), ("30m", timedelta(minutes=30)), ("90 min", timedelta(minutes=90)),
+     ("2d", timedelta(days=2)), ("1w", timedelta(weeks=1)), ("12", timedelta(hours=12)), (24, timedelta(hours=24))],
+)
+def test_parse_time_window(value: object, expected: timedelta) -> None:
+    assert parse_time_window(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "soon", "6 fortnights", "0h", "-3h", None, True])
+def test_unparseable_windows_are_none(value: object) -> None:
+    assert parse_time_window(value) is None
+
+
+def test_bounds_cover_both_ordering_fields() -> None:
+    since = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert window_bounds(since) == [("createdAt", int(since.timestamp() * 1000)), ("timestamp", since)]
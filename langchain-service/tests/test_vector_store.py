@@ -0,0 +1,73 @@
+import multiprocessing
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from app.embedding_store import FirestoreEmbeddingStore
+from app.vector_store import LocalVectorStore
+
+
+def _writer(root: str, worker: int) -> None:
+    store = LocalVectorStore(root, max_segments=3)
+    for i in range(10):
+        store.write_rows("c", [{"messageId": f"w{worker}-{i}", "seq": 0, "text": "t", "len": 1, "embed": [float(worker), float(i)]}])
+
+
+def test_concurrent_writers_keep_every_row(tmp_path: Path) -> None:
+    procs = [multiprocessing.get_context("fork").Process(target=_writer, args=(str(tmp_path), w)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    rows = LocalVectorStore(str(tmp_path)).read_chat("c")
+    assert len(rows) == 40
+    for w in range(4):
+        for i in range(10):
+            assert rows[f"w{w}-{i}"][0]["embed"].tolist() == [float(w), float(i)]
+
+
+class _FS:
+    def __init__(self) -> None:
+        self.chunk_reads: List[List[str]] = []
+
+    def fetch_recent_message_heads(self, chat_id: str, limit: int) -> List[Tuple[str, str]]:
+        return [("a", "hello"), ("b", "")]
+
+    def fetch_chunks_for_messages(self, chat_id: str, heads: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        self.chunk_reads.append([mid for mid, _ in heads])
+        return [{"messageId": "a", "seq": 0, "text": "hello", "len": 5, "embed": [1.0, 0.0]}] if any(mid == "a" for mid, _ in heads) else []
+
+
+def test_messages_without_chunks_are_fetched_once(tmp_path: Path) -> None:
+    fs = _FS()
+    store = FirestoreEmbeddingStore(fs, LocalVectorStore(str(tmp_path)))
+    first = store.read_recent_chunks("c")
+    second = store.read_recent_chunks("c")
+    assert fs.chunk_reads == [["a", "b"]]
+    assert [r["messageId"] for r in first] == [r["messageId"] for r in second] == ["a"]
+
+
+def test_compaction_keeps_newest_messages(tmp_path: Path) -> None:
+    store = LocalVectorStore(str(tmp_path), max_segments=2, max_messages=3)
+    for i in range(6):
+        store.write_rows("c", [{"messageId": f"m{i}", "seq": 0, "text": "t", "len": 1, "embed": [float(i)]}])
+    # Between compactions up to max_segments writes ride on top of the cap
+    assert len(store.read_chat("c")) <= 3 + 2
+    store.compact("c")
+    rows = store.read_chat("c")
+    assert sorted(rows) == ["m3", "m4", "m5"]
+    assert [r[0]["embed"].tolist() for _, r in sorted(rows.items())] == [[3.0], [4.0], [5.0]]
+    assert len(list(store._dir("c").glob("seg-*.npy"))) == 1
+
+
+def test_byte_budget_evicts_least_recently_used_chats(tmp_path: Path) -> None:
+    store = LocalVectorStore(str(tmp_path), max_bytes=4096)
+    big = [{"messageId": f"m{i}", "seq": 0, "text": "t", "len": 1, "embed": [0.0] * 64} for i in range(4)]
+    store.write_rows("old", big)
+    store.write_rows("used", big)
+    store.write_rows("idle", big)
+    store.read_chat("used")
+    store.write_rows("new", big)
+    assert store.evictions
+    assert store.read_chat("old") == {} and store.read_chat("idle") == {}
+    assert len(store.read_chat("used")) == 4 and len(store.read_chat("new")) == 4
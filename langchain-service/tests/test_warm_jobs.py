@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from app.warm_jobs import WarmJob, WarmJobQueue, WarmQueueFull, warm_chat
+
+
+class _FS:
+    def __init__(self, messages: List[Dict[str, Any]]) -> None:
+        self.messages = messages
+
+    async def fetch_recent_messages(self, chat_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return self.messages[:limit]
+
+
+class _Store:
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows = rows
+        self.writes: Dict[str, List[Dict[str, Any]]] = {}
+
+    async def read_recent_chunks(self, chat_id: str, message_limit: int = 200) -> List[Dict[str, Any]]:
+        return self.rows
+
+    async def write_chunks(self, chat_id: str, message_id: str, rows: List[Dict[str, Any]]) -> None:
+        self.writes[message_id] = rows
+
+
+class _LLM:
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.batches: List[List[str]] = []
+
+    async def embed_many(self, texts: List[str]) -> List[Any]:
+        self.batches.append(texts)
+        if self.failures:
+            self.failures -= 1
+            return [None] * len(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+
+def test_warm_chat_embeds_only_messages_without_chunks() -> None:
+    fs = _FS([{"id": "m2", "text": "new"}, {"id": "m1", "text": "old"}, {"id": "m0", "text": "  "}])
+    store = _Store([{"messageId": "m1", "seq": 0, "embed": [1.0, 0.0]}])
+    llm = _LLM(failures=1)
+    job = WarmJob(id="j", chat_id="c", limit=50)
+    asyncio.run(warm_chat(job, fs, llm, store, chunking="message"))
+    # The failed embed batch is retried as a whole
+    assert llm.batches == [["new"], ["new"]] and job.retries == 1
+    assert list(store.writes) == ["m2"] and store.writes["m2"][0]["text"] == "new"
+    assert (job.messages, job.complete, job.pending, job.written, job.failed) == (2, 1, 1, 1, 0)
+
+
+def test_queue_reuses_the_active_job_per_chat_and_bounds_the_queue() -> None:
+    release = asyncio.Event()
+    ran: List[str] = []
+
+    async def run(job: WarmJob) -> None:
+        ran.append(job.chat_id)
+        await release.wait()
+        if job.chat_id == "bad":
+            raise RuntimeError("firestore unavailable")
+
+    async def main() -> None:
+        queue = WarmJobQueue(run, workers=1, max_queue=2)
+        first = queue.submit("a", 50)
+        assert queue.submit("a", 50) is first
+        await asyncio.sleep(0)
+        bad = queue.submit("bad", 50)
+        queue.submit("b", 50)
+        with pytest.raises(WarmQueueFull):
+            queue.submit("c", 50)
+        assert first.status == "running" and bad.status == "queued"
+        release.set()
+        await queue._queue.join()
+        assert ran == ["a", "bad", "b"]
+        assert (first.status, bad.status, bad.error) == ("done", "failed", "firestore unavailable")
+        assert queue.get(first.id) is first and queue.submit("a", 50) is not first
+        assert queue.stats()["jobs"] == {"done": 2, "failed": 1, "queued": 1}
+        await queue.close()
+
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+MessageAI – Chunk vector encoding benchmark
+
+Purpose
+    Compare the chunk-doc vector encodings in langchain-service/app/embed_codec.py
+    (`array`, `f16`, `i8`) on:
+    - bytes:     Firestore wire size of a chunk doc (protobuf `Document.fields`) and of the vector alone
+    - read time: protobuf parse + field decode + vector decode per chunk doc (what a reader pays)
+    - recall@k:  overlap of top-k cosine neighbours with exact float32 scoring
+
+Usage
+    python scripts/bench_embed_encoding.py [--chunks 2000] [--queries 200] [--dim 1536] [--k 10]
+
+Data
+    Synthetic by default: clustered Gaussian vectors (embedding-like, many near neighbours)
+    and queries perturbed from random chunks. Pass `--vectors file.npy` to use real
+    embeddings (rows = chunks); queries are still perturbed rows.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "langchain-service"))
+
+from google.cloud.firestore_v1 import _helpers  # noqa: E402
+from google.cloud.firestore_v1.types import Document  # noqa: E402
+
+from app.embed_codec import ENCODINGS, decode_embed, encode_embed  # noqa: E402
+
+
+def synthetic_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 20), dim)).astype(np.float32)
+    vecs = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    m = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    scores = queries @ m.T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def chunk_doc(vec: np.ndarray, encoding: str) -> Dict[str, Any]:
+    doc = {"seq": 0, "text": "x" * 700, "len": 700}
+    doc.update(encode_embed(vec.tolist() if encoding == "array" else vec, encoding))
+    return doc
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark chunk vector encodings.")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--vectors", type=Path, help="Optional .npy of real embeddings (rows = chunks)")
+    args = parser.parse_args()
+
+    vectors = np.load(args.vectors).astype(np.float32) if args.vectors else synthetic_vectors(args.chunks, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32) / np.sqrt(vectors.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = top_k(vectors, queries, args.k)
+
+    report: Dict[str, Any] = {"chunks": len(vectors), "dim": int(vectors.shape[1]), "queries": args.queries, "k": args.k, "encodings": {}}
+    for encoding in ENCODINGS:
+        wire: List[bytes] = []
+        vec_bytes = 0
+        for vec in vectors:
+            doc = chunk_doc(vec, encoding)
+            pb = Document(fields=_helpers.encode_dict(doc))
+            wire.append(Document.serialize(pb))
+            embed_only = {k: v for k, v in doc.items() if k not in ("seq", "text", "len")}
+            vec_bytes += len(Document.serialize(Document(fields=_helpers.encode_dict(embed_only))))
+
+        started = time.perf_counter()
+        decoded = []
+        for raw in wire:
+            data = _helpers.decode_dict(Document.deserialize(raw).fields, None)
+            decoded.append(np.asarray(decode_embed(data), dtype=np.float32))
+        read_s = time.perf_counter() - started
+
+        approx = top_k(np.stack(decoded), queries, args.k)
+        recall = float(np.mean([len(set(a) & set(e)) / args.k for a, e in zip(approx, exact)]))
+        report["encodings"][encoding] = {
+            "doc_bytes_avg": round(sum(len(w) for w in wire) / len(wire), 1),
+            "vector_bytes_avg": round(vec_bytes / len(wire), 1),
+            "read_ms_per_1k_docs": round(read_s * 1000 * 1000 / len(wire), 2),
+            f"recall@{args.k}": round(recall, 4),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+MessageAI – Offline service benchmark
+
+Purpose
+    Drive every route in langchain-service/app/main.py concurrently, in-process, against
+    in-memory stand-ins instead of OpenAI and Firestore, and report latency percentiles,
+    throughput and memory against the QC targets (docs/QC_requirements.md §4).
+
+    - Firestore: `MemoryFirestore` implements the `AsyncFirestoreReader` calls the service
+      makes, seeded from a chat seed file (one chat per seed conversation). With
+      --prewarm, chunk docs (text + vectors) are pre-populated as the CF trigger would.
+    - Embedding store: the real `AsyncFirestoreEmbeddingStore` over `MemoryFirestore`.
+    - LLM: the real `AsyncOpenAIProvider` (response cache, embed dispatcher, spans) with a
+      fake OpenAI client whose chat/embedding latency is configurable.
+
+Usage
+    python scripts/bench_service.py [scripts/seeds/chats_seed.json]
+        [--requests 40] [--concurrency 16] [--llm-ms 400] [--embed-ms 80] [--fs-ms 15]
+        [--jitter 0.2] [--routes /sitrep/summarize,/template/opord] [--prewarm]
+        [--llm-cache] [--fail-on-target] [--json out.json]
+
+Output
+    JSON report: per route count/errors/p50/p95/p99/mean (ms), total req/s, peak and
+    current RSS, QC target pass/fail, plus the service's own /rag/stats counters.
+    --fail-on-target exits 1 when a QC P95 target is missed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "langchain-service"))
+# Never reach a real Firestore from the harness, even if credentials are present
+os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:1")
+os.environ.setdefault("FIRESTORE_PROJECT_ID", "bench")
+
+import httpx  # noqa: E402
+
+import app.main as service  # noqa: E402
+from app.embedding_store import AsyncFirestoreEmbeddingStore  # noqa: E402
+from app.firestore_client import CHUNK_CHARS  # noqa: E402
+from app.chunking import window_messages  # noqa: E402
+from app.llm_cache import MemoryResponseCache  # noqa: E402
+from app.providers import AsyncOpenAIProvider  # noqa: E402
+from app.rag import RAGCache  # noqa: E402
+from app.singleflight import SingleFlight  # noqa: E402
+from app.time_window import window_bounds  # noqa: E402
+from app.config import LANGCHAIN_SHARED_SECRET  # noqa: E402
+
+# docs/QC_requirements.md §4 (warm P95, ms)
+QC_TARGETS_MS = {
+    "/template/generate": 2000,
+    "/intent/casevac/detect": 2000,
+    "/workflow/casevac/run": 8000,
+}
+
+
+class Latency:
+    def __init__(self, mean_ms: float, jitter: float, rng: random.Random) -> None:
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+        self.rng = rng
+
+    async def sleep(self, scale: float = 1.0) -> None:
+        ms = max(0.0, self.rng.gauss(self.mean_ms, self.mean_ms * self.jitter)) * scale
+        if ms:
+            await asyncio.sleep(ms / 1000)
+
+
+def fake_vector(text: str, dim: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist()
+
+
+def fake_completion(system_prompt: str, user_prompt: str) -> str:
+    """Plausible, schema-valid output per service prompt so every handler takes its normal path."""
+    s = system_prompt.lower()
+    if "gate model" in s:
+        return json.dumps({"escalate": True})
+    if "information extractor" in s:
+        return json.dumps({"threats": []})
+    if "assistant router" in s:
+        return json.dumps({"tool": "sitrep/summarize", "args": {"timeWindow": "6h"}, "reply": "Generating SITREP."})
+    if "select one chatid" in s:
+        return json.dumps({"chatId": None})
+    if "placeholder keys" in s:
+        return json.dumps({})
+    if "casevac" in s:
+        return json.dumps({"intent": "none", "confidence": 0.2, "triggers": []})
+    if "mission" in s or "short actionable tasks" in s:
+        return json.dumps({"title": "Secure OBJ WOLF", "description": "Clear and hold.", "priority": 2, "tasks": [{"title": "Recon route"}]})
+    if "extract concise, actionable tasks" in s:
+        return json.dumps({"tasks": [{"title": "Report LACE", "priority": 3}]})
+    if "sitrep" in s:
+        return "# SITREP\n\n- Situation: quiet\n- Friendly: in position\n- Next: continue mission\n"
+    return json.dumps({"lat": None, "lon": None})
+
+
+class FakeOpenAI:
+    """Just the `chat.completions.create` / `embeddings.create` surface the provider uses."""
+
+    def __init__(self, llm: Latency, embed: Latency, dim: int) -> None:
+        self.llm = llm
+        self.embed_latency = embed
+        self.dim = dim
+        self.chat_calls = 0
+        self.embed_calls = 0
+        self.embed_inputs = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    async def _chat(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int, stream: bool = False) -> Any:
+        self.chat_calls += 1
+        content = fake_completion(messages[0]["content"], messages[1]["content"])
+        if stream:
+            return self._stream(content)
+        await self.llm.sleep()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def _stream(self, content: str):
+        # Time to first token ~ a quarter of the completion, the rest spread over ~10 deltas
+        await self.llm.sleep(0.25)
+        step = max(1, len(content) // 10)
+        for i in range(0, len(content), step):
+            await self.llm.sleep(0.075)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i : i + step]))])
+
+    async def _embed(self, model: str, input: Any) -> Any:
+        inputs = input if isinstance(input, list) else [input]
+        self.embed_calls += 1
+        self.embed_inputs += len(inputs)
+        await self.embed_latency.sleep()
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=fake_vector(t, self.dim)) for i, t in enumerate(inputs)])
+
+
+class MemoryFirestore:
+    """In-memory stand-in for `AsyncFirestoreReader` (same method names, rows and ordering)."""
+
+    def __init__(self, latency: Latency) -> None:
+        self.latency = latency
+        self.messages: Dict[str, List[Dict[str, Any]]] = {}  # newest first
+        self.chunks: Dict[Tuple[str, str], Dict[int, Dict[str, Any]]] = {}
+        self.windows: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.missions: List[Dict[str, Any]] = []
+        self.reads = 0
+
+    async def _io(self) -> None:
+        self.reads += 1
+        await self.latency.sleep()
+
+    def prepare_clients(self) -> None:
+        pass
+
+    async def warm(self) -> float:
+        await self._io()
+        return 0.0
+
+    async def create_mission(self, data: Dict[str, Any]) -> str:
+        await self._io()
+        self.missions.append(data)
+        return f"mission-{len(self.missions)}"
+
+    async def fetch_recent_messages(self, chat_id: Optional[str], limit: int = 50) -> List[Dict[str, Any]]:
+        if not chat_id:
+            return []
+        await self._io()
+        return [dict(m) for m in self.messages.get(chat_id, [])[:limit]]
+
+    async def fetch_messages_since(self, chat_id: str, field: str, since: Any, limit: int = 50) -> List[Dict[str, Any]]:
+        await self._io()
+        return [dict(m) for m in self.messages.get(chat_id, []) if m.get(field) is not None and m[field] >= since][:limit]
+
+    async def fetch_messages_in_window(self, chat_id: str, since: Any, page_size: int = 200, max_messages: int = 1000) -> List[Dict[str, Any]]:
+        _, bound = window_bounds(since)[0]  # seeded messages carry createdAt in epoch ms
+        rows = [dict(m) for m in self.messages.get(chat_id, []) if (m.get("createdAt") or 0) >= bound][:max_messages]
+        for _ in range(len(rows) // page_size + 1):
+            await self._io()
+        return rows
+
+    async def fetch_recent_message_heads(self, chat_id: str, limit_messages: int = 200) -> List[Tuple[str, str]]:
+        await self._io()
+        return [(m["id"], m.get("text") or "") for m in self.messages.get(chat_id, [])[:limit_messages]]
+
+    async def fetch_chunks_for_messages(self, chat_id: str, heads: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        await self._io()
+        rows: List[Dict[str, Any]] = []
+        for mid, _ in heads:
+            for seq, data in sorted(self.chunks.get((chat_id, mid), {}).items()):
+                rows.append({"messageId": mid, "seq": seq, "text": data.get("text"), "embed": data.get("embed"), "len": data.get("len")})
+        return rows
+
+    async def fetch_recent_chunks(self, chat_id: str, limit_messages: int = 200) -> List[Dict[str, Any]]:
+        return await self.fetch_chunks_for_messages(chat_id, await self.fetch_recent_message_heads(chat_id, limit_messages))
+
+    async def write_message_chunks(self, chat_id: str, message_id: str, chunks: List[Dict[str, Any]]) -> None:
+        await self._io()
+        docs = self.chunks.setdefault((chat_id, message_id), {})
+        for ch in chunks:
+            docs[int(ch.get("seq") or 0)] = dict(ch)
+
+    async def fetch_recent_windows(self, chat_id: str, limit: int = 64) -> List[Dict[str, Any]]:
+        await self._io()
+        rows = sorted(self.windows.get(chat_id, {}).values(), key=lambda w: w.get("lastAt") or 0, reverse=True)
+        return [dict(w) for w in rows[:limit]]
+
+    async def write_windows(self, chat_id: str, windows: List[Dict[str, Any]]) -> None:
+        await self._io()
+        docs = self.windows.setdefault(chat_id, {})
+        for w in windows:
+            docs[w["windowId"]] = dict(w)
+
+
+def load_seed(path: Path, fs: MemoryFirestore, prewarm: bool, dim: int) -> List[str]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    chats = data.get("chats") if isinstance(data, dict) and isinstance(data.get("chats"), list) else [data]
+    chat_ids: List[str] = []
+    base_ms = int(time.time() * 1000) - 3600_000
+    for ci, chat in enumerate(chats):
+        chat_id = f"seed-{ci}"
+        msgs = []
+        for mi, item in enumerate(chat.get("chat", [])):
+            text = item.get("contents") if isinstance(item, dict) else None
+            if not isinstance(text, str) or not text.strip():
+                continue
+            msgs.append({"id": f"{chat_id}-m{mi}", "text": text, "senderId": item.get("from"), "createdAt": base_ms + mi * 1000})
+            if prewarm:
+                for seq, i in enumerate(range(0, len(text), CHUNK_CHARS)):
+                    part = text[i : i + CHUNK_CHARS]
+                    fs.chunks.setdefault((chat_id, f"{chat_id}-m{mi}"), {})[seq] = {"seq": seq, "text": part, "len": len(part), "embed": fake_vector(part, dim)}
+        if prewarm:
+            for window in window_messages(msgs):
+                fs.windows.setdefault(chat_id, {})[window.id] = window.row(fake_vector(window.text, dim))
+        fs.messages[chat_id] = list(reversed(msgs))
+        chat_ids.append(chat_id)
+    return chat_ids
+
+
+def build_requests(chat_ids: List[str], fs: MemoryFirestore, rng: random.Random) -> Dict[str, Any]:
+    """Route -> callable(i) returning (method, payload-or-None) for the i-th request."""
+    def chat() -> str:
+        return rng.choice(chat_ids)
+
+    def message(chat_id: str) -> Dict[str, Any]:
+        return rng.choice(fs.messages[chat_id])
+
+    def envelope(chat_id: Optional[str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"context": {"chatId": chat_id} if chat_id else {}, "payload": payload}
+
+    def gate():
+        return envelope(None, {"prompt": message(chat())["text"]})
+
+    def threats():
+        cid = chat()
+        m = message(cid)
+        return envelope(cid, {"message": {"id": m["id"], "text": m["text"]}})
+
+    def casevac_detect():
+        cid = chat()
+        return envelope(cid, {"messages": [m["text"] for m in fs.messages[cid][:20]]})
+
+    return {
+        "/assistant/gate": gate,
+        "/template/generate": lambda: envelope(chat(), {"type": "MEDEVAC", "maxMessages": 50}),
+        "/threats/extract": threats,
+        "/sitrep/summarize": lambda: envelope(chat(), {"timeWindow": rng.choice(["6h", "12h", "24h"])}),
+        "/assistant/route": lambda: envelope(chat(), {"prompt": "Give me a SITREP for the last 6 hours"}),
+        "/geo/extract": lambda: envelope(None, {"text": message(chat())["text"]}),
+        "/template/warnord": lambda: envelope(chat(), {}),
+        "/template/opord": lambda: envelope(chat(), {}),
+        "/template/frago": lambda: envelope(chat(), {}),
+        "/template/medevac": lambda: envelope(chat(), {}),
+        "/intent/casevac/detect": casevac_detect,
+        "/workflow/casevac/run": lambda: envelope(chat(), {"priority": 1}),
+        "/tasks/extract": lambda: envelope(chat(), {}),
+        "/missions/plan": lambda: envelope(chat(), {"prompt": "Plan the next move"}),
+        "/rag/warm": lambda: envelope(chat(), {"limit": 50}),
+        "/rag/stats": None,
+        "/metrics": None,
+        "/healthz": None,
+    }
+
+
+def signed_headers(request_id: str, body: bytes) -> Dict[str, str]:
+    headers = {"content-type": "application/json", "x-request-id": request_id}
+    if LANGCHAIN_SHARED_SECRET:
+        ts = str(int(time.time() * 1000))
+        base = f"{request_id}.{ts}.{hashlib.sha256(body).hexdigest()}"
+        headers["x-sig-ts"] = ts
+        headers["x-sig"] = hmac.new(LANGCHAIN_SHARED_SECRET.encode(), base.encode(), hashlib.sha256).hexdigest()
+    return headers
+
+
+def rss_mb() -> Dict[str, Optional[float]]:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    current = None
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        current = pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    return {"peak_rss_mb": round(peak, 1), "rss_mb": round(current, 1) if current is not None else None}
+
+
+def summarize(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    arr = np.asarray(samples)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 1),
+        "p95": round(float(np.percentile(arr, 95)), 1),
+        "p99": round(float(np.percentile(arr, 99)), 1),
+        "mean": round(float(arr.mean()), 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    fs = MemoryFirestore(Latency(args.fs_ms, args.jitter, rng))
+    chat_ids = load_seed(args.seed_file, fs, args.prewarm, args.dim)
+    fake = FakeOpenAI(Latency(args.llm_ms, args.jitter, rng), Latency(args.embed_ms, args.jitter, rng), args.dim)
+    llm = AsyncOpenAIProvider(MemoryResponseCache() if args.llm_cache else None)
+    llm.enabled, llm.client = True, fake
+    store = AsyncFirestoreEmbeddingStore(fs)
+    service.fs, service.llm, service.store = fs, llm, store
+    service.rag = RAGCache(llm, store)
+    service.flights = SingleFlight()
+
+    routes = build_requests(chat_ids, fs, rng)
+    if args.routes:
+        wanted = {r.strip() for r in args.routes.split(",") if r.strip()}
+        routes = {k: v for k, v in routes.items() if k in wanted}
+    schedule = [route for route in routes for _ in range(args.requests)]
+    rng.shuffle(schedule)
+
+    latencies: Dict[str, List[float]] = {route: [] for route in routes}
+    errors: Dict[str, int] = {route: 0 for route in routes}
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async with service.lifespan(service.app):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+
+            async def one(i: int, route: str) -> None:
+                make = routes[route]
+                request_id = f"bench-{i}"
+                async with gate:
+                    started = time.perf_counter()
+                    try:
+                        if make is None:
+                            resp = await client.get(route)
+                        else:
+                            body = json.dumps({"requestId": request_id, **make()}).encode("utf-8")
+                            resp = await client.post(route, content=body, headers=signed_headers(request_id, body))
+                        ok = resp.status_code == 200
+                    except Exception:
+                        ok = False
+                    latencies[route].append((time.perf_counter() - started) * 1000)
+                    errors[route] += int(not ok)
+
+            wall_started = time.perf_counter()
+            await asyncio.gather(*(one(i, route) for i, route in enumerate(schedule)))
+            wall = time.perf_counter() - wall_started
+            stats = (await client.get("/rag/stats")).json()
+
+    per_route = {route: {"count": len(latencies[route]), "errors": errors[route], **summarize(latencies[route])} for route in routes}
+    targets = {}
+    for route, target in QC_TARGETS_MS.items():
+        if route in per_route and per_route[route]["p95"] is not None:
+            targets[route] = {"p95_ms": per_route[route]["p95"], "target_ms": target, "pass": per_route[route]["p95"] < target}
+    return {
+        "config": {
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+            "llm_ms": args.llm_ms,
+            "embed_ms": args.embed_ms,
+            "fs_ms": args.fs_ms,
+            "jitter": args.jitter,
+            "prewarm": args.prewarm,
+            "llm_cache": args.llm_cache,
+            "chats": len(chat_ids),
+        },
+        "total": {
+            "requests": len(schedule),
+            "errors": sum(errors.values()),
+            "wall_s": round(wall, 3),
+            "req_per_s": round(len(schedule) / wall, 1) if wall else None,
+            **summarize([x for v in latencies.values() for x in v]),
+            **rss_mb(),
+        },
+        "upstream": {"llm_calls": fake.chat_calls, "embed_calls": fake.embed_calls, "embed_inputs": fake.embed_inputs, "firestore_reads": fs.reads},
+        "qc_targets": targets,
+        "routes": per_route,
+        "service_stats": stats,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark for the LangChain service.")
+    parser.add_argument("seed_file", type=Path, nargs="?", default=ROOT / "scripts" / "seeds" / "chats_seed.json")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-ms", type=float, default=400.0, help="Mean fake chat completion latency")
+    parser.add_argument("--embed-ms", type=float, default=80.0, help="Mean fake embeddings call latency")
+    parser.add_argument("--fs-ms", type=float, default=15.0, help="Mean fake Firestore read/write latency")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency stddev as a fraction of the mean")
+    parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimension")
+    parser.add_argument("--routes", help="Comma-separated subset of routes")
+    parser.add_argument("--prewarm", action="store_true", help="Pre-populate chunk docs with vectors")
+    parser.add_argument("--llm-cache", action="store_true", help="Enable the in-memory LLM response cache")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", type=Path, help="Also write the report here")
+    parser.add_argument("--fail-on-target", action="store_true", help="Exit 1 when a QC P95 target is missed")
+    parser.add_argument("--verbose", action="store_true", help="Keep the service's per-request logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        for name in ("messageai", "messageai.rag", "messageai.providers", "messageai.vector_store", "httpx"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.json:
+        args.json.write_text(text, encoding="utf-8")
+    print(text)
+    if args.fail_on_target and not all(t["pass"] for t in report["qc_targets"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+MessageAI – Pre-gate offline evaluation
+
+Purpose
+    Measure the local /assistant/gate pre-classifier (langchain-service/app/gate.py)
+    against reference escalate labels for every message in a chat seed file, and report
+    how many LLM gate calls it would avoid.
+
+Usage
+    python scripts/eval_pregate.py [scripts/seeds/chats_seed.json]
+        [--labels scripts/seeds/chats_seed_gate_labels.json]
+        [--llm-label --save-labels labels.json]
+        [--escalate-threshold 0.85] [--skip-threshold 0.15]
+
+Labels
+    --labels      JSON object mapping message text -> true/false (escalate). Defaults to the
+                  hand labels shipped for the seed set, which also carry a few short
+                  acknowledgements the seed chats lack; labelled texts missing from the seed
+                  are evaluated too, so the skip path is exercised.
+    --llm-label   Label unlabeled messages with the same LLM gate prompt the service uses
+                  (single vote per message; needs OPENAI_API_KEY). Use --save-labels so
+                  later runs are free and repeatable.
+
+Metrics (local decisions only; uncertain messages go to the LLM and are not scored)
+    - escalate precision / skip precision: share of local escalates (skips) the label agrees with
+    - escalate recall:    labelled positives escalated locally, of those decided locally
+    - accuracy:           agreement with the labels over all local decisions
+    - coverage:           share of messages decided locally
+    - llm_calls_*:        against the service's early-quorum voting, where a decided vote
+                          costs at least GATE_QUORUM calls (concurrent votes stop at quorum),
+                          so the savings are a lower bound
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "langchain-service"))
+
+from app.gate import GATE_SYSTEM_PROMPT, classify_locally, gate_user_prompt  # noqa: E402
+from app.config import GATE_QUORUM, GATE_VOTES, PREGATE_ESCALATE_THRESHOLD, PREGATE_SKIP_THRESHOLD  # noqa: E402
+
+DEFAULT_LABELS = ROOT / "scripts" / "seeds" / "chats_seed_gate_labels.json"
+
+
+def load_messages(path: Path) -> List[str]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    chats = data.get("chats") if isinstance(data, dict) and isinstance(data.get("chats"), list) else [data]
+    out: List[str] = []
+    for chat in chats:
+        for item in chat.get("chat", []):
+            text = item.get("contents") if isinstance(item, dict) else None
+            if isinstance(text, str) and text.strip():
+                out.append(text)
+    return out
+
+
+def llm_label(texts: List[str]) -> Dict[str, bool]:
+    from app.providers import OpenAIProvider
+
+    llm = OpenAIProvider()
+    if not llm.enabled:
+        print("Error: --llm-label needs OPENAI_API_KEY", file=sys.stderr)
+        sys.exit(1)
+    labels: Dict[str, bool] = {}
+    for i, text in enumerate(texts):
+        try:
+            raw = llm.chat(system_prompt=GATE_SYSTEM_PROMPT, user_prompt=gate_user_prompt(text), model="gpt-4.1-nano")
+            labels[text] = bool(json.loads(raw or "{}").get("escalate", True))
+        except Exception as e:
+            print(f"Label error for message {i}: {e}", file=sys.stderr)
+    return labels
+
+
+def _ratio(num: int, den: int) -> Optional[float]:
+    return round(num / den, 4) if den else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate the local /assistant/gate pre-classifier.")
+    parser.add_argument("seed", type=Path, nargs="?", default=ROOT / "scripts" / "seeds" / "chats_seed.json")
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS, help="JSON {text: bool} reference labels")
+    parser.add_argument("--llm-label", action="store_true", help="Label missing messages with the LLM gate")
+    parser.add_argument("--save-labels", type=Path, help="Write the labels used to this path")
+    parser.add_argument("--escalate-threshold", type=float, default=PREGATE_ESCALATE_THRESHOLD)
+    parser.add_argument("--skip-threshold", type=float, default=PREGATE_SKIP_THRESHOLD)
+    parser.add_argument("--show", action="store_true", help="Print each local decision")
+    args = parser.parse_args()
+
+    texts = load_messages(args.seed)
+    labels: Dict[str, bool] = {}
+    if args.labels and args.labels.exists():
+        labels = {k: bool(v) for k, v in json.loads(args.labels.read_text(encoding="utf-8")).items()}
+    if args.llm_label:
+        labels.update(llm_label([t for t in texts if t not in labels]))
+    if args.save_labels:
+        args.save_labels.write_text(json.dumps(labels, indent=2, ensure_ascii=False), encoding="utf-8")
+    seen = set(texts)
+    texts += [t for t in labels if t not in seen]
+
+    counts = {"escalate": 0, "skip": 0, "uncertain": 0}
+    tp = fp = tn = fn_skip = labelled = 0
+    for text in texts:
+        res = classify_locally(text, args.escalate_threshold, args.skip_threshold)
+        decision = "uncertain" if res.escalate is None else ("escalate" if res.escalate else "skip")
+        counts[decision] += 1
+        if args.show:
+            print(f"{decision:9s} {res.score:.2f} {','.join(res.families) or res.reason:24s} {text[:90]}")
+        if text not in labels:
+            continue
+        labelled += 1
+        label = labels[text]
+        if decision == "escalate":
+            tp += int(label)
+            fp += int(not label)
+        elif decision == "skip":
+            tn += int(not label)
+            fn_skip += int(label)
+
+    total = len(texts)
+    decided = counts["escalate"] + counts["skip"]
+    # Early quorum: votes start together and stop once one side has `quorum`, so a message
+    # costs at least `quorum` calls (more only when votes split)
+    quorum = min(GATE_QUORUM, GATE_VOTES)
+    report = {
+        "messages": total,
+        "decisions": counts,
+        "thresholds": {"escalate": args.escalate_threshold, "skip": args.skip_threshold},
+        "coverage": _ratio(decided, total),
+        "llm_calls_baseline": total * quorum,
+        "llm_calls_with_pregate": counts["uncertain"] * quorum,
+        "llm_calls_saved": decided * quorum,
+        "labelled": labelled,
+    }
+    scored = tp + fp + tn + fn_skip
+    if scored:
+        report.update({
+            "scored_decisions": scored,
+            "accuracy": _ratio(tp + tn, scored),
+            "escalate_precision": _ratio(tp, tp + fp),
+            "escalate_recall": _ratio(tp, tp + fn_skip),
+            "skip_precision": _ratio(tn, tn + fn_skip),
+            "wrong_skips": fn_skip,
+            "wrong_escalates": fp,
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
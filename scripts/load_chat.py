@@ -58,6 +58,13 @@ from google.cloud import firestore  # type: ignore
 import os
 import requests
 
+# Shares the service's content-addressed embedding cache (EMBED_CACHE_* env vars)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "langchain-service"))
+from app.embed_cache import build_embedding_cache  # noqa: E402
+from app.chunking import window_messages  # noqa: E402
+from app.config import EMBED_BATCH_MAX_CHARS, EMBED_BATCH_SIZE, EMBED_MODEL, RAG_CHUNKING  # noqa: E402
+from app.providers import _embed_batches  # noqa: E402
+
 
 USERS_COL = "users"
 CHATS_COL = "chats"
@@ -210,29 +217,111 @@ def append_messages(db: firestore.Client, chat_id: str, sender_map: Dict[str, st
 
     # Backfill embeddings for imported messages (chunk + embed + write)
     openai_key = os.environ.get("OPENAI_API_KEY")
-    if openai_key:
+    if openai_key and RAG_CHUNKING == "window":
+        # One vector per conversation window (RAG_CHUNKING=window, the service default)
+        windows = window_messages([data for _, data in ops])
+        print(f"Backfilling {len(windows)} conversation windows for {len(ops)} imported messages...")
+        vectors = embed_many(openai_key, [w.text for w in windows])
+        window_ops: List[Tuple[str, Dict[str, Any]]] = []
+        for window, vec in zip(windows, vectors):
+            if vec is None:
+                print(f"Embedding error for window {window.id}; skipping (re-warm with /rag/warm)")
+                continue
+            window_ops.append((
+                f"{CHATS_COL}/{chat_id}/windows/{window.id}",
+                {
+                    "text": window.text,
+                    "len": len(window.text),
+                    "tokens": window.tokens,
+                    "messageIds": window.message_ids,
+                    "lastAt": window.last_at,
+                    "embed": vec,
+                },
+            ))
+        _print_cache_stats()
+        if window_ops:
+            batch_commit(db, window_ops)
+    elif openai_key:
         print("Backfilling embeddings for imported messages...")
+        pending: List[Tuple[str, int, str]] = []
         for _, data in ops:
-            msg_id = data["id"]
             text = (data.get("text") or "").strip()
             if not text:
                 continue
             chunks = [text[i : i + 700] for i in range(0, len(text), 700)]
-            for idx, ch in enumerate(chunks):
-                try:
-                    r = requests.post(
-                        "https://api.openai.com/v1/embeddings",
-                        headers={"Authorization": f"Bearer {openai_key}", "Content-Type": "application/json"},
-                        json={"model": "text-embedding-3-small", "input": ch},
-                        timeout=30,
-                    )
-                    r.raise_for_status()
-                    vec = r.json().get("data", [{}])[0].get("embedding", [])
-                except Exception as e:
-                    print(f"Embedding error for message {msg_id}: {e}")
-                    vec = []
-                ref = db.collection(CHATS_COL).document(chat_id).collection(MESSAGES_COL).document(msg_id).collection("chunks").document(str(idx))
-                ref.set({"seq": idx, "text": ch, "len": len(ch), "embed": vec}, merge=True)
+            pending.extend((data["id"], idx, ch) for idx, ch in enumerate(chunks))
+        vectors = embed_many(openai_key, [ch for _, _, ch in pending])
+        _print_cache_stats()
+        chunk_ops: List[Tuple[str, Dict[str, Any]]] = []
+        for (msg_id, idx, ch), vec in zip(pending, vectors):
+            if vec is None:
+                print(f"Embedding error for message {msg_id} chunk {idx}; writing empty vector")
+                vec = []
+            chunk_ops.append((
+                f"{CHATS_COL}/{chat_id}/{MESSAGES_COL}/{msg_id}/chunks/{idx}",
+                {"seq": idx, "text": ch, "len": len(ch), "embed": vec},
+            ))
+        if chunk_ops:
+            batch_commit(db, chunk_ops)
+
+
+def _embed_request(openai_key: str, inputs: Any) -> List[List[float]]:
+    r = requests.post(
+        "https://api.openai.com/v1/embeddings",
+        headers={"Authorization": f"Bearer {openai_key}", "Content-Type": "application/json"},
+        json={"model": EMBED_MODEL, "input": inputs},
+        timeout=60,
+    )
+    r.raise_for_status()
+    data = sorted(r.json().get("data", []), key=lambda d: d.get("index", 0))
+    return [d.get("embedding", []) for d in data]
+
+
+_EMBED_CACHE: List[Any] = []
+
+
+def _embed_cache() -> Any:
+    if not _EMBED_CACHE:
+        _EMBED_CACHE.append(build_embedding_cache())
+    return _EMBED_CACHE[0]
+
+
+def _print_cache_stats() -> None:
+    cache = _embed_cache()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.1%})")
+
+
+def embed_many(openai_key: str, texts: List[str]) -> List[Optional[List[float]]]:
+    """Embed texts not already in the embedding cache (each distinct text once), then store them."""
+    cache = _embed_cache()
+    if cache is None:
+        return _embed_many_uncached(openai_key, texts)
+    out, todo, positions = cache.lookup(EMBED_MODEL, texts)
+    if todo:
+        cache.fill(EMBED_MODEL, out, todo, positions, _embed_many_uncached(openai_key, todo))
+    return out
+
+
+def _embed_many_uncached(openai_key: str, texts: List[str]) -> List[Optional[List[float]]]:
+    """Embed texts in size-limited batches (as the service does); a failed batch is retried item by item (None on failure)."""
+    out: List[Optional[List[float]]] = [None] * len(texts)
+    for batch in _embed_batches(texts, max(1, EMBED_BATCH_SIZE), EMBED_BATCH_MAX_CHARS):
+        try:
+            vecs = _embed_request(openai_key, [texts[i] for i in batch])
+            if len(vecs) == len(batch):
+                for i, vec in zip(batch, vecs):
+                    out[i] = vec
+                continue
+        except Exception as e:
+            print(f"Embedding batch error ({len(batch)} inputs): {e}; retrying individually")
+        for i in batch:
+            try:
+                out[i] = _embed_request(openai_key, texts[i])[0]
+            except Exception as e:
+                print(f"Embedding error for input {i}: {e}")
+    return out
 
 
 def _load_single_chat(
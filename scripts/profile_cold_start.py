@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+MessageAI – Service cold-start profile
+
+Purpose
+    Track what a fresh process pays before the LangChain service answers: the import of
+    `app.main` (from `python -X importtime`, in a clean subprocess so nothing is cached),
+    and then the lazy build of the service clients that the startup task does before
+    /readyz turns 200.
+
+Usage
+    python scripts/profile_cold_start.py [--top 15] [--runs 3] [--budget-ms 800] [--json out.json]
+
+Report
+    - import_ms:  wall time of `import app.main` (median over --runs)
+    - build_ms:   per-service Lazy build time (llm, firestore, store, rag) and the
+                  Firestore client preparation (SDK import + credential discovery)
+    - heavy:      whether openai / google.cloud.firestore were imported by `import app.main`
+                  (both should be False; they load in the build step)
+    - top:        modules with the largest cumulative import time, from -X importtime
+
+    The build step runs in mock mode unless OPENAI_API_KEY / Firestore credentials are set;
+    without credentials, firestore_clients reports the error instead of a time.
+    --budget-ms exits 1 when import_ms exceeds it, for use in CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVICE = ROOT / "langchain-service"
+
+_IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import app.main
+elapsed = (time.perf_counter() - started) * 1000
+print(round(elapsed, 1), "openai" in sys.modules, "google.cloud.firestore" in sys.modules)
+"""
+
+_BUILD_PROBE = """
+import json, time
+import app.main as m
+from app.lazy import build_state, resolve
+out = {}
+for name, service in (("llm", m.llm), ("firestore", m.fs), ("store", m.store), ("rag", m.rag)):
+    resolve(service)
+    out[name] = build_state(service)["build_ms"]
+started = time.perf_counter()
+try:
+    resolve(m.fs).prepare_clients()
+    out["firestore_clients"] = round((time.perf_counter() - started) * 1000, 1)
+except Exception as e:
+    out["firestore_clients"] = "error: " + str(e)[:120]
+print(json.dumps(out))
+"""
+
+
+def _python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", LOG_LEVEL="WARNING")
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], cwd=SERVICE, env=env, capture_output=True, text=True, check=False
+    )
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) rows from `-X importtime` output."""
+    rows: List[Tuple[str, int, int]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile(runs: int, top: int) -> Dict[str, Any]:
+    import_ms: List[float] = []
+    heavy: Dict[str, bool] = {}
+    for _ in range(max(1, runs)):
+        proc = _python(_IMPORT_PROBE)
+        if proc.returncode != 0:
+            raise SystemExit(f"import app.main failed:\n{proc.stderr}")
+        ms, openai_loaded, firestore_loaded = proc.stdout.split()
+        import_ms.append(float(ms))
+        heavy = {"openai": openai_loaded == "True", "google.cloud.firestore": firestore_loaded == "True"}
+
+    rows = parse_importtime(_python("import app.main", "-X", "importtime").stderr)
+    # Only top-level packages and app modules; nested rows double count their parents
+    interesting = [r for r in rows if "." not in r[0] or r[0].startswith("app.")]
+    interesting.sort(key=lambda r: r[2], reverse=True)
+
+    build = _python(_BUILD_PROBE)
+    build_ms: Any = json.loads(build.stdout.strip().splitlines()[-1]) if build.returncode == 0 else {"error": build.stderr[-400:]}
+
+    return {
+        "python": sys.version.split()[0],
+        "import_ms": round(statistics.median(import_ms), 1),
+        "import_ms_runs": import_ms,
+        "heavy": heavy,
+        "build_ms": build_ms,
+        "top": [{"module": m, "cumulative_ms": round(c / 1000, 1), "self_ms": round(s / 1000, 1)} for m, s, c in interesting[:top]],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time / cold-start profile of the LangChain service.")
+    parser.add_argument("--runs", type=int, default=3, help="fresh-process import measurements (median reported)")
+    parser.add_argument("--top", type=int, default=15, help="modules to list by cumulative import time")
+    parser.add_argument("--budget-ms", type=float, default=0.0, help="exit 1 if import_ms exceeds this (0 = no budget)")
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    report = profile(args.runs, args.top)
+    text = json.dumps(report, indent=2)
+    if args.json:
+        args.json.write_text(text, encoding="utf-8")
+    print(text)
+    if args.budget_ms and report["import_ms"] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()